@@ -0,0 +1,176 @@
+"""
+On-disk cache of the processed Hugging Face dataset
+Mapped transaction columns are kept as Arrow IPC files keyed by dataset revision and mapper version, and memory-mapped on load
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import pyarrow as pa
+from data_ingestion import transform
+from models.transaction import FailureType
+
+logger = logging.getLogger(__name__)
+
+# Bump when mapped output changes outside data_ingestion/transform.py, whose source is fingerprinted
+MAPPER_VERSION = 1
+
+CACHE_FILE = "transactions.arrow"
+MANIFEST_FILE = "manifest.json"
+
+CACHE_SCHEMA = pa.schema([
+    ("transaction_id", pa.string()),
+    ("timestamp", pa.timestamp("us")),
+    ("amount", pa.float64()),
+    ("sender_vpa", pa.string()),
+    ("receiver_vpa", pa.string()),
+    ("sender_bank", pa.string()),
+    ("receiver_bank", pa.string()),
+    ("status", pa.string()),
+    ("failure_reason", pa.string()),
+    ("failure_type", pa.string()),
+    ("error_code", pa.string()),
+    ("retry_count", pa.int64()),
+    # JSON text, as TransactionStore keeps it
+    ("metadata", pa.string()),
+])
+
+
+def mapper_version() -> str:
+    """MAPPER_VERSION plus a digest of the mapping code, so changing the mapping invalidates cached data"""
+    with open(transform.__file__, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f"{MAPPER_VERSION}-{digest}"
+
+
+def directory_revision(path: str) -> str:
+    """Revision of a local dataset directory: a digest of its file names, sizes and modification times"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            stat = os.stat(os.path.join(root, name))
+            relative = os.path.relpath(os.path.join(root, name), path)
+            digest.update(f"{relative}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return f"local-{digest.hexdigest()[:16]}"
+
+
+def _record_batch(columns: Dict[str, List[Any]]) -> pa.RecordBatch:
+    """Mapper output columns as a record batch of CACHE_SCHEMA"""
+    values = dict(columns)
+    values["failure_type"] = [None if value is None else str(getattr(value, "value", value)) for value in columns["failure_type"]]
+    values["metadata"] = [
+        json.dumps(value, sort_keys=True, default=str) if value else None for value in columns["metadata"]
+    ]
+    return pa.record_batch([pa.array(values[field.name], field.type) for field in CACHE_SCHEMA], schema=CACHE_SCHEMA)
+
+
+def table_columns(table: pa.Table) -> Dict[str, List[Any]]:
+    """Mapper-shaped columns of cached rows, with failure types and metadata decoded"""
+    columns = table.to_pydict()
+    columns["failure_type"] = [None if value is None else FailureType(value) for value in columns["failure_type"]]
+    columns["metadata"] = [json.loads(value) if value else {} for value in columns["metadata"]]
+    return columns
+
+
+class CacheWriter:
+    """Streams mapped chunks into a new cache entry, which becomes visible only on commit"""
+
+    def __init__(self, path: str, manifest: Dict[str, Any]):
+        self.path = path
+        self.manifest = manifest
+        self.rows = 0
+        self._staging = f"{path}.tmp-{os.getpid()}"
+        shutil.rmtree(self._staging, ignore_errors=True)
+        os.makedirs(self._staging)
+        self._sink = pa.OSFile(os.path.join(self._staging, CACHE_FILE), "wb")
+        self._writer = pa.ipc.new_file(self._sink, CACHE_SCHEMA)
+
+    def write(self, columns: Dict[str, List[Any]]):
+        if columns:
+            batch = _record_batch(columns)
+            self._writer.write_batch(batch)
+            self.rows += batch.num_rows
+
+    def commit(self) -> str:
+        self._writer.close()
+        self._sink.close()
+        manifest = dict(self.manifest, rows=self.rows, created_at=datetime.now().isoformat())
+        with open(os.path.join(self._staging, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f, indent=2)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self._staging, self.path)
+        return self.path
+
+    def abort(self):
+        try:
+            self._writer.close()
+            self._sink.close()
+        finally:
+            shutil.rmtree(self._staging, ignore_errors=True)
+
+
+class DatasetCache:
+    """Processed-dataset entries, one directory per (dataset revision, mapper version)"""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or os.getenv("HF_DATASET_CACHE_DIR", "data/hf_dataset_cache")
+        self.mapper_version = mapper_version()
+
+    def entry_path(self, revision: str) -> str:
+        return os.path.join(self.root, f"{revision}-{self.mapper_version}")
+
+    def _manifest(self, path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(path, MANIFEST_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def manifest(self, revision: str) -> Optional[Dict[str, Any]]:
+        """Manifest of the entry for a revision under the current mapper, or None"""
+        return self._manifest(self.entry_path(revision))
+
+    def latest(self, dataset: str) -> Optional[Dict[str, Any]]:
+        """Newest entry of a dataset under the current mapper (used when the revision cannot be resolved)"""
+        if not os.path.isdir(self.root):
+            return None
+        manifests = [self._manifest(os.path.join(self.root, name)) for name in os.listdir(self.root)]
+        manifests = [
+            m for m in manifests
+            if m and m.get("dataset") == dataset and m.get("mapper_version") == self.mapper_version
+        ]
+        return max(manifests, key=lambda m: m.get("created_at", ""), default=None)
+
+    def load(self, revision: str) -> Optional[pa.Table]:
+        """Memory-mapped table of the entry for a revision, or None if there is none"""
+        path = self.entry_path(revision)
+        if self.manifest(revision) is None:
+            return None
+        try:
+            return pa.ipc.open_file(pa.memory_map(os.path.join(path, CACHE_FILE), "r")).read_all()
+        except (OSError, pa.ArrowInvalid) as e:
+            logger.warning(f"⚠️ Ignoring unreadable dataset cache {path}: {e}")
+            return None
+
+    def writer(self, revision: str, manifest: Dict[str, Any]) -> CacheWriter:
+        os.makedirs(self.root, exist_ok=True)
+        manifest = dict(manifest, revision=revision, mapper_version=self.mapper_version)
+        return CacheWriter(self.entry_path(revision), manifest)
+
+    def prune(self, dataset: str) -> int:
+        """Remove a dataset's entries written by other mapper versions; returns how many were removed"""
+        if not os.path.isdir(self.root):
+            return 0
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            manifest = self._manifest(path)
+            if manifest and manifest.get("dataset") == dataset and manifest.get("mapper_version") != self.mapper_version:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        return removed
@@ -4,34 +4,113 @@ Ingests deepakjoshi1606/mock-upi-txn-data into MongoDB
 """
 
 import os
+import json
+import time
 import asyncio
+import multiprocessing
+import numpy as np
 import pandas as pd
-from datasets import load_dataset
+import pyarrow as pa
+from datasets import Dataset, DatasetDict, load_dataset, load_from_disk
+from huggingface_hub import HfApi
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from datetime import datetime, timedelta
 import logging
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, AsyncIterator, Iterable, Iterator, Tuple, Callable, Union
 from motor.motor_asyncio import AsyncIOMotorClient
 from database.mongodb import mongodb
+from database.storage_router import storage_router
 from models.transaction import Transaction, FailureType
-import random
+from models.transaction_store import TransactionStore
+from database.codec import TRANSACTION_FIELDS
+from data_ingestion.dataset_cache import DatasetCache, directory_revision, table_columns
+from data_ingestion.transform import (
+    DATASET_SOURCE, DATE_FORMATS, DEFAULT_ERROR_CODES, DOMAIN_TO_BANK, ERROR_CODES, VPA_DOMAINS,
+    Batch, batch_records, columns_to_transactions, map_issue_type, map_resolution, transform_columns
+)
 import re
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DATASET_NAME = "deepakjoshi1606/mock-upi-txn-data"
+
+class IngestCheckpoint:
+    """JSON file recording how far a streaming ingestion got, by record offset"""
+    
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("HF_INGEST_CHECKPOINT_PATH", os.path.join("data", "hf_ingest_checkpoint.json"))
+    
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as checkpoint:
+                return json.load(checkpoint)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Ignoring unreadable ingestion checkpoint {self.path}: {e}")
+            return None
+    
+    def save(self, state: Dict[str, Any]):
+        """Write atomically, so a crash leaves either the old or the new checkpoint"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as checkpoint:
+            json.dump(state, checkpoint)
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+        os.replace(temp_path, self.path)
+
 class HuggingFaceDataLoader:
     def __init__(self):
         self.dataset = None
-        self.processed_transactions = []
+        self.processed_transactions = TransactionStore()
+        
+        # Streaming ingestion settings and state
+        self.chunk_size = int(os.getenv("HF_INGEST_CHUNK_SIZE", "5000"))
+        self.workers = int(os.getenv("HF_INGEST_WORKERS", "1"))
+        self.checkpoint = IngestCheckpoint()
+        self.total_records: Optional[int] = None
+        self.progress: Dict[str, Any] = {}
+        self._ingest_task: Optional[asyncio.Task] = None
+        
+        # Processed-dataset cache and offline loading
+        self.cache = DatasetCache()
+        self.offline = os.getenv("HF_DATASET_OFFLINE", "false").lower() == "true"
+        self.local_dir = os.getenv("HF_DATASET_LOCAL_DIR") or None
+        self.revision: Optional[str] = None
+        self.loaded_from_cache = False
+        
+    async def load_dataset_from_huggingface(self, use_cache: bool = True) -> bool:
+        """Load the UPI transaction dataset, from the processed cache when it holds this revision
         
-    async def load_dataset_from_huggingface(self) -> bool:
-        """Load the UPI transaction dataset from Hugging Face"""
+        Sources, in order: the processed cache, HF_DATASET_LOCAL_DIR, then the Hub. In offline
+        mode (HF_DATASET_OFFLINE=true) the Hub is never contacted.
+        """
         try:
-            logger.info("🔄 Loading dataset from Hugging Face: deepakjoshi1606/mock-upi-txn-data")
+            loop = asyncio.get_running_loop()
+            self.loaded_from_cache = False
+            self.revision = await loop.run_in_executor(None, self._resolve_revision)
             
-            # Load dataset from Hugging Face
-            self.dataset = load_dataset("deepakjoshi1606/mock-upi-txn-data")
+            if use_cache and self.revision and await loop.run_in_executor(None, self._load_cached, self.revision):
+                return True
+            
+            if self.local_dir:
+                logger.info(f"🔄 Loading dataset from local directory: {self.local_dir}")
+                self.dataset = await loop.run_in_executor(None, _load_local_dataset, self.local_dir)
+            elif self.offline:
+                logger.error("❌ Offline and no processed cache; set HF_DATASET_LOCAL_DIR to a local copy")
+                return False
+            else:
+                logger.info("🔄 Loading dataset from Hugging Face: deepakjoshi1606/mock-upi-txn-data")
+                
+                # Load dataset from Hugging Face, pinned to the revision the cache is keyed by
+                self.dataset = await loop.run_in_executor(
+                    None, lambda: load_dataset(DATASET_NAME, revision=self.revision)
+                )
             
             logger.info(f"✅ Successfully loaded dataset with {len(self.dataset['train'])} records")
             return True
@@ -40,40 +119,52 @@ class HuggingFaceDataLoader:
             logger.error(f"❌ Failed to load dataset from Hugging Face: {e}")
             return False
     
+    def _resolve_revision(self) -> Optional[str]:
+        """Revision the processed cache is keyed by; None disables caching for this load"""
+        if self.local_dir:
+            return directory_revision(self.local_dir)
+        if not self.offline:
+            try:
+                return HfApi().dataset_info(DATASET_NAME).sha
+            except Exception as e:
+                logger.warning(f"⚠️ Could not resolve the dataset revision on the Hub: {e}")
+        # Offline, or the Hub is unreachable: fall back to the newest cached revision
+        latest = self.cache.latest(DATASET_NAME)
+        return latest["revision"] if latest else None
+    
+    def _load_cached(self, revision: str) -> bool:
+        """Fill processed_transactions from the cache entry of a revision; False on a miss"""
+        started = time.monotonic()
+        table = self.cache.load(revision)
+        if table is None:
+            return False
+        transactions = TransactionStore()
+        for batch in table.to_batches():
+            transactions.extend_columns(batch.to_pydict())
+        self.processed_transactions = transactions
+        self.dataset = None
+        self.loaded_from_cache = True
+        logger.info(
+            f"⚡ Loaded {len(transactions):,} processed transactions from the dataset cache "
+            f"(revision {revision[:12]}) in {time.monotonic() - started:.2f}s"
+        )
+        return True
+    
     def _map_issue_type_to_failure_type(self, issue_type: str) -> Optional[FailureType]:
         """Map dataset issue types to our FailureType enum"""
-        if not issue_type:
-            return None
-            
-        issue_lower = issue_type.lower()
-        
-        # Mapping based on common UPI failure patterns
-        if any(keyword in issue_lower for keyword in ['insufficient', 'balance', 'fund']):
-            return FailureType.INSUFFICIENT_FUNDS
-        elif any(keyword in issue_lower for keyword in ['invalid', 'vpa', 'id', 'account']):
-            return FailureType.INVALID_VPA
-        elif any(keyword in issue_lower for keyword in ['network', 'timeout', 'connection', 'connectivity']):
-            return FailureType.NETWORK_ISSUE
-        elif any(keyword in issue_lower for keyword in ['server', 'bank', 'downtime', 'maintenance']):
-            return FailureType.BANK_SERVER_ERROR
-        elif any(keyword in issue_lower for keyword in ['limit', 'exceeded', 'maximum']):
-            return FailureType.DAILY_LIMIT_EXCEEDED
-        elif any(keyword in issue_lower for keyword in ['pin', 'auth', 'verification', 'otp']):
-            return FailureType.AUTHENTICATION_FAILED
-        else:
-            return FailureType.NETWORK_ISSUE  # Default fallback
+        return map_issue_type(issue_type)
     
-    def _generate_transaction_id(self, index: int) -> str:
+    def _generate_transaction_id(self, index: int, id_date: Optional[str] = None) -> str:
         """Generate a realistic transaction ID"""
-        return f"UPI{datetime.now().strftime('%Y%m%d')}{str(index).zfill(6)}"
+        return f"UPI{id_date or datetime.now().strftime('%Y%m%d')}{str(index).zfill(6)}"
     
-    def _parse_datetime(self, date_str: str, time_str: str) -> datetime:
+    def _parse_datetime(self, date_str: str, time_str: str, rng: np.random.Generator) -> datetime:
         """Parse date and time strings into datetime object"""
         try:
             # Handle various date formats
             if isinstance(date_str, str):
                 # Try different date formats
-                for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y']:
+                for fmt in DATE_FORMATS:
                     try:
                         date_obj = datetime.strptime(date_str, fmt)
                         break
@@ -99,16 +190,16 @@ class HuggingFaceDataLoader:
             
             # Fallback to random time
             return date_obj.replace(
-                hour=random.randint(0, 23),
-                minute=random.randint(0, 59),
-                second=random.randint(0, 59)
+                hour=int(rng.integers(0, 24)),
+                minute=int(rng.integers(0, 60)),
+                second=int(rng.integers(0, 60))
             )
             
         except Exception as e:
             logger.warning(f"Error parsing datetime: {e}")
-            return datetime.now() - timedelta(days=random.randint(0, 30))
+            return datetime.now() - timedelta(days=int(rng.integers(0, 31)))
     
-    def _extract_amount(self, amount_str: Any) -> float:
+    def _extract_amount(self, amount_str: Any, rng: np.random.Generator) -> float:
         """Extract amount from various formats"""
         if isinstance(amount_str, (int, float)):
             return float(amount_str)
@@ -117,151 +208,385 @@ class HuggingFaceDataLoader:
             # Remove currency symbols and extract numbers
             amount_clean = re.sub(r'[^\d.]', '', amount_str)
             try:
-                return float(amount_clean) if amount_clean else random.uniform(100, 50000)
+                return float(amount_clean) if amount_clean else rng.uniform(100, 50000)
             except ValueError:
                 pass
         
         # Fallback to random amount
-        return round(random.uniform(100, 50000), 2)
+        return round(rng.uniform(100, 50000), 2)
     
-    def _generate_vpa(self, name_hint: str = None) -> str:
+    def _generate_vpa(self, name_hint: str, rng: np.random.Generator) -> str:
         """Generate realistic VPA"""
-        domains = ['paytm', 'phonepe', 'gpay', 'amazonpay', 'mobikwik', 'ybl', 'ibl', 'axl']
-        
         if name_hint and isinstance(name_hint, str):
             # Extract name from hint
             clean_name = re.sub(r'[^a-zA-Z0-9]', '', name_hint.lower())
             if clean_name:
-                return f"{clean_name[:10]}@{random.choice(domains)}"
+                return f"{clean_name[:10]}@{VPA_DOMAINS[rng.integers(len(VPA_DOMAINS))]}"
         
         # Generate random VPA
-        username = f"user{random.randint(1000, 9999)}"
-        return f"{username}@{random.choice(domains)}"
+        username = f"user{rng.integers(1000, 10000)}"
+        return f"{username}@{VPA_DOMAINS[rng.integers(len(VPA_DOMAINS))]}"
     
-    def _get_bank_from_vpa(self, vpa: str) -> str:
+    def _get_bank_from_vpa(self, vpa: str, rng: np.random.Generator) -> str:
         """Map VPA domain to bank"""
-        domain_to_bank = {
-            'paytm': 'PAYTM',
-            'phonepe': 'YESBANK',
-            'gpay': 'AXIS',
-            'amazonpay': 'AXIS',
-            'mobikwik': 'YESBANK',
-            'ybl': 'YES',
-            'ibl': 'IDBI',
-            'axl': 'AXIS'
-        }
-        
         domain = vpa.split('@')[-1] if '@' in vpa else 'paytm'
-        return domain_to_bank.get(domain, random.choice(['HDFC', 'ICICI', 'SBI', 'AXIS', 'KOTAK']))
+        if domain in DOMAIN_TO_BANK:
+            return DOMAIN_TO_BANK[domain]
+        banks = ['HDFC', 'ICICI', 'SBI', 'AXIS', 'KOTAK']
+        return banks[rng.integers(len(banks))]
     
     def _determine_status(self, resolution: str) -> str:
         """Determine transaction status from resolution"""
-        if not resolution or pd.isna(resolution):
-            return 'failed'
+        return map_resolution(resolution)
+    
+    def _generate_error_code(self, failure_type: FailureType, rng: np.random.Generator) -> str:
+        """Generate realistic error codes"""
+        codes = ERROR_CODES.get(failure_type, DEFAULT_ERROR_CODES)
+        return codes[rng.integers(len(codes))]
+    
+    def _record_to_transaction(
+        self,
+        idx: int,
+        record: Dict[str, Any],
+        rng: np.random.Generator,
+        id_date: Optional[str] = None
+    ) -> Transaction:
+        """Map one dataset record to a Transaction, drawing its random fill-ins from rng"""
+        # Extract and clean data from the record
+        transaction_id = self._generate_transaction_id(idx, id_date)
         
-        resolution_lower = str(resolution).lower()
+        # Parse datetime
+        date_str = record.get('Date', '')
+        time_str = record.get('Time', '')
+        timestamp = self._parse_datetime(date_str, time_str, rng)
         
-        if any(keyword in resolution_lower for keyword in ['success', 'completed', 'resolved', 'fixed']):
-            return 'success'
-        elif any(keyword in resolution_lower for keyword in ['pending', 'processing', 'in progress']):
-            return 'pending'
-        else:
-            return 'failed'
+        # Extract amount
+        amount = self._extract_amount(record.get('Amount', 0), rng)
+        
+        # Map issue type to failure type
+        issue_type = record.get('Issue Type', '')
+        failure_type = self._map_issue_type_to_failure_type(issue_type)
+        
+        # Generate VPAs
+        sender_vpa = self._generate_vpa(record.get('Sender', ''), rng)
+        receiver_vpa = self._generate_vpa(record.get('Receiver', ''), rng)
+        
+        # Get banks from VPAs
+        sender_bank = self._get_bank_from_vpa(sender_vpa, rng)
+        receiver_bank = self._get_bank_from_vpa(receiver_vpa, rng)
+        
+        # Determine status
+        resolution = record.get('Resolution', '')
+        status = self._determine_status(resolution)
+        
+        # Get failure reason and description
+        failure_reason = record.get('Description', issue_type) if status == 'failed' else None
+        
+        # Generate error code for failed transactions
+        error_code = self._generate_error_code(failure_type, rng) if status == 'failed' and failure_type else None
+        
+        # Create Transaction object
+        return Transaction(
+            transaction_id=transaction_id,
+            timestamp=timestamp,
+            amount=amount,
+            sender_vpa=sender_vpa,
+            receiver_vpa=receiver_vpa,
+            sender_bank=sender_bank,
+            receiver_bank=receiver_bank,
+            status=status,
+            failure_reason=failure_reason,
+            failure_type=failure_type,
+            error_code=error_code,
+            retry_count=int(rng.integers(0, 4)) if status == 'failed' else 0,
+            metadata={
+                'original_issue_type': issue_type,
+                'original_description': record.get('Description', ''),
+                'original_resolution': resolution,
+                'dataset_source': DATASET_SOURCE,
+                'processed_at': datetime.now().isoformat()
+            }
+        )
     
-    def _generate_error_code(self, failure_type: FailureType) -> str:
-        """Generate realistic error codes"""
-        error_codes = {
-            FailureType.INSUFFICIENT_FUNDS: ['U30', 'E001', 'BAL_LOW'],
-            FailureType.INVALID_VPA: ['U16', 'E002', 'VPA_INVALID'],
-            FailureType.NETWORK_ISSUE: ['U69', 'E003', 'NET_TIMEOUT'],
-            FailureType.BANK_SERVER_ERROR: ['U28', 'E004', 'BANK_DOWN'],
-            FailureType.DAILY_LIMIT_EXCEEDED: ['U53', 'E005', 'LIMIT_EXCEED'],
-            FailureType.AUTHENTICATION_FAILED: ['U17', 'E008', 'AUTH_FAIL']
-        }
+    def iter_record_chunks(self, chunk_size: int, start_offset: int = 0) -> Iterator[Tuple[int, pa.Table]]:
+        """(offset, Arrow table) chunks of the train split, from the loaded dataset or local copy, or streamed from the Hub"""
+        if self.dataset is None and self.local_dir:
+            self.dataset = _load_local_dataset(self.local_dir)
+        if self.dataset is not None:
+            data = self.dataset['train']
+            self.total_records = len(data)
+            # Arrow slices are zero-copy views of the cached dataset
+            tables = data.with_format("arrow")
+            for offset in range(start_offset, len(data), chunk_size):
+                yield offset, tables[offset:offset + chunk_size]
+            return
+        
+        if self.offline:
+            raise RuntimeError("Offline mode: no local dataset to read; set HF_DATASET_LOCAL_DIR")
+        stream = load_dataset(DATASET_NAME, split="train", streaming=True, revision=self.revision)
+        try:
+            self.total_records = stream.info.splits["train"].num_examples
+        except (AttributeError, KeyError, TypeError):
+            self.total_records = None
+        if start_offset:
+            stream = stream.skip(start_offset)
         
-        return random.choice(error_codes.get(failure_type, ['U99', 'E999']))
+        offset = start_offset
+        for table in stream.with_format("arrow").iter(batch_size=chunk_size):
+            yield offset, table
+            offset += table.num_rows
     
-    def process_dataset_to_transactions(self) -> List[Transaction]:
-        """Process the Hugging Face dataset into Transaction objects"""
+    def _transform_records(
+        self,
+        batch: Batch,
+        offset: int,
+        id_date: Optional[str],
+        rng: Optional[np.random.Generator] = None
+    ) -> List[Transaction]:
+        """Per-record mapping; used when a batch cannot be mapped as a whole"""
+        rng = rng if rng is not None else np.random.default_rng()
+        transactions = []
+        for idx, record in enumerate(batch_records(batch), start=offset):
+            try:
+                transactions.append(self._record_to_transaction(idx, record, rng, id_date))
+            except Exception as e:
+                logger.warning(f"⚠️ Error processing record {idx}: {e}")
+        return transactions
+    
+    def iter_transaction_chunks(
+        self,
+        chunk_size: Optional[int] = None,
+        start_offset: int = 0,
+        id_date: Optional[str] = None,
+        seed: Optional[int] = None
+    ) -> Iterator[Tuple[int, List[Transaction]]]:
+        """(next offset, transactions) per chunk; only one chunk is held in memory at a time"""
+        id_date = id_date or datetime.now().strftime('%Y%m%d')
+        seed = new_seed() if seed is None else seed
+        for offset, table in self.iter_record_chunks(chunk_size or self.chunk_size, start_offset):
+            yield offset + table.num_rows, _as_transactions(map_chunk(table, offset, id_date, seed))
+    
+    def process_dataset_to_transactions(self) -> TransactionStore:
+        """Process the Hugging Face dataset into a compact transaction store, caching the result on disk"""
+        if self.loaded_from_cache:
+            return self.processed_transactions
+        
         if not self.dataset:
             logger.error("❌ Dataset not loaded. Call load_dataset_from_huggingface() first.")
-            return []
+            return TransactionStore()
         
         logger.info("🔄 Processing dataset into Transaction objects...")
-        transactions = []
+        transactions = TransactionStore()
+        id_date, seed = datetime.now().strftime('%Y%m%d'), new_seed()
+        writer = self._cache_writer(id_date, seed)
         
-        # Get the training split
-        data = self.dataset['train']
+        for offset, table in self.iter_record_chunks(self.chunk_size):
+            columns = _as_columns(map_chunk(table, offset, id_date, seed))
+            transactions.extend_columns(columns)
+            if writer is not None:
+                try:
+                    writer.write(columns)
+                except Exception as e:
+                    logger.warning(f"⚠️ Dataset cache write failed, continuing without it: {e}")
+                    writer.abort()
+                    writer = None
         
-        for idx, record in enumerate(data):
+        if writer is not None:
             try:
-                # Extract and clean data from the record
-                transaction_id = self._generate_transaction_id(idx)
-                
-                # Parse datetime
-                date_str = record.get('Date', '')
-                time_str = record.get('Time', '')
-                timestamp = self._parse_datetime(date_str, time_str)
-                
-                # Extract amount
-                amount = self._extract_amount(record.get('Amount', 0))
-                
-                # Map issue type to failure type
-                issue_type = record.get('Issue Type', '')
-                failure_type = self._map_issue_type_to_failure_type(issue_type)
-                
-                # Generate VPAs
-                sender_vpa = self._generate_vpa(record.get('Sender', ''))
-                receiver_vpa = self._generate_vpa(record.get('Receiver', ''))
-                
-                # Get banks from VPAs
-                sender_bank = self._get_bank_from_vpa(sender_vpa)
-                receiver_bank = self._get_bank_from_vpa(receiver_vpa)
-                
-                # Determine status
-                resolution = record.get('Resolution', '')
-                status = self._determine_status(resolution)
-                
-                # Get failure reason and description
-                failure_reason = record.get('Description', issue_type) if status == 'failed' else None
-                
-                # Generate error code for failed transactions
-                error_code = self._generate_error_code(failure_type) if status == 'failed' and failure_type else None
-                
-                # Create Transaction object
-                transaction = Transaction(
-                    transaction_id=transaction_id,
-                    timestamp=timestamp,
-                    amount=amount,
-                    sender_vpa=sender_vpa,
-                    receiver_vpa=receiver_vpa,
-                    sender_bank=sender_bank,
-                    receiver_bank=receiver_bank,
-                    status=status,
-                    failure_reason=failure_reason,
-                    failure_type=failure_type,
-                    error_code=error_code,
-                    retry_count=random.randint(0, 3) if status == 'failed' else 0,
-                    metadata={
-                        'original_issue_type': issue_type,
-                        'original_description': record.get('Description', ''),
-                        'original_resolution': resolution,
-                        'dataset_source': 'huggingface_deepakjoshi1606',
-                        'processed_at': datetime.now().isoformat()
-                    }
-                )
-                
-                transactions.append(transaction)
-                
+                logger.info(f"💾 Cached processed dataset at {writer.commit()}")
+                self.cache.prune(DATASET_NAME)
             except Exception as e:
-                logger.warning(f"⚠️ Error processing record {idx}: {e}")
-                continue
+                logger.warning(f"⚠️ Could not commit the dataset cache: {e}")
+                writer.abort()
         
         logger.info(f"✅ Successfully processed {len(transactions)} transactions from dataset")
         self.processed_transactions = transactions
         return transactions
     
-    async def ingest_to_mongodb(self, transactions: List[Transaction] = None) -> int:
+    def _cache_writer(self, id_date: str, seed: int):
+        if not self.revision:
+            return None
+        try:
+            return self.cache.writer(self.revision, {
+                "dataset": DATASET_NAME,
+                "source": self.local_dir or "hub",
+                "id_date": id_date,
+                "seed": seed
+            })
+        except Exception as e:
+            logger.warning(f"⚠️ Dataset cache unavailable: {e}")
+            return None
+    
+    async def ingest_streaming(
+        self,
+        chunk_size: Optional[int] = None,
+        resume: bool = True,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Load, transform and write the dataset chunk by chunk, checkpointing the record offset
+        
+        An interrupted run resumes after the last chunk that was written; transaction IDs
+        are kept stable across resumes, so a chunk written twice is rejected as duplicates.
+        With workers > 1, chunks are mapped in worker processes and written concurrently.
+        Random fill-ins are seeded per chunk, so the output depends only on the seed and
+        chunk size, not on the number of workers.
+        """
+        chunk_size = chunk_size or self.chunk_size
+        workers = max(1, workers or self.workers)
+        state = self.checkpoint.load() if resume else None
+        if state and (state.get("dataset") != DATASET_NAME or state.get("completed")):
+            state = None
+        if state:
+            logger.info(f"⏩ Resuming Hugging Face ingestion at record {state['offset']:,}")
+        else:
+            state = {
+                "dataset": DATASET_NAME,
+                "offset": 0,
+                "processed": 0,
+                "ingested": 0,
+                "id_date": datetime.now().strftime('%Y%m%d'),
+                "seed": new_seed() if seed is None else seed,
+                "started_at": datetime.now().isoformat(),
+                "completed": False
+            }
+        
+        if not storage_router.mongodb_available and not await storage_router.check_health():
+            logger.warning("⚠️ MongoDB unavailable, buffering transactions in the write journal")
+        
+        # Checkpoints written before seeding keep random fill-ins for the rest of their run
+        state.setdefault("seed", new_seed())
+        if "revision" not in state:
+            # Pinned in the checkpoint, so a resumed run reads the same data
+            if self.dataset is None and not self.loaded_from_cache:
+                self.revision = await asyncio.get_running_loop().run_in_executor(None, self._resolve_revision)
+            state["revision"] = self.revision
+        self.revision = state["revision"]
+        if "source" not in state:
+            # A processed cache entry is the mapped output of this revision; ingest it as is
+            manifest = self.cache.manifest(self.revision) if self.revision and self.dataset is None else None
+            state["source"] = "cache" if manifest else "dataset"
+            if manifest:
+                state["id_date"], state["seed"] = manifest["id_date"], manifest["seed"]
+        state["workers"] = workers
+        started = time.monotonic()
+        resumed_from = state["offset"]
+        self.progress = state
+        
+        async for next_offset, processed, ingested in self._ingest_chunks(state, chunk_size, workers):
+            state["ingested"] += ingested
+            state["processed"] += processed
+            state["offset"] = next_offset
+            state["updated_at"] = datetime.now().isoformat()
+            elapsed = time.monotonic() - started
+            state["records_per_second"] = (next_offset - resumed_from) / elapsed if elapsed > 0 else None
+            state["total_records"] = self.total_records
+            self.checkpoint.save(state)
+            
+            logger.info(
+                f"📦 Ingested {state['ingested']:,} transactions, record {next_offset:,}"
+                + (f"/{self.total_records:,}" if self.total_records else "")
+                + (f" ({state['records_per_second']:,.0f} records/s)" if state["records_per_second"] else "")
+            )
+            if progress is not None:
+                progress(dict(state))
+        
+        state["completed"] = True
+        state["updated_at"] = datetime.now().isoformat()
+        self.checkpoint.save(state)
+        logger.info(f"✅ Streaming ingestion complete: {state['ingested']:,} transactions from {state['offset']:,} records")
+        return dict(state)
+    
+    async def _ingest_chunks(self, state: Dict[str, Any], chunk_size: int, workers: int) -> AsyncIterator[Tuple[int, int, int]]:
+        """(next offset, processed, ingested) per written chunk, in dataset order"""
+        loop = asyncio.get_running_loop()
+        if state.get("source") == "cache":
+            table = await loop.run_in_executor(None, self.cache.load, state["revision"])
+            if table is None:
+                raise RuntimeError("The dataset cache entry this run started from is gone; restart the ingestion")
+            self.total_records = table.num_rows
+            for offset in range(state["offset"], table.num_rows, chunk_size):
+                chunk = table.slice(offset, chunk_size)
+                transactions = await loop.run_in_executor(None, lambda: columns_to_transactions(table_columns(chunk)))
+                yield offset + chunk.num_rows, len(transactions), await storage_router.insert_transactions(transactions)
+            return
+        
+        if workers == 1:
+            chunks = self.iter_transaction_chunks(chunk_size, state["offset"], state["id_date"], state["seed"])
+            while True:
+                # Fetching and mapping a chunk is blocking work; keep it off the event loop
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    return
+                next_offset, transactions = chunk
+                yield next_offset, len(transactions), await storage_router.insert_transactions(transactions)
+        
+        # Chunks are read here and mapped in worker processes; results are written by up to
+        # `workers` concurrent bulk writes and reported in dataset order, so the checkpoint
+        # only ever covers chunks that were written. Spawned workers avoid forking Arrow's threads.
+        tables = self.iter_record_chunks(chunk_size, state["offset"])
+        mapping: deque = deque()
+        writes: deque = deque()
+        exhausted = False
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            while mapping or writes or not exhausted:
+                # Keep a second chunk queued behind every worker
+                while not exhausted and len(mapping) < workers * 2:
+                    chunk = await loop.run_in_executor(None, next, tables, None)
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    offset, table = chunk
+                    mapped = loop.run_in_executor(pool, map_chunk, _compact(table), offset, state["id_date"], state["seed"])
+                    mapping.append((offset + table.num_rows, mapped))
+                
+                if mapping:
+                    next_offset, mapped = mapping.popleft()
+                    transactions = await loop.run_in_executor(None, _as_transactions, await mapped)
+                    write = asyncio.create_task(storage_router.insert_transactions(transactions))
+                    writes.append((next_offset, len(transactions), write))
+                
+                while writes and (len(writes) > workers or writes[0][2].done() or not mapping):
+                    next_offset, processed, write = writes.popleft()
+                    yield next_offset, processed, await write
+        finally:
+            for _, mapped in mapping:
+                mapped.cancel()
+            for _, _, write in writes:
+                write.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    def start_streaming_ingest(
+        self,
+        chunk_size: Optional[int] = None,
+        resume: bool = True,
+        workers: Optional[int] = None
+    ) -> bool:
+        """Run ingest_streaming in the background; False if a run is already in progress"""
+        if self._ingest_task is not None and not self._ingest_task.done():
+            return False
+        self._ingest_task = asyncio.create_task(self._run_streaming_ingest(chunk_size, resume, workers))
+        return True
+    
+    async def _run_streaming_ingest(self, chunk_size: Optional[int], resume: bool, workers: Optional[int]):
+        try:
+            await self.ingest_streaming(chunk_size=chunk_size, resume=resume, workers=workers)
+        except Exception as e:
+            # The checkpoint keeps the last written offset for the next resume
+            logger.error(f"❌ Streaming ingestion stopped: {e}")
+            self.progress["error"] = str(e)
+    
+    def ingest_status(self) -> Dict[str, Any]:
+        """Progress of the current or last streaming ingestion"""
+        return {
+            "running": self._ingest_task is not None and not self._ingest_task.done(),
+            "progress": dict(self.progress) or self.checkpoint.load(),
+            "checkpoint_path": self.checkpoint.path
+        }
+    
+    async def ingest_to_mongodb(self, transactions: Optional[Iterable[Transaction]] = None) -> int:
         """Ingest processed transactions into MongoDB"""
         if not transactions:
             transactions = self.processed_transactions
@@ -271,17 +596,16 @@ class HuggingFaceDataLoader:
             return 0
         
         try:
-            # Connect to MongoDB
-            if not await mongodb.connect():
-                logger.error("❌ Failed to connect to MongoDB")
-                return 0
+            # Reuse the live connection; writes are journaled if MongoDB is down
+            if not storage_router.mongodb_available and not await storage_router.check_health():
+                logger.warning("⚠️ MongoDB unavailable, buffering transactions in the write journal")
             
             # Clear existing data (optional - comment out to preserve existing data)
             # await mongodb.transactions_collection.delete_many({})
             # logger.info("🗑️ Cleared existing transaction data")
             
             # Bulk insert transactions
-            inserted_count = await mongodb.bulk_insert_transactions(transactions)
+            inserted_count = await storage_router.insert_transactions(transactions)
             
             logger.info(f"✅ Successfully ingested {inserted_count} transactions into MongoDB")
             return inserted_count
@@ -298,16 +622,17 @@ class HuggingFaceDataLoader:
         
         logger.info(f"🎬 Starting real-time replay simulation (speed: {speed_multiplier}x)")
         
-        # Sort transactions by timestamp
-        sorted_transactions = sorted(self.processed_transactions, key=lambda t: t.timestamp)
+        # Sort row indices by timestamp; rows are materialized one at a time
+        store = self.processed_transactions
+        replay_order = store.indices_by_timestamp()
         
-        if not sorted_transactions:
+        if not replay_order:
             return
         
-        start_time = sorted_transactions[0].timestamp
-        current_real_time = datetime.now()
+        start_time = store[replay_order[0]].timestamp
         
-        for transaction in sorted_transactions:
+        for index in replay_order:
+            transaction = store[index]
             # Calculate delay based on timestamp difference
             time_diff = (transaction.timestamp - start_time).total_seconds()
             delay = time_diff / speed_multiplier
@@ -315,8 +640,8 @@ class HuggingFaceDataLoader:
             if delay > 0:
                 await asyncio.sleep(delay)
             
-            # Insert transaction into MongoDB
-            await mongodb.insert_transaction(transaction)
+            # Insert transaction into MongoDB (buffered while it is unavailable)
+            await storage_router.insert_transaction(transaction)
             
             logger.info(f"📊 Replayed transaction: {transaction.transaction_id} - {transaction.status}")
         
@@ -327,20 +652,19 @@ class HuggingFaceDataLoader:
         if not self.processed_transactions:
             return {}
         
-        total_transactions = len(self.processed_transactions)
-        failed_transactions = len([t for t in self.processed_transactions if t.status == 'failed'])
-        successful_transactions = len([t for t in self.processed_transactions if t.status == 'success'])
-        pending_transactions = len([t for t in self.processed_transactions if t.status == 'pending'])
+        store = self.processed_transactions
+        status_counts = store.status_counts()
+        total_transactions = len(store)
+        failed_transactions = status_counts.get('failed', 0)
+        successful_transactions = status_counts.get('success', 0)
+        pending_transactions = status_counts.get('pending', 0)
         
         # Failure type distribution
-        failure_types = {}
-        for transaction in self.processed_transactions:
-            if transaction.failure_type:
-                ft = transaction.failure_type.value
-                failure_types[ft] = failure_types.get(ft, 0) + 1
+        failure_types = store.failure_type_counts()
         
         # Amount statistics
-        amounts = [t.amount for t in self.processed_transactions]
+        amounts = store.amounts
+        earliest, latest = store.timestamp_range()
         
         return {
             'total_transactions': total_transactions,
@@ -357,11 +681,55 @@ class HuggingFaceDataLoader:
                 'total_amount': sum(amounts) if amounts else 0
             },
             'date_range': {
-                'earliest': min(t.timestamp for t in self.processed_transactions).isoformat() if self.processed_transactions else None,
-                'latest': max(t.timestamp for t in self.processed_transactions).isoformat() if self.processed_transactions else None
+                'earliest': earliest.isoformat(),
+                'latest': latest.isoformat()
             }
         }
 
+def new_seed() -> int:
+    """Seed for the random fill-ins of one ingestion run"""
+    return int(np.random.SeedSequence().entropy % 2 ** 32)
+
+def chunk_rng(seed: int, offset: int) -> np.random.Generator:
+    """Generator for one chunk: its output depends on the run seed and chunk offset, not on the worker"""
+    return np.random.default_rng([seed, offset])
+
+@lru_cache(maxsize=None)
+def _record_mapper() -> "HuggingFaceDataLoader":
+    """Loader whose per-record mapping serves as the fallback, built once per worker process"""
+    return HuggingFaceDataLoader()
+
+def map_chunk(table: pa.Table, offset: int, id_date: str, seed: int) -> Union[Dict[str, List[Any]], List[Transaction]]:
+    """Transaction columns for one chunk, or per-record Transactions when the batch cannot be mapped as a whole
+
+    Runs in ingestion worker processes; columns are much cheaper to send back than Transactions.
+    """
+    try:
+        return transform_columns(table, offset, id_date, chunk_rng(seed, offset))
+    except Exception as e:
+        logger.warning(f"⚠️ Batch mapping failed at record {offset}, mapping records one by one: {e}")
+        return _record_mapper()._transform_records(table, offset, id_date, chunk_rng(seed, offset))
+
+def _as_transactions(mapped: Union[Dict[str, List[Any]], List[Transaction]]) -> List[Transaction]:
+    return mapped if isinstance(mapped, list) else columns_to_transactions(mapped)
+
+def _as_columns(mapped: Union[Dict[str, List[Any]], List[Transaction]]) -> Dict[str, List[Any]]:
+    if not isinstance(mapped, list):
+        return mapped
+    return {field: [getattr(transaction, field) for transaction in mapped] for field in TRANSACTION_FIELDS} if mapped else {}
+
+def _load_local_dataset(path: str) -> DatasetDict:
+    """A local copy: a save_to_disk directory, or data files (CSV/JSON/Parquet) that load_dataset can read"""
+    if os.path.exists(os.path.join(path, "dataset_dict.json")) or os.path.exists(os.path.join(path, "state.json")):
+        dataset = load_from_disk(path)
+    else:
+        dataset = load_dataset(path)
+    return DatasetDict(train=dataset) if isinstance(dataset, Dataset) else dataset
+
+def _compact(table: pa.Table) -> pa.Table:
+    """Copy a table slice into its own buffers; pickling a slice would ship the whole parent batch"""
+    return pa.table({name: pa.concat_arrays(column.chunks) for name, column in zip(table.column_names, table.columns)})
+
 # Main execution function
 async def main():
     """Main function to load and ingest Hugging Face dataset"""
@@ -0,0 +1,290 @@
+"""
+Vectorized mapping of Hugging Face dataset batches to transactions
+Each Arrow batch is mapped with pyarrow compute kernels and lookup tables instead of per-record Python
+"""
+
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from models.transaction import Transaction, FailureType, construct_transaction
+
+# Tried in order per record; a batch tries its most common format first
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%m/%d/%Y')
+
+VPA_DOMAINS = ('paytm', 'phonepe', 'gpay', 'amazonpay', 'mobikwik', 'ybl', 'ibl', 'axl')
+
+DOMAIN_TO_BANK = {
+    'paytm': 'PAYTM',
+    'phonepe': 'YESBANK',
+    'gpay': 'AXIS',
+    'amazonpay': 'AXIS',
+    'mobikwik': 'YESBANK',
+    'ybl': 'YES',
+    'ibl': 'IDBI',
+    'axl': 'AXIS'
+}
+
+ERROR_CODES = {
+    FailureType.INSUFFICIENT_FUNDS: ('U30', 'E001', 'BAL_LOW'),
+    FailureType.INVALID_VPA: ('U16', 'E002', 'VPA_INVALID'),
+    FailureType.NETWORK_ISSUE: ('U69', 'E003', 'NET_TIMEOUT'),
+    FailureType.BANK_SERVER_ERROR: ('U28', 'E004', 'BANK_DOWN'),
+    FailureType.DAILY_LIMIT_EXCEEDED: ('U53', 'E005', 'LIMIT_EXCEED'),
+    FailureType.AUTHENTICATION_FAILED: ('U17', 'E008', 'AUTH_FAIL')
+}
+DEFAULT_ERROR_CODES = ('U99', 'E999')
+
+# Checked in order: the first matching keyword group decides the failure type
+ISSUE_KEYWORDS = (
+    (('insufficient', 'balance', 'fund'), FailureType.INSUFFICIENT_FUNDS),
+    (('invalid', 'vpa', 'id', 'account'), FailureType.INVALID_VPA),
+    (('network', 'timeout', 'connection', 'connectivity'), FailureType.NETWORK_ISSUE),
+    (('server', 'bank', 'downtime', 'maintenance'), FailureType.BANK_SERVER_ERROR),
+    (('limit', 'exceeded', 'maximum'), FailureType.DAILY_LIMIT_EXCEEDED),
+    (('pin', 'auth', 'verification', 'otp'), FailureType.AUTHENTICATION_FAILED),
+)
+
+DATASET_SOURCE = 'huggingface_deepakjoshi1606'
+
+# 'H[:M[:S[:...]]]' with the leniency of int(): surrounding spaces and a leading '+'
+_TIME_PATTERN = r'^\s*\+?(?P<h>\d+)\s*(?::\s*\+?(?P<m>\d+)\s*(?::\s*\+?(?P<s>\d+)\s*(?::.*)?)?)?$'
+# What float() accepts once everything but digits and dots is stripped
+_AMOUNT_PATTERN = r'^(\d+\.?\d*|\.\d+)$'
+
+Batch = Union[pa.Table, pa.RecordBatch, Mapping[str, Sequence[Any]]]
+
+
+def map_issue_type(issue_type: Any) -> Optional[FailureType]:
+    """Dataset issue type -> FailureType (network issue when nothing matches)"""
+    if not issue_type:
+        return None
+    issue_lower = str(issue_type).lower()
+    for keywords, failure_type in ISSUE_KEYWORDS:
+        if any(keyword in issue_lower for keyword in keywords):
+            return failure_type
+    return FailureType.NETWORK_ISSUE
+
+
+def map_resolution(resolution: Any) -> str:
+    """Dataset resolution -> transaction status"""
+    if not resolution or pd.isna(resolution):
+        return 'failed'
+    resolution_lower = str(resolution).lower()
+    if any(keyword in resolution_lower for keyword in ['success', 'completed', 'resolved', 'fixed']):
+        return 'success'
+    if any(keyword in resolution_lower for keyword in ['pending', 'processing', 'in progress']):
+        return 'pending'
+    return 'failed'
+
+
+def to_table(batch: Batch) -> pa.Table:
+    """Arrow view of a batch; dict-of-lists columns with mixed value types are stringified"""
+    if isinstance(batch, pa.Table):
+        return batch
+    if isinstance(batch, pa.RecordBatch):
+        return pa.Table.from_batches([batch])
+    arrays = {}
+    for name, values in batch.items():
+        try:
+            arrays[name] = pa.array(values, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays[name] = pa.array([None if value is None else str(value) for value in values], pa.string())
+    return pa.table(arrays)
+
+
+def batch_records(batch: Batch) -> List[Dict[str, Any]]:
+    """Row dicts of a batch, values as the dataset holds them"""
+    if isinstance(batch, (pa.Table, pa.RecordBatch)):
+        return batch.to_pylist()
+    return [dict(zip(batch, values)) for values in zip(*batch.values())]
+
+
+def _is_text(column: pa.ChunkedArray) -> bool:
+    return pa.types.is_string(column.type) or pa.types.is_large_string(column.type)
+
+
+def _column(table: pa.Table, name: str, default: Any = None) -> pa.ChunkedArray:
+    """A dataset column; missing columns are filled with default"""
+    if name in table.column_names:
+        return table.column(name)
+    return pa.chunked_array([pa.nulls(table.num_rows) if default is None else pa.array([default] * table.num_rows)])
+
+
+def _lookup(column: pa.ChunkedArray, mapper: Callable[[Any], Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """(mapped distinct values, per-row index into them): the mapper runs once per distinct value"""
+    encoded = pc.dictionary_encode(column.combine_chunks())
+    mapped = np.array([mapper(value) for value in encoded.dictionary.to_pylist()] + [mapper(None)], dtype=object)
+    indices = encoded.indices.fill_null(len(encoded.dictionary)).to_numpy(zero_copy_only=False)
+    return mapped, indices
+
+
+def _parse_dates(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """Midnight timestamps; the batch's most common format is tried first, unparsed values are null"""
+    if pa.types.is_timestamp(column.type) or pa.types.is_date(column.type):
+        return pc.cast(column, pa.timestamp('s'))
+    if not _is_text(column):
+        return pa.chunked_array([pa.nulls(len(column), pa.timestamp('s'))])
+    attempts = {fmt: pc.strptime(column, format=fmt, unit='s', error_is_null=True) for fmt in DATE_FORMATS}
+    order = sorted(DATE_FORMATS, key=lambda fmt: attempts[fmt].null_count)
+    return pc.coalesce(*(attempts[fmt] for fmt in order))
+
+
+def _parse_times(column: pa.ChunkedArray, rng: np.random.Generator) -> np.ndarray:
+    """Seconds into the day; invalid or missing times get a random one"""
+    count = len(column)
+    seconds = np.zeros(count, dtype=np.int64)
+    valid = np.zeros(count, dtype=bool)
+    if _is_text(column):
+        parts = pc.extract_regex(column.combine_chunks(), _TIME_PATTERN)
+        valid = parts.is_valid().to_numpy(zero_copy_only=False).copy()
+        for field, limit, scale in (('h', 24, 3600), ('m', 60, 60), ('s', 60, 1)):
+            text = pc.struct_field(parts, field)
+            # Omitted minutes and seconds are zero
+            numbers = pc.cast(pc.if_else(pc.equal(text, ''), '0', text), pa.int64())
+            numbers = numbers.fill_null(0).to_numpy(zero_copy_only=False)
+            valid &= numbers < limit
+            seconds += numbers * scale
+    missing = ~valid
+    seconds[missing] = rng.integers(0, 86400, missing.sum())
+    return seconds
+
+
+def _parse_amounts(column: pa.ChunkedArray, rng: np.random.Generator) -> np.ndarray:
+    """Numbers pass through; strings drop everything but digits and dots; the rest is random"""
+    if pa.types.is_integer(column.type) or pa.types.is_floating(column.type):
+        amounts = pc.cast(column, pa.float64())
+    elif _is_text(column):
+        cleaned = pc.replace_substring_regex(column, r'[^\d.]+', '')
+        cleaned = pc.if_else(pc.match_substring_regex(cleaned, _AMOUNT_PATTERN), cleaned, None)
+        amounts = pc.cast(cleaned, pa.float64())
+    else:
+        amounts = pa.chunked_array([pa.nulls(len(column), pa.float64())])
+    values = amounts.to_numpy().astype(np.float64, copy=True)
+    missing = np.isnan(values)
+    values[missing] = np.round(rng.uniform(100, 50000, missing.sum()), 2)
+    return values
+
+
+def _vpas(hints: pa.ChunkedArray, rng: np.random.Generator):
+    """(VPAs, banks) generated from name hints, with random domains"""
+    count = len(hints)
+    if _is_text(hints):
+        # Names repeat across records, so each distinct hint is cleaned once
+        encoded = pc.dictionary_encode(hints.combine_chunks())
+        cleaned = pc.replace_substring_regex(pc.utf8_lower(encoded.dictionary), r'[^a-zA-Z0-9]+', '')
+        names = pc.utf8_slice_codeunits(cleaned, 0, 10).take(encoded.indices)
+    else:
+        names = pa.nulls(count, pa.string())
+    unnamed = pc.fill_null(pc.equal(names, ''), True)
+    numbers = pa.array(rng.integers(1000, 10000, pc.sum(unnamed).as_py() or 0))
+    names = pc.replace_with_mask(names, unnamed, pc.binary_join_element_wise('user', pc.cast(numbers, pa.string()), ''))
+    domain_codes = pa.array(rng.integers(0, len(VPA_DOMAINS), count))
+    domains = pa.array(['@' + domain for domain in VPA_DOMAINS]).take(domain_codes)
+    banks = pa.array([DOMAIN_TO_BANK[domain] for domain in VPA_DOMAINS]).take(domain_codes)
+    return pc.binary_join_element_wise(names, domains, '').to_pylist(), banks.to_pylist()
+
+
+def transform_columns(
+    batch: Batch,
+    offset: int,
+    id_date: str,
+    rng: np.random.Generator,
+    processed_at: Optional[str] = None
+) -> Dict[str, List[Any]]:
+    """Map one batch of dataset records to transaction field columns
+
+    offset is the dataset index of the first record, used for transaction IDs.
+    """
+    table = to_table(batch)
+    count = table.num_rows
+    if count == 0:
+        return {}
+    now = datetime.now()
+
+    # Unparseable or missing dates fall back to today
+    today = pa.scalar(now.replace(hour=0, minute=0, second=0, microsecond=0), pa.timestamp('s'))
+    days = pc.fill_null(_parse_dates(_column(table, 'Date')), today).to_numpy()
+    seconds = _parse_times(_column(table, 'Time'), rng)
+    timestamps = (days + seconds.astype('timedelta64[s]')).astype(datetime).tolist()
+
+    issue_types = _column(table, 'Issue Type', default='')
+    issue_failure_types, issue_indices = _lookup(issue_types, map_issue_type)
+    failure_types = issue_failure_types[issue_indices]
+    resolutions = _column(table, 'Resolution', default='')
+    resolution_statuses, resolution_indices = _lookup(resolutions, map_resolution)
+    statuses = resolution_statuses[resolution_indices]
+    failed = statuses == 'failed'
+
+    # The description is the failure reason, or the issue type when the dataset has no descriptions
+    issue_values = issue_types.to_pylist()
+    descriptions = _column(table, 'Description', default='').to_pylist()
+    reasons = descriptions if 'Description' in table.column_names else issue_values
+    failure_reasons = np.array(reasons, dtype=object)
+    failure_reasons[~failed] = None
+
+    # Error codes: one random pick per failed row from its failure type's codes
+    error_codes = np.full(count, None, dtype=object)
+    picks = rng.random(count)
+    for issue, failure_type in enumerate(issue_failure_types):
+        rows = failed & (issue_indices == issue)
+        if failure_type is None or not rows.any():
+            continue
+        codes = np.array(ERROR_CODES.get(failure_type, DEFAULT_ERROR_CODES), dtype=object)
+        error_codes[rows] = codes[(picks[rows] * len(codes)).astype(int)]
+
+    sender_vpas, sender_banks = _vpas(_column(table, 'Sender'), rng)
+    receiver_vpas, receiver_banks = _vpas(_column(table, 'Receiver'), rng)
+    retry_counts = np.where(failed, rng.integers(0, 4, count), 0)
+
+    ids = pc.utf8_lpad(pc.cast(pa.array(np.arange(offset, offset + count)), pa.string()), 6, '0')
+    transaction_ids = pc.binary_join_element_wise(f"UPI{id_date}", ids, '')
+
+    processed_at = processed_at or now.isoformat()
+    metadata = [
+        {
+            'original_issue_type': issue_type,
+            'original_description': description,
+            'original_resolution': resolution,
+            'dataset_source': DATASET_SOURCE,
+            'processed_at': processed_at
+        }
+        for issue_type, description, resolution in zip(issue_values, descriptions, resolutions.to_pylist())
+    ]
+
+    return {
+        'transaction_id': transaction_ids.to_pylist(),
+        'timestamp': timestamps,
+        'amount': _parse_amounts(_column(table, 'Amount'), rng).tolist(),
+        'sender_vpa': sender_vpas,
+        'receiver_vpa': receiver_vpas,
+        'sender_bank': sender_banks,
+        'receiver_bank': receiver_banks,
+        'status': statuses.tolist(),
+        'failure_reason': failure_reasons.tolist(),
+        'failure_type': failure_types.tolist(),
+        'error_code': error_codes.tolist(),
+        'retry_count': retry_counts.tolist(),
+        'metadata': metadata
+    }
+
+
+def columns_to_transactions(columns: Dict[str, List[Any]]) -> List[Transaction]:
+    """Transactions from transform_columns output (already valid, so no per-row validation)"""
+    if not columns:
+        return []
+    names = list(columns)
+    return [construct_transaction(dict(zip(names, values))) for values in zip(*columns.values())]
+
+
+def transform_batch(
+    batch: Batch,
+    offset: int,
+    id_date: str,
+    rng: np.random.Generator,
+    processed_at: Optional[str] = None
+) -> List[Transaction]:
+    """Map one batch of dataset records to Transactions"""
+    return columns_to_transactions(transform_columns(batch, offset, id_date, rng, processed_at))
@@ -3,36 +3,192 @@ Advanced MongoDB queries for UPI Diagnosis Platform
 Optimized aggregation pipelines for complex analytics
 """
 
-from typing import List, Dict, Any, Optional
-from datetime import datetime, timedelta
+import os
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from statistics import NormalDist
+import numpy as np
 from database.mongodb import mongodb
+from database.pair_matrix import PAIR_DIMENSIONS, dense_matrix, pair_matrix
+from database.retry_chains import retry_chain_engine, summarize_chains
+from database.rollups import floor_day, rollup_manager
+from database.sketches import HyperLogLog, TDigest
+from database.query_cache import cached_query
+from database.search import combine, plan_search, relevance_stage, substring_filter
 import logging
 
 logger = logging.getLogger(__name__)
 
+SAMPLE_PROJECTION = {"_id": 0, "sender_bank": 1, "status": 1, "failure_type": 1, "amount": 1}
+DASHBOARD_SETTLE_SECONDS = float(os.getenv("DASHBOARD_SETTLE_SECONDS", "5"))
+
+
+def _windowed(pipeline: List[Dict[str, Any]], start: Optional[datetime], end: Optional[datetime]) -> List[Dict[str, Any]]:
+    """Push the time window into the leading $match so the timestamp index bounds the scan"""
+    window = {}
+    if start is not None:
+        window["$gte"] = start
+    if end is not None:
+        window["$lt"] = end
+    if window:
+        if pipeline and "$match" in pipeline[0]:
+            pipeline = [{"$match": {**pipeline[0]["$match"], "timestamp": window}}] + pipeline[1:]
+        else:
+            pipeline = [{"$match": {"timestamp": window}}] + pipeline
+    return mongodb.archive_union(pipeline, start)
+
+
+async def _pair_cells(
+    dimension: str, start: Optional[datetime], end: Optional[datetime]
+) -> Dict[Tuple[Any, Any], Dict[str, Any]]:
+    """(sender, receiver) cells from the persisted pair matrix, or raw rows for windows it can't serve
+
+    The matrix holds whole days, so windows that don't fall on midnight are grouped from
+    the stored (pre-extracted) fields instead.
+    """
+    day_aligned = all(bound is None or bound == floor_day(bound) for bound in (start, end))
+    if pair_matrix.ready and day_aligned:
+        return await pair_matrix.cells(dimension, start, end)
+
+    sender_field, receiver_field = PAIR_DIMENSIONS[dimension]
+    pipeline = _windowed([
+        {
+            "$group": {
+                "_id": {"sender": f"${sender_field}", "receiver": f"${receiver_field}", "failure_type": "$failure_type"},
+                "count": {"$sum": 1},
+                "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}},
+                "amount_sum": {"$sum": "$amount"}
+            }
+        }
+    ], start, end)
+    cells: Dict[Tuple[Any, Any], Dict[str, Any]] = {}
+    async for row in mongodb.analytics_transactions.aggregate(pipeline):
+        group = row["_id"]
+        cell = cells.setdefault(
+            (group.get("sender"), group.get("receiver")),
+            {"count": 0, "failed": 0, "amount_sum": 0.0, "failure_types": {}}
+        )
+        cell["count"] += row["count"]
+        cell["failed"] += row["failed"]
+        cell["amount_sum"] += row["amount_sum"]
+        if group.get("failure_type"):
+            cell["failure_types"][group["failure_type"]] = row["count"]
+    return cells
+
+
+def _stratified_mean(strata: List[Tuple[int, List[Dict[str, Any]]]], value_of) -> Tuple[float, float]:
+    """Post-stratified mean of value_of(row) and its standard error; strata are (population, sampled rows)"""
+    population = sum(size for size, _ in strata)
+    estimate = variance = 0.0
+    for size, rows in strata:
+        values = [value_of(row) for row in rows]
+        n = len(values)
+        mean = sum(values) / n
+        spread = sum((value - mean) ** 2 for value in values) / max(n - 1, 1)
+        weight = size / population
+        estimate += weight * mean
+        # Finite population correction: a stratum sampled in full has no sampling error; sampled rows
+        # can outnumber the counted population when writes land between the count and the sample
+        variance += weight ** 2 * max(0.0, 1 - n / size) * spread / n
+    return estimate, variance ** 0.5
+
+
+def _failed(row: Dict[str, Any]) -> float:
+    return 1.0 if row.get("status") == "failed" else 0.0
+
+
+def _amount(row: Dict[str, Any]) -> float:
+    return float(row.get("amount") or 0.0)
+
+
+def _interval(estimate: float, stderr: float, z: float, scale: float = 1.0, floor: Optional[float] = 0.0) -> Dict[str, float]:
+    lower = estimate - z * stderr
+    return {
+        "estimate": round(estimate * scale, 4),
+        "lower": round((max(lower, floor) if floor is not None else lower) * scale, 4),
+        "upper": round((estimate + z * stderr) * scale, 4),
+    }
+
+
+def _dashboard_panels(match: Optional[Dict[str, Any]] = None, prefix: str = "") -> Dict[str, List[Dict[str, Any]]]:
+    """$facet pipelines of the dashboard panels over the rows matching match
+
+    Every failure type is counted (not just the top few) so incremental panels can be merged.
+    """
+    head = [{"$match": match}] if match else []
+    return {
+        f"{prefix}recent_stats": head + [
+            {
+                "$group": {
+                    "_id": None,
+                    "total": {"$sum": 1},
+                    "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}},
+                    "avg_amount": {"$avg": "$amount"},
+                    "total_volume": {"$sum": "$amount"}
+                }
+            }
+        ],
+        f"{prefix}top_failures": head + [
+            {"$match": {"status": "failed"}},
+            {"$group": {"_id": "$failure_type", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1}}
+        ],
+        f"{prefix}hourly_trend": head + [
+            {
+                "$group": {
+                    "_id": {"$hour": "$timestamp"},
+                    "total": {"$sum": 1},
+                    "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}}
+                }
+            },
+            {"$sort": {"_id": 1}}
+        ]
+    }
+
+
+def _dashboard_result(facets: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    recent_stats = facets.get(f"{prefix}recent_stats", [])
+    return {
+        "recent_stats": recent_stats[0] if recent_stats else {},
+        "top_failures": facets.get(f"{prefix}top_failures", []),
+        "hourly_trend": facets.get(f"{prefix}hourly_trend", [])
+    }
+
+
+def _sketch_summary(count: int, senders: HyperLogLog, receivers: HyperLogLog, amounts: TDigest) -> Dict[str, Any]:
+    percentiles = {f"p{q}": amounts.quantile(q / 100) for q in (50, 95, 99)}
+    return {
+        "total_transactions": count,
+        "distinct_sender_vpas": senders.estimate(),
+        "distinct_receiver_vpas": receivers.estimate(),
+        "amount_percentiles": {
+            name: round(value, 2) if value is not None else None for name, value in percentiles.items()
+        }
+    }
+
+
 class AdvancedQueries:
     """Advanced MongoDB aggregation queries for deep analytics"""
     
     @staticmethod
-    async def get_failure_patterns_by_time() -> List[Dict[str, Any]]:
+    async def get_failure_patterns_by_time(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
         """Analyze failure patterns by hour of day"""
         try:
-            pipeline = [
-                {"$match": {"status": "failed"}},
+            cells = await rollup_manager.cube(
+                ["hour_of_day", "failure_type"], match={"status": "failed"}, start=start, end=end
+            )
+            result = [
                 {
-                    "$group": {
-                        "_id": {
-                            "hour": {"$hour": "$timestamp"},
-                            "failure_type": "$failure_type"
-                        },
-                        "count": {"$sum": 1},
-                        "avg_amount": {"$avg": "$amount"}
-                    }
-                },
-                {"$sort": {"_id.hour": 1, "count": -1}}
+                    "_id": {"hour": cell["hour_of_day"], "failure_type": cell["failure_type"]},
+                    "count": cell["count"],
+                    "avg_amount": cell["amount_sum"] / cell["count"] if cell["count"] else None
+                }
+                for cell in cells
             ]
-            
-            result = await mongodb.transactions_collection.aggregate(pipeline).to_list(length=None)
+            result.sort(key=lambda item: (item["_id"]["hour"], -item["count"]))
             return result
             
         except Exception as e:
@@ -40,39 +196,35 @@ class AdvancedQueries:
             return []
     
     @staticmethod
-    async def get_bank_performance_metrics() -> List[Dict[str, Any]]:
+    @cached_query("bank_performance")
+    async def get_bank_performance_metrics(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
         """Get performance metrics by bank"""
         try:
-            pipeline = [
-                {
-                    "$group": {
-                        "_id": "$sender_bank",
-                        "total_transactions": {"$sum": 1},
-                        "failed_transactions": {
-                            "$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}
-                        },
-                        "total_amount": {"$sum": "$amount"},
-                        "avg_amount": {"$avg": "$amount"},
-                        "failure_types": {"$addToSet": "$failure_type"}
-                    }
-                },
-                {
-                    "$addFields": {
-                        "success_rate": {
-                            "$multiply": [
-                                {"$divide": [
-                                    {"$subtract": ["$total_transactions", "$failed_transactions"]},
-                                    "$total_transactions"
-                                ]},
-                                100
-                            ]
-                        }
-                    }
-                },
-                {"$sort": {"success_rate": -1}}
-            ]
+            cells = await rollup_manager.cube(["sender_bank", "failure_type"], start=start, end=end)
             
-            result = await mongodb.transactions_collection.aggregate(pipeline).to_list(length=None)
+            banks: Dict[Any, Dict[str, Any]] = {}
+            for cell in cells:
+                bank = banks.setdefault(cell["sender_bank"], {
+                    "_id": cell["sender_bank"],
+                    "total_transactions": 0,
+                    "failed_transactions": 0,
+                    "total_amount": 0,
+                    "failure_types": []
+                })
+                bank["total_transactions"] += cell["count"]
+                bank["failed_transactions"] += cell["failed"]
+                bank["total_amount"] += cell["amount_sum"]
+                bank["failure_types"].append(cell["failure_type"])
+            
+            result = list(banks.values())
+            for bank in result:
+                total = bank["total_transactions"]
+                bank["avg_amount"] = bank["total_amount"] / total
+                bank["success_rate"] = (total - bank["failed_transactions"]) / total * 100
+            result.sort(key=lambda item: item["success_rate"], reverse=True)
             return result
             
         except Exception as e:
@@ -80,52 +232,79 @@ class AdvancedQueries:
             return []
     
     @staticmethod
-    async def get_vpa_domain_analysis() -> List[Dict[str, Any]]:
-        """Analyze transaction patterns by VPA domain (paytm, phonepe, etc.)"""
+    async def get_hourly_analytics(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        granularity: str = "hour"
+    ) -> List[Dict[str, Any]]:
+        """Transaction totals per hour (or day) bucket for charts, served from rollups"""
         try:
-            pipeline = [
-                {
-                    "$addFields": {
-                        "sender_domain": {
-                            "$arrayElemAt": [
-                                {"$split": ["$sender_vpa", "@"]}, 1
-                            ]
-                        },
-                        "receiver_domain": {
-                            "$arrayElemAt": [
-                                {"$split": ["$receiver_vpa", "@"]}, 1
-                            ]
-                        }
-                    }
-                },
-                {
-                    "$group": {
-                        "_id": {
-                            "sender_domain": "$sender_domain",
-                            "receiver_domain": "$receiver_domain"
-                        },
-                        "transaction_count": {"$sum": 1},
-                        "failure_count": {
-                            "$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}
-                        },
-                        "avg_amount": {"$avg": "$amount"},
-                        "common_failures": {"$addToSet": "$failure_type"}
-                    }
-                },
+            dimensions = ["date", "hour_of_day"] if granularity == "hour" else ["date"]
+            cells = await rollup_manager.cube(dimensions, start=start, end=end)
+            cells.sort(key=lambda cell: (cell["date"], cell.get("hour_of_day", 0)))
+            
+            chart_data = [
                 {
-                    "$addFields": {
-                        "failure_rate": {
-                            "$multiply": [
-                                {"$divide": ["$failure_count", "$transaction_count"]},
-                                100
-                            ]
-                        }
-                    }
-                },
-                {"$sort": {"transaction_count": -1}}
+                    "hour": f"{cell['hour_of_day']:02d}:00" if granularity == "hour" else None,
+                    "date": cell["date"],
+                    "timestamp": f"{cell['date']}T{cell.get('hour_of_day', 0):02d}:00:00",
+                    "total": cell["count"],
+                    "failed": cell["failed"],
+                    "successful": cell["successful"]
+                }
+                for cell in cells
             ]
+            logger.info(f"📊 Retrieved hourly data for {len(chart_data)} periods")
+            return chart_data
+            
+        except Exception as e:
+            logger.error(f"Error retrieving hourly analytics: {e}")
+            return []
+    
+    @staticmethod
+    async def get_live_metrics() -> Dict[str, Any]:
+        """Overall totals for live monitoring, served from day rollups plus the open bucket"""
+        try:
+            cells = await rollup_manager.cube([])
+            if not cells:
+                return {}
+            totals = cells[0]
+            return {
+                "_id": None,
+                "total_transactions": totals["count"],
+                "active_failures": totals["failed"],
+                "total_volume": totals["amount_sum"],
+                "avg_transaction_value": totals["amount_sum"] / totals["count"] if totals["count"] else None
+            }
             
-            result = await mongodb.transactions_collection.aggregate(pipeline).to_list(length=None)
+        except Exception as e:
+            logger.error(f"Error getting live metrics: {e}")
+            return {}
+    
+    @staticmethod
+    @cached_query("vpa_domains")
+    async def get_vpa_domain_analysis(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Analyze transaction patterns by VPA domain (paytm, phonepe, etc.)"""
+        try:
+            cells = await _pair_cells("domain", start, end)
+            result = []
+            for (sender_domain, receiver_domain), cell in cells.items():
+                common_failures = list(cell["failure_types"])
+                # Rows without a failure type (successes) show up as null, as $addToSet reported them
+                if cell["count"] > sum(cell["failure_types"].values()):
+                    common_failures.append(None)
+                result.append({
+                    "_id": {"sender_domain": sender_domain, "receiver_domain": receiver_domain},
+                    "transaction_count": cell["count"],
+                    "failure_count": cell["failed"],
+                    "avg_amount": cell["amount_sum"] / cell["count"] if cell["count"] else None,
+                    "common_failures": common_failures,
+                    "failure_rate": cell["failed"] / cell["count"] * 100 if cell["count"] else None
+                })
+            result.sort(key=lambda item: item["transaction_count"], reverse=True)
             return result
             
         except Exception as e:
@@ -133,7 +312,38 @@ class AdvancedQueries:
             return []
     
     @staticmethod
-    async def get_amount_based_failure_analysis() -> List[Dict[str, Any]]:
+    @cached_query("pair_matrix")
+    async def get_pair_matrix(
+        dimension: str = "bank",
+        measure: str = "count",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Sender x receiver matrix (bank or VPA domain) of one measure, as rows for a heat map"""
+        try:
+            cells = await _pair_cells(dimension, start, end)
+            senders, receivers, values = dense_matrix(cells, measure)
+            return {
+                "dimension": dimension,
+                "measure": measure,
+                "since": start.isoformat() if start else None,
+                "until": end.isoformat() if end else None,
+                "senders": senders,
+                "receivers": receivers,
+                "matrix": [[None if np.isnan(value) else float(value) for value in row] for row in values],
+                "total_transactions": sum(cell["count"] for cell in cells.values())
+            }
+            
+        except Exception as e:
+            logger.error(f"Error building pair matrix: {e}")
+            return {}
+    
+    @staticmethod
+    @cached_query("amount_based_failures")
+    async def get_amount_based_failure_analysis(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
         """Analyze failure patterns based on transaction amounts"""
         try:
             pipeline = [
@@ -166,7 +376,7 @@ class AdvancedQueries:
                 {"$sort": {"_id.amount_range": 1, "count": -1}}
             ]
             
-            result = await mongodb.transactions_collection.aggregate(pipeline).to_list(length=None)
+            result = await mongodb.analytics_transactions.aggregate(_windowed(pipeline, start, end)).to_list(length=None)
             return result
             
         except Exception as e:
@@ -174,7 +384,11 @@ class AdvancedQueries:
             return []
     
     @staticmethod
-    async def get_retry_pattern_analysis() -> List[Dict[str, Any]]:
+    @cached_query("retry_patterns")
+    async def get_retry_pattern_analysis(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
         """Analyze retry patterns and success rates"""
         try:
             pipeline = [
@@ -204,7 +418,7 @@ class AdvancedQueries:
                 {"$sort": {"_id.retry_count": 1}}
             ]
             
-            result = await mongodb.transactions_collection.aggregate(pipeline).to_list(length=None)
+            result = await mongodb.analytics_transactions.aggregate(_windowed(pipeline, start, end)).to_list(length=None)
             return result
             
         except Exception as e:
@@ -212,56 +426,77 @@ class AdvancedQueries:
             return []
     
     @staticmethod
-    async def get_real_time_dashboard_data() -> Dict[str, Any]:
-        """Get comprehensive real-time dashboard data"""
+    @cached_query("retry_chains")
+    async def get_retry_chain_analysis(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Retry outcomes of linked attempt chains per failure type, from the hourly chain counts"""
         try:
-            # Last 24 hours data
-            last_24h = datetime.utcnow() - timedelta(hours=24)
-            
-            # Multiple aggregations in parallel
-            recent_stats_pipeline = [
-                {"$match": {"timestamp": {"$gte": last_24h}}},
-                {
-                    "$group": {
-                        "_id": None,
-                        "total": {"$sum": 1},
-                        "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}},
-                        "avg_amount": {"$avg": "$amount"},
-                        "total_volume": {"$sum": "$amount"}
-                    }
-                }
-            ]
+            rows = await retry_chain_engine.stats(start, end)
+            linked_until = await retry_chain_engine.get_watermark(collection=mongodb.analytics_state)
+            return {
+                "since": start.isoformat() if start else None,
+                "until": end.isoformat() if end else None,
+                "linked_until": linked_until.isoformat() if linked_until else None,
+                "gap_seconds": retry_chain_engine.gap.total_seconds(),
+                "chains": sum(row["count"] for row in rows),
+                "failure_types": summarize_chains(rows, retry_chain_engine.min_success_probability)
+            }
             
-            # Top failure reasons in last 24h
-            top_failures_pipeline = [
-                {"$match": {"timestamp": {"$gte": last_24h}, "status": "failed"}},
-                {"$group": {"_id": "$failure_type", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}},
-                {"$limit": 5}
-            ]
+        except Exception as e:
+            logger.error(f"Error analyzing retry chains: {e}")
+            return {}
+    
+    @staticmethod
+    async def get_real_time_dashboard_data(since: Optional[datetime] = None) -> Dict[str, Any]:
+        """Get comprehensive real-time dashboard data
+        
+        The dashboard covers rows ingested before `as_of` with a timestamp in the 24 hours before
+        it. With `since` (a previous response's `as_of`, at most 24 hours old) the response is
+        incremental: the top-level panels hold the rows that entered the window since then, and
+        `expired` the rows that left it. The client adds the first and subtracts the second,
+        then recomputes avg_amount as total_volume / total. Entry is keyed on ingestion time
+        (created_at), so rows that arrive late with old timestamps are still counted. When
+        `incremental` is false the response is a full snapshot that replaces the client's state.
+        """
+        try:
+            # Trail the clock so batches stamped just before as_of have landed when it is read
+            as_of = datetime.utcnow() - timedelta(seconds=DASHBOARD_SETTLE_SECONDS)
+            window_start = as_of - timedelta(hours=24)
+            if since is not None and since.tzinfo is not None:
+                since = since.astimezone(timezone.utc).replace(tzinfo=None)
+            incremental = since is not None and window_start <= since <= as_of
             
-            # Hourly trend for last 24h
-            hourly_trend_pipeline = [
-                {"$match": {"timestamp": {"$gte": last_24h}}},
-                {
-                    "$group": {
-                        "_id": {"$hour": "$timestamp"},
-                        "total": {"$sum": 1},
-                        "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}}
-                    }
-                },
-                {"$sort": {"_id": 1}}
-            ]
+            # Documents from before created_at was stored count as ingested long ago
+            ingested = {"created_at": {"$not": {"$gte": as_of}}}
+            if incremental:
+                # One scan of both windows feeds the entered and the expired panels
+                match = {"timestamp": {"$gte": since - timedelta(hours=24), "$lt": as_of}, **ingested}
+                entered = {
+                    "timestamp": {"$gte": window_start},
+                    "$or": [{"created_at": {"$gte": since}}, {"timestamp": {"$gte": since}}]
+                }
+                expired = {"timestamp": {"$lt": window_start}, "created_at": {"$not": {"$gte": since}}}
+                facets = {**_dashboard_panels(entered), **_dashboard_panels(expired, prefix="expired_")}
+            else:
+                match = {"timestamp": {"$gte": window_start, "$lt": as_of}, **ingested}
+                facets = _dashboard_panels()
             
-            # Execute all pipelines
-            recent_stats = await mongodb.transactions_collection.aggregate(recent_stats_pipeline).to_list(1)
-            top_failures = await mongodb.transactions_collection.aggregate(top_failures_pipeline).to_list(5)
-            hourly_trend = await mongodb.transactions_collection.aggregate(hourly_trend_pipeline).to_list(24)
+            pipeline = [{"$match": match}, {"$facet": facets}]
+            result = await mongodb.analytics_transactions.aggregate(
+                mongodb.archive_union(pipeline, match["timestamp"]["$gte"])
+            ).to_list(1)
+            facets = result[0] if result else {}
             
+            data = _dashboard_result(facets)
+            if incremental:
+                data["expired"] = _dashboard_result(facets, prefix="expired_")
             return {
-                "recent_stats": recent_stats[0] if recent_stats else {},
-                "top_failures": top_failures,
-                "hourly_trend": hourly_trend,
+                **data,
+                "incremental": incremental,
+                "since": since.isoformat() if incremental else None,
+                "as_of": as_of.isoformat(),
                 "last_updated": datetime.utcnow().isoformat()
             }
             
@@ -277,27 +512,10 @@ class AdvancedQueries:
     ) -> List[Dict[str, Any]]:
         """Advanced text search across multiple fields"""
         try:
-            # Build search pipeline
-            search_pipeline = []
-            
-            # Text search stage
-            if query:
-                search_pipeline.append({
-                    "$match": {
-                        "$or": [
-                            {"transaction_id": {"$regex": query, "$options": "i"}},
-                            {"sender_vpa": {"$regex": query, "$options": "i"}},
-                            {"receiver_vpa": {"$regex": query, "$options": "i"}},
-                            {"failure_reason": {"$regex": query, "$options": "i"}},
-                            {"error_code": {"$regex": query, "$options": "i"}}
-                        ]
-                    }
-                })
+            filter_conditions = {}
             
             # Apply additional filters
             if filters:
-                filter_conditions = {}
-                
                 if filters.get("status"):
                     filter_conditions["status"] = filters["status"]
                 
@@ -319,29 +537,25 @@ class AdvancedQueries:
                     if filters.get("date_to"):
                         date_filter["$lte"] = filters["date_to"]
                     filter_conditions["timestamp"] = date_filter
-                
-                if filter_conditions:
-                    search_pipeline.append({"$match": filter_conditions})
             
-            # Add scoring for relevance
-            search_pipeline.extend([
-                {
-                    "$addFields": {
-                        "relevance_score": {
-                            "$add": [
-                                {"$cond": [{"$regexMatch": {"input": "$transaction_id", "regex": query, "options": "i"}}, 10, 0]},
-                                {"$cond": [{"$regexMatch": {"input": "$failure_reason", "regex": query, "options": "i"}}, 5, 0]},
-                                {"$cond": [{"$regexMatch": {"input": "$sender_vpa", "regex": query, "options": "i"}}, 3, 0]},
-                                {"$cond": [{"$regexMatch": {"input": "$receiver_vpa", "regex": query, "options": "i"}}, 3, 0]}
-                            ]
-                        }
-                    }
-                },
-                {"$sort": {"relevance_score": -1, "timestamp": -1}},
-                {"$limit": limit}
-            ])
+            # Indexed lookup first: anchored prefix for IDs/VPAs, otherwise the text index
+            plan = plan_search(query) if query else {"filter": None, "score": 0}
+            
+            def build_pipeline(search_filter, score):
+                return [
+                    {"$match": combine(search_filter, filter_conditions)},
+                    relevance_stage(score),
+                    {"$sort": {"relevance_score": -1, "timestamp": -1}},
+                    {"$limit": limit}
+                ]
+            
+            search_pipeline = build_pipeline(plan["filter"], plan["score"])
+            result = await mongodb.analytics_transactions.aggregate(search_pipeline).to_list(limit)
             
-            result = await mongodb.transactions_collection.aggregate(search_pipeline).to_list(limit)
+            if query and not result:
+                # Escaped substring scan for terms the indexes cannot match (e.g. mid-word fragments)
+                search_pipeline = build_pipeline(substring_filter(query), 1)
+                result = await mongodb.analytics_transactions.aggregate(search_pipeline).to_list(limit)
             
             # Convert ObjectId to string
             for doc in result:
@@ -353,5 +567,135 @@ class AdvancedQueries:
             logger.error(f"Error in advanced search: {e}")
             return []
 
+    @staticmethod
+    async def get_approximate_failure_analysis(
+        sample_size: int = 10000,
+        confidence: float = 0.95,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Failure rate, failure-type mix and amounts estimated from a $sample, post-stratified by bank
+
+        Bank sizes come from rollups, so only the sample is read. Without a time window
+        $sample uses MongoDB's random cursor; with one, the window is matched first.
+        Only the hot collection is sampled.
+        """
+        try:
+            if mongodb.archived_until is not None and (start is None or start < mongodb.archived_until):
+                start = mongodb.archived_until
+
+            cells = await rollup_manager.cube(["sender_bank"], start=start, end=end)
+            population = {cell["sender_bank"]: cell["count"] for cell in cells if cell["count"]}
+            total = sum(population.values())
+            if not total:
+                return {}
+
+            # start is clamped to the archive horizon, so this stays on the hot collection
+            pipeline = _windowed(
+                [{"$sample": {"size": min(sample_size, total)}}, {"$project": SAMPLE_PROJECTION}], start, end
+            )
+            rows = await mongodb.analytics_transactions.aggregate(pipeline).to_list(length=None)
+            if not rows:
+                return {}
+
+            sampled: Dict[Any, List[Dict[str, Any]]] = {}
+            for row in rows:
+                sampled.setdefault(row.get("sender_bank"), []).append(row)
+
+            # Banks with too few sampled rows for a variance are pooled into one stratum
+            strata, pooled_size, pooled_rows = [], 0, []
+            for bank, size in population.items():
+                bank_rows = sampled.get(bank, [])
+                if len(bank_rows) >= 2:
+                    strata.append((size, bank_rows))
+                else:
+                    pooled_size += size
+                    pooled_rows.extend(bank_rows)
+            if pooled_rows:
+                strata.append((pooled_size, pooled_rows))
+
+            z = NormalDist().inv_cdf((1 + confidence) / 2)
+            failure_rate = _interval(*_stratified_mean(strata, _failed), z, scale=100)
+
+            failure_types = sorted({row.get("failure_type") for row in rows if row.get("status") == "failed"}, key=str)
+            type_estimates = []
+            for failure_type in failure_types:
+                estimate, stderr = _stratified_mean(
+                    strata,
+                    lambda row: 1.0 if row.get("status") == "failed" and row.get("failure_type") == failure_type else 0.0
+                )
+                type_estimates.append({
+                    "failure_type": failure_type,
+                    "estimated_count": _interval(estimate, stderr, z, scale=total),
+                    "share_percent": _interval(estimate, stderr, z, scale=100)
+                })
+            type_estimates.sort(key=lambda item: item["estimated_count"]["estimate"], reverse=True)
+
+            banks = []
+            for bank, size in population.items():
+                bank_rows = sampled.get(bank, [])
+                entry = {"sender_bank": bank, "total_transactions": size, "sampled": len(bank_rows)}
+                if len(bank_rows) >= 2:
+                    stratum = [(size, bank_rows)]
+                    entry["failure_rate"] = _interval(*_stratified_mean(stratum, _failed), z, scale=100)
+                    entry["avg_amount"] = _interval(
+                        *_stratified_mean(stratum, _amount), z
+                    )
+                banks.append(entry)
+            banks.sort(key=lambda item: item["total_transactions"], reverse=True)
+
+            return {
+                "mode": "approximate",
+                "confidence": confidence,
+                "population": total,
+                "sample_size": len(rows),
+                "since": start.isoformat() if start else None,
+                "until": end.isoformat() if end else None,
+                "failure_rate": failure_rate,
+                "avg_amount": _interval(*_stratified_mean(strata, _amount), z),
+                "failure_types": type_estimates,
+                "banks": banks
+            }
+
+        except Exception as e:
+            logger.error(f"Error estimating failure analysis: {e}")
+            return {}
+
+    @staticmethod
+    async def get_approximate_bank_distributions(
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """Distinct VPAs (HyperLogLog) and amount p50/p95/p99 (t-digest) per bank, merged from rollup sketches"""
+        try:
+            sketches = await rollup_manager.sketches(start=start, end=end)
+            if not sketches:
+                return {}
+
+            count, senders, receivers, amounts = 0, HyperLogLog(), HyperLogLog(), TDigest()
+            banks = []
+            for bank, sketch in sketches.items():
+                banks.append({
+                    "sender_bank": bank,
+                    **_sketch_summary(sketch["count"], sketch["senders"], sketch["receivers"], sketch["amounts"])
+                })
+                count += sketch["count"]
+                senders.merge(sketch["senders"])
+                receivers.merge(sketch["receivers"])
+                amounts.merge(sketch["amounts"])
+            banks.sort(key=lambda item: item["total_transactions"], reverse=True)
+
+            return {
+                "mode": "approximate",
+                "since": start.isoformat() if start else None,
+                "until": end.isoformat() if end else None,
+                "overall": _sketch_summary(count, senders, receivers, amounts),
+                "banks": banks
+            }
+
+        except Exception as e:
+            logger.error(f"Error estimating bank distributions: {e}")
+            return {}
+
 # Global instance
 advanced_queries = AdvancedQueries()
\ No newline at end of file
@@ -0,0 +1,76 @@
+"""
+Transaction <-> MongoDB document codec shared by every read and write path
+Precomputed field lists and enum lookup tables keep encode/decode off the slow paths
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+from models.transaction import Transaction, FailureType, construct_transaction
+
+# Document fields in storage order; everything a Transaction needs to round-trip
+TRANSACTION_FIELDS = tuple(Transaction.model_fields)
+
+# Projection for reads that only decode into Transaction objects
+DOCUMENT_PROJECTION = {field: 1 for field in TRANSACTION_FIELDS}
+DOCUMENT_PROJECTION["_id"] = 0
+
+_FAILURE_TYPE_BY_VALUE: Dict[str, FailureType] = {ft.value: ft for ft in FailureType}
+_FAILURE_TYPE_VALUES: Dict[Optional[FailureType], Optional[str]] = {ft: ft.value for ft in FailureType}
+_FAILURE_TYPE_VALUES[None] = None
+
+
+def vpa_domain(vpa: Optional[str]) -> Optional[str]:
+    """PSP handle of a VPA (the part after '@'), or None for malformed VPAs"""
+    if not vpa or "@" not in vpa:
+        return None
+    return vpa.split("@")[1]
+
+
+def encode_transaction(transaction: Transaction, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Encode a Transaction as a MongoDB document (pass `now` to share one clock read per batch)"""
+    if now is None:
+        now = datetime.utcnow()
+    # pydantic keeps validated field values in __dict__; copying it skips per-field attribute access
+    doc = dict(transaction.__dict__)
+    doc["failure_type"] = _FAILURE_TYPE_VALUES[doc["failure_type"]]
+    # Stored once at ingest so domain analytics never split VPAs per query
+    doc["sender_domain"] = vpa_domain(doc["sender_vpa"])
+    doc["receiver_domain"] = vpa_domain(doc["receiver_vpa"])
+    doc["created_at"] = now
+    doc["updated_at"] = now
+    return doc
+
+
+def encode_transactions(transactions: Iterable[Transaction], now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Encode a batch of transactions with a single timestamp for created_at/updated_at"""
+    if now is None:
+        now = datetime.utcnow()
+    return [encode_transaction(transaction, now) for transaction in transactions]
+
+
+def decode_document(doc: Mapping[str, Any]) -> Transaction:
+    """Decode a MongoDB document into a Transaction
+
+    Documents are written by encode_transaction, so validation is skipped; missing
+    required fields still raise KeyError.
+    """
+    failure_type = doc.get("failure_type")
+    return construct_transaction({
+        "transaction_id": doc["transaction_id"],
+        "timestamp": doc["timestamp"],
+        "amount": float(doc["amount"]),
+        "sender_vpa": doc["sender_vpa"],
+        "receiver_vpa": doc["receiver_vpa"],
+        "sender_bank": doc["sender_bank"],
+        "receiver_bank": doc["receiver_bank"],
+        "status": doc["status"],
+        "failure_reason": doc.get("failure_reason"),
+        "failure_type": _FAILURE_TYPE_BY_VALUE.get(failure_type) if failure_type else None,
+        "error_code": doc.get("error_code"),
+        "retry_count": doc.get("retry_count") or 0,
+        "metadata": doc.get("metadata") or {}
+    })
+
+
+def decode_documents(docs: Iterable[Mapping[str, Any]]) -> List[Transaction]:
+    return [decode_document(doc) for doc in docs]
@@ -0,0 +1,77 @@
+"""
+Server-side downsampling of analytics time series
+Reduces a series to a requested number of points before it is sent to a chart
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Sequence
+
+
+def _numeric(value: Any) -> float:
+    """Datetimes (or ISO strings) become epoch seconds so they can serve as x values"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+def lttb(rows: List[Dict[str, Any]], threshold: int, x: str, y: str) -> List[Dict[str, Any]]:
+    """Largest-Triangle-Three-Buckets: keep the rows that best preserve the visual shape of y over x
+
+    Rows must be sorted by x; x values may be numbers, datetimes or ISO timestamps.
+    The first and last rows are always kept.
+    """
+    if threshold >= len(rows) or threshold < 3:
+        return rows
+
+    xs = [_numeric(row[x]) for row in rows]
+    ys = [float(row[y] or 0) for row in rows]
+    every = (len(rows) - 2) / (threshold - 2)
+
+    sampled = [rows[0]]
+    previous = 0
+    for bucket in range(threshold - 2):
+        # Average of the next bucket is the third triangle vertex
+        next_start = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, len(rows))
+        if next_start >= next_end:
+            next_start, next_end = len(rows) - 1, len(rows)
+        avg_x = sum(xs[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(ys[next_start:next_end]) / (next_end - next_start)
+
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        best, best_area = start, -1.0
+        for index in range(start, end):
+            area = abs(
+                (xs[previous] - avg_x) * (ys[index] - ys[previous]) -
+                (xs[previous] - xs[index]) * (avg_y - ys[previous])
+            )
+            if area > best_area:
+                best, best_area = index, area
+        sampled.append(rows[best])
+        previous = best
+
+    sampled.append(rows[-1])
+    return sampled
+
+
+def bucket_sums(rows: List[Dict[str, Any]], threshold: int, measures: Sequence[str]) -> List[Dict[str, Any]]:
+    """Merge consecutive rows into at most threshold buckets, summing measures
+
+    Each merged row keeps the labels of its first row, so totals are preserved exactly.
+    """
+    if threshold >= len(rows) or threshold < 1:
+        return rows
+
+    size = -(-len(rows) // threshold)
+    merged = []
+    for start in range(0, len(rows), size):
+        group = rows[start:start + size]
+        row = dict(group[0])
+        for measure in measures:
+            row[measure] = sum(item.get(measure) or 0 for item in group)
+        row["buckets"] = len(group)
+        merged.append(row)
+    return merged
@@ -0,0 +1,396 @@
+"""
+Query instrumentation for the MongoDB layer
+Times find/aggregate calls per query shape, samples explain plans, logs slow queries and audits indexes
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Pipelines ending in these stages write data and cannot be explained
+_WRITE_STAGES = ("$merge", "$out")
+
+
+def query_shape(value: Any) -> Any:
+    """Replace literal values with "?" so queries differing only in parameters group together"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value):
+            return [query_shape(item) for item in value]
+        return "?"
+    # Field paths ("$amount") are part of a pipeline's structure, not parameters
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+
+def _sort_spec(key: Any, direction: Any = None) -> Dict[str, int]:
+    if isinstance(key, str):
+        return {key: direction if direction is not None else 1}
+    return {field: order for field, order in key}
+
+
+def _filter_fields(query_filter: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """(equality fields, range fields) referenced at the top level of a filter"""
+    equality, ranges = [], []
+    for key, value in (query_filter or {}).items():
+        if key == "$and":
+            for part in value:
+                part_equality, part_ranges = _filter_fields(part)
+                equality.extend(part_equality)
+                ranges.extend(part_ranges)
+        elif key.startswith("$"):
+            continue
+        elif isinstance(value, dict) and any(op in value for op in ("$gt", "$gte", "$lt", "$lte", "$regex")):
+            ranges.append(key)
+        else:
+            equality.append(key)
+    return equality, ranges
+
+
+def _walk(node: Any):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """Winning plan stages, index names and docs examined/returned from an explain document
+
+    Docs examined/returned are only reported by executionStats explains; otherwise they are None.
+    """
+    stages, indexes = [], []
+    docs_examined, returned = None, None
+    for node in _walk(explain):
+        if "winningPlan" in node:
+            for plan_node in _walk(node["winningPlan"]):
+                if isinstance(plan_node.get("stage"), str):
+                    stages.append(plan_node["stage"])
+                if isinstance(plan_node.get("indexName"), str):
+                    indexes.append(plan_node["indexName"])
+        if isinstance(node.get("totalDocsExamined"), int):
+            docs_examined = (docs_examined or 0) + node["totalDocsExamined"]
+            if returned is None and isinstance(node.get("nReturned"), int):
+                returned = node["nReturned"]
+    return {
+        "stages": stages,
+        "indexes": sorted(set(indexes)),
+        "collscan": "COLLSCAN" in stages,
+        "docs_examined": docs_examined,
+        "returned": returned
+    }
+
+
+class QueryProfiler:
+    """Collects per-shape latency and plan statistics for instrumented collections"""
+
+    def __init__(self):
+        self.enabled = os.getenv("QUERY_PROFILING", "true").lower() == "true"
+        self.slow_query_ms = float(os.getenv("SLOW_QUERY_MS", "100"))
+        self.explain_enabled = os.getenv("QUERY_EXPLAIN", "true").lower() == "true"
+        self.explain_interval = float(os.getenv("QUERY_EXPLAIN_INTERVAL", "300"))
+        # queryPlanner only plans the query; executionStats runs it again in full, so it is opt-in
+        self.explain_verbosity = os.getenv("QUERY_EXPLAIN_VERBOSITY", "queryPlanner")
+        self.slow_queries: deque = deque(maxlen=int(os.getenv("SLOW_QUERY_LOG_SIZE", "100")))
+        self.shapes: Dict[str, Dict[str, Any]] = {}
+        # Workload class -> call count, total/max latency and a window of recent samples
+        self.workloads: Dict[str, Dict[str, Any]] = {}
+        self.latency_window = int(os.getenv("QUERY_LATENCY_WINDOW", "1000"))
+        self.started_at = datetime.utcnow()
+        self._explaining: set = set()
+
+    def instrument(self, collection, workload: str = "oltp"):
+        """Wrap a Motor collection so its reads are profiled under a workload class (no-op when disabled)"""
+        if not self.enabled or collection is None:
+            return collection
+        return InstrumentedCollection(self, collection, workload)
+
+    def _record_latency(self, workload: str, duration_ms: float):
+        stats = self.workloads.get(workload)
+        if stats is None:
+            stats = self.workloads[workload] = {
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0, "recent": deque(maxlen=self.latency_window)
+            }
+        stats["count"] += 1
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        stats["recent"].append(duration_ms)
+
+    def record(
+        self,
+        collection,
+        operation: str,
+        spec: Dict[str, Any],
+        duration_ms: float,
+        returned: int,
+        workload: str = "oltp"
+    ):
+        self._record_latency(workload, duration_ms)
+        shape = query_shape(spec.get("pipeline") if operation == "aggregate" else spec.get("filter") or {})
+        key = f"{collection.name}.{operation}:{json.dumps(shape, sort_keys=True, default=str)}"
+
+        stats = self.shapes.get(key)
+        if stats is None:
+            stats = self.shapes[key] = {
+                "collection": collection.name,
+                "operation": operation,
+                "shape": shape,
+                "sort": spec.get("sort"),
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "returned": 0,
+                "plan": None,
+                "explained_at": None
+            }
+        stats["count"] += 1
+        stats["total_ms"] += duration_ms
+        stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        stats["returned"] += returned
+
+        slow = duration_ms >= self.slow_query_ms
+        if slow:
+            self.slow_queries.append({
+                "timestamp": datetime.utcnow().isoformat(),
+                "collection": collection.name,
+                "operation": operation,
+                "workload": workload,
+                "duration_ms": round(duration_ms, 2),
+                "returned": returned,
+                "shape": shape
+            })
+            logger.warning(f"🐢 Slow {workload} {operation} on {collection.name}: {duration_ms:.0f} ms, {returned} docs returned")
+
+        # Explain each shape once, and again when it runs slow, at most once per interval
+        explained_at = stats["explained_at"]
+        due = explained_at is None or (slow and time.monotonic() - explained_at >= self.explain_interval)
+        if self.explain_enabled and due and key not in self._explaining:
+            self._explaining.add(key)
+            stats["explained_at"] = time.monotonic()
+            asyncio.ensure_future(self._explain(key, collection, operation, spec))
+
+    async def _explain(self, key: str, collection, operation: str, spec: Dict[str, Any]):
+        try:
+            if operation == "aggregate":
+                pipeline = spec["pipeline"]
+                if any(stage_name in stage for stage in pipeline for stage_name in _WRITE_STAGES):
+                    return
+                command = {"aggregate": collection.name, "pipeline": pipeline, "cursor": {}}
+            else:
+                command = {"find": collection.name, "filter": spec.get("filter") or {}}
+                for option in ("projection", "sort", "skip", "limit"):
+                    if spec.get(option):
+                        command[option] = spec[option]
+            # Sent with the collection's read preference, so analytics shapes are explained where they run
+            explain = await collection.database.command(
+                {"explain": command, "verbosity": self.explain_verbosity},
+                read_preference=collection.read_preference
+            )
+            self.shapes[key]["plan"] = summarize_explain(explain)
+        except Exception as e:
+            logger.debug(f"Could not explain {operation} on {collection.name}: {e}")
+        finally:
+            self._explaining.discard(key)
+
+    def workload_report(self) -> Dict[str, Any]:
+        """Latency per workload class; percentiles cover the most recent samples"""
+        report = {}
+        for workload, stats in self.workloads.items():
+            recent = sorted(stats["recent"])
+            report[workload] = {
+                "count": stats["count"],
+                "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                "p50_ms": round(recent[len(recent) // 2], 2),
+                "p95_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 2),
+                "max_ms": round(stats["max_ms"], 2)
+            }
+        return report
+
+    def report(self, limit: int = 20) -> Dict[str, Any]:
+        """Heaviest query shapes by total time plus the recent slow-query log"""
+        shapes = sorted(self.shapes.values(), key=lambda stats: stats["total_ms"], reverse=True)
+        return {
+            "since": self.started_at.isoformat(),
+            "slow_query_ms": self.slow_query_ms,
+            "workloads": self.workload_report(),
+            "shapes": [
+                {
+                    key: value for key, value in {
+                        **stats,
+                        "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                        "total_ms": round(stats["total_ms"], 2),
+                        "max_ms": round(stats["max_ms"], 2)
+                    }.items() if key != "explained_at"
+                }
+                for stats in shapes[:limit]
+            ],
+            "slow_queries": list(self.slow_queries)[-limit:]
+        }
+
+    def _suggest_index(self, stats: Dict[str, Any]) -> Optional[List[Tuple[str, int]]]:
+        """Equality, sort, range (ESR) key order for a shape that ran as a collection scan"""
+        if stats["operation"] == "aggregate":
+            first = stats["shape"][0] if stats["shape"] else {}
+            query_filter = first.get("$match", {})
+        else:
+            query_filter = stats["shape"]
+        equality, ranges = _filter_fields(query_filter)
+        sort = list((stats.get("sort") or {}).items())
+        keys: List[Tuple[str, int]] = [(field, 1) for field in equality]
+        keys += [(field, order) for field, order in sort if field not in equality]
+        keys += [(field, 1) for field in ranges if field not in equality and field not in dict(sort)]
+        return keys or None
+
+    async def index_audit(self, collections: List[Any]) -> Dict[str, Any]:
+        """Indexes never used since the server started, and collection scans that want an index"""
+        audit: Dict[str, Any] = {"collections": {}, "missing": []}
+
+        for collection in collections:
+            if collection is None:
+                continue
+            index_stats = await collection.aggregate([{"$indexStats": {}}]).to_list(length=None)
+            indexes = [
+                {
+                    "name": index["name"],
+                    "key": dict(index.get("key", {})),
+                    "ops": index.get("accesses", {}).get("ops", 0),
+                    "since": index.get("accesses", {}).get("since")
+                }
+                for index in index_stats
+            ]
+            audit["collections"][collection.name] = {
+                "indexes": indexes,
+                "unused": [index["name"] for index in indexes if index["ops"] == 0 and index["name"] != "_id_"]
+            }
+
+        for stats in self.shapes.values():
+            plan = stats["plan"]
+            if not plan or not plan["collscan"]:
+                continue
+            audit["missing"].append({
+                "collection": stats["collection"],
+                "operation": stats["operation"],
+                "shape": stats["shape"],
+                "count": stats["count"],
+                "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                "docs_examined": plan["docs_examined"],
+                "returned": plan["returned"],
+                "suggested_index": self._suggest_index(stats)
+            })
+        audit["missing"].sort(key=lambda item: item["count"] * item["avg_ms"], reverse=True)
+        return audit
+
+
+class InstrumentedCursor:
+    """Proxy for a Motor cursor that times the round-trips that fetch results"""
+
+    def __init__(
+        self,
+        profiler: QueryProfiler,
+        collection,
+        operation: str,
+        spec: Dict[str, Any],
+        cursor,
+        workload: str = "oltp"
+    ):
+        self._profiler = profiler
+        self._collection = collection
+        self._workload = workload
+        self._operation = operation
+        self._spec = spec
+        self._cursor = cursor
+
+    def sort(self, key, direction=None):
+        self._cursor = self._cursor.sort(key, direction) if direction is not None else self._cursor.sort(key)
+        self._spec["sort"] = _sort_spec(key, direction)
+        return self
+
+    def skip(self, skip: int):
+        self._cursor = self._cursor.skip(skip)
+        self._spec["skip"] = skip
+        return self
+
+    def limit(self, limit: int):
+        self._cursor = self._cursor.limit(limit)
+        self._spec["limit"] = limit
+        return self
+
+    def batch_size(self, batch_size: int):
+        self._cursor = self._cursor.batch_size(batch_size)
+        return self
+
+    async def to_list(self, length=None):
+        started = time.perf_counter()
+        result = await self._cursor.to_list(length=length)
+        self._profiler.record(
+            self._collection, self._operation, self._spec, (time.perf_counter() - started) * 1000, len(result),
+            self._workload
+        )
+        return result
+
+    async def __aiter__(self):
+        started = time.perf_counter()
+        returned = 0
+        try:
+            async for document in self._cursor:
+                returned += 1
+                yield document
+        finally:
+            self._profiler.record(
+                self._collection, self._operation, self._spec, (time.perf_counter() - started) * 1000, returned,
+                self._workload
+            )
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedCollection:
+    """Proxy for a Motor collection whose find/find_one/aggregate calls are profiled"""
+
+    def __init__(self, profiler: QueryProfiler, collection, workload: str = "oltp"):
+        self._profiler = profiler
+        self._collection = collection
+        self.workload = workload
+
+    def find(self, filter=None, projection=None, *args, **kwargs):
+        cursor = self._collection.find(filter, projection, *args, **kwargs)
+        spec = {"filter": filter, "projection": projection}
+        return InstrumentedCursor(self._profiler, self._collection, "find", spec, cursor, self.workload)
+
+    async def find_one(self, filter=None, projection=None, *args, **kwargs):
+        started = time.perf_counter()
+        document = await self._collection.find_one(filter, projection, *args, **kwargs)
+        spec = {"filter": filter, "projection": projection, "limit": 1}
+        if kwargs.get("sort"):
+            spec["sort"] = _sort_spec(kwargs["sort"])
+        self._profiler.record(
+            self._collection, "find", spec, (time.perf_counter() - started) * 1000, int(document is not None),
+            self.workload
+        )
+        return document
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        cursor = self._collection.aggregate(pipeline, *args, **kwargs)
+        return InstrumentedCursor(
+            self._profiler, self._collection, "aggregate", {"pipeline": pipeline}, cursor, self.workload
+        )
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+# Global query profiler instance
+query_profiler = QueryProfiler()
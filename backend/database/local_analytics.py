@@ -0,0 +1,344 @@
+"""
+Embedded columnar analytics over pandas/NumPy
+Runs the AdvancedQueries analytics on the in-memory store or CSV/Parquet files when MongoDB is unavailable
+"""
+
+import glob
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from database.pair_matrix import PAIR_DIMENSIONS, dense_matrix
+from database.retry_chains import chain_stats, link_chains, retry_chain_engine, summarize_chains
+from models.transaction_store import FAILURE_TYPES, NO_FAILURE_TYPE, TransactionStore
+
+AMOUNT_RANGE_EDGES = [-np.inf, 100, 500, 1000, 5000, np.inf]
+AMOUNT_RANGE_LABELS = ["0-100", "100-500", "500-1000", "1000-5000", "5000+"]
+COLUMNS = (
+    "timestamp", "amount", "sender_vpa", "receiver_vpa", "sender_bank", "receiver_bank",
+    "status", "failure_type", "retry_count"
+)
+
+
+def _codes(column, rows: Optional[int] = None) -> np.ndarray:
+    # Copy the first rows: a buffer view would stop the store's arrays from growing
+    return np.array(column[:rows], dtype=column.typecode).astype(np.int64)
+
+
+def _pooled(column, pool, rows: Optional[int] = None) -> pd.Categorical:
+    """Pool code 0 is None, which becomes the categorical's missing code -1"""
+    codes = _codes(column, rows) - 1
+    # Pools only grow, so read after the codes they cover every code
+    return pd.Categorical.from_codes(codes, categories=pool.values[1:])
+
+
+def _python(value: Any) -> Any:
+    """NumPy scalars and NaN to JSON-friendly Python values"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def _records(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    return [{key: _python(value) for key, value in row.items()} for row in frame.to_dict("records")]
+
+
+def _grouped_id(frame: pd.DataFrame, keys: List[str]) -> List[Dict[str, Any]]:
+    """Records with the group keys nested under _id, as MongoDB $group returns them"""
+    rows = _records(frame)
+    for row in rows:
+        row["_id"] = {key: row.pop(key) for key in keys}
+    return rows
+
+
+def _distinct(frame: pd.DataFrame, keys: List[str], column: str) -> pd.Series:
+    """Distinct values of column per group as lists, like MongoDB $addToSet"""
+    pairs = frame[keys + [column]].drop_duplicates().astype(object)
+    return pairs.groupby(keys, dropna=False)[column].agg(lambda values: [_python(value) for value in values])
+
+
+def _domains(frame: pd.DataFrame) -> Dict[str, pd.Categorical]:
+    """sender_domain/receiver_domain columns, splitting each distinct VPA once and mapping through the codes"""
+    domains = {}
+    for column in ("sender_vpa", "receiver_vpa"):
+        vpas = frame[column].astype("category").cat
+        domain_codes, domain_names = pd.factorize(
+            np.array([vpa.split("@")[1] if "@" in vpa else None for vpa in vpas.categories], dtype=object)
+        )
+        # Missing VPAs have code -1, which picks the trailing -1 (missing domain)
+        domain_of = np.append(domain_codes, -1)
+        domains[column.replace("vpa", "domain")] = pd.Categorical.from_codes(
+            domain_of[vpas.codes.to_numpy()], categories=domain_names
+        )
+    return domains
+
+
+class LocalAnalytics:
+    """Vectorized implementations of the AdvancedQueries analytics over one transactions DataFrame"""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame
+        self.failed = (frame["status"] == "failed").to_numpy()
+
+    @classmethod
+    def from_store(cls, store: TransactionStore, rows: Optional[int] = None) -> "LocalAnalytics":
+        """Build the frame straight from the store's column arrays and string pools
+
+        Only the first rows rows are read, so a store still being appended to elsewhere
+        yields columns of one length; pass the length read where the appends happen.
+        """
+        rows = len(store) if rows is None else rows
+        failure_type_codes = _codes(store.failure_types, rows)
+        failure_type_codes[failure_type_codes == NO_FAILURE_TYPE] = -1
+        frame = pd.DataFrame({
+            "timestamp": pd.to_datetime(_codes(store.timestamps, rows), unit="us"),
+            "amount": np.array(store.amounts[:rows], dtype=np.float64),
+            "sender_vpa": _pooled(store.sender_vpas, store.vpa_pool, rows),
+            "receiver_vpa": _pooled(store.receiver_vpas, store.vpa_pool, rows),
+            "sender_bank": _pooled(store.sender_banks, store.bank_pool, rows),
+            "receiver_bank": _pooled(store.receiver_banks, store.bank_pool, rows),
+            "status": _pooled(store.statuses, store.status_pool, rows),
+            "failure_type": pd.Categorical.from_codes(
+                failure_type_codes, categories=[failure_type.value for failure_type in FAILURE_TYPES]
+            ),
+            "retry_count": _codes(store.retry_counts, rows),
+        })
+        return cls(frame)
+
+    @classmethod
+    def from_path(cls, path: str) -> "LocalAnalytics":
+        """Load a CSV or Parquet file, or every Parquet file in a directory (e.g. the archive)"""
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "*.parquet")))
+            frame = pd.concat([pd.read_parquet(file, columns=list(COLUMNS)) for file in files], ignore_index=True)
+        elif path.endswith(".parquet"):
+            frame = pd.read_parquet(path, columns=list(COLUMNS))
+        else:
+            frame = pd.read_csv(path, usecols=list(COLUMNS), quotechar='"', escapechar='\\')
+
+        frame["timestamp"] = pd.to_datetime(frame["timestamp"])
+        if frame["timestamp"].dt.tz is not None:
+            frame["timestamp"] = frame["timestamp"].dt.tz_convert("UTC").dt.tz_localize(None)
+        frame["retry_count"] = frame["retry_count"].fillna(0).astype(np.int64)
+        # Exported CSVs may store SUCCESS/FAILED; the analytics compare lowercase statuses
+        frame["status"] = frame["status"].str.lower()
+        for column in ("sender_vpa", "receiver_vpa", "sender_bank", "receiver_bank", "status", "failure_type"):
+            frame[column] = frame[column].astype("category")
+        return cls(frame)
+
+    def _window(self, start: Optional[datetime], end: Optional[datetime]) -> Tuple[pd.DataFrame, np.ndarray]:
+        """Rows in [start, end) and their failed mask; the whole frame when unbounded"""
+        if start is None and end is None:
+            return self.frame, self.failed
+        timestamps = self.frame["timestamp"]
+        mask = np.ones(len(self.frame), dtype=bool)
+        if start is not None:
+            mask &= (timestamps >= start).to_numpy()
+        if end is not None:
+            mask &= (timestamps < end).to_numpy()
+        return self.frame[mask], self.failed[mask]
+
+    def get_failure_patterns_by_time(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        frame, failed = self._window(start, end)
+        failed = frame[failed]
+        grouped = failed.groupby(
+            [failed["timestamp"].dt.hour.rename("hour"), "failure_type"], observed=True, dropna=False
+        )["amount"].agg(count="size", avg_amount="mean").reset_index()
+        grouped = grouped.sort_values(["hour", "count"], ascending=[True, False])
+        return _grouped_id(grouped, ["hour", "failure_type"])
+
+    def get_bank_performance_metrics(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        frame, failed = self._window(start, end)
+        grouped = frame.assign(failed=failed).groupby("sender_bank", observed=True, dropna=False).agg(
+            total_transactions=("amount", "size"),
+            failed_transactions=("failed", "sum"),
+            total_amount=("amount", "sum"),
+        )
+        grouped["failure_types"] = _distinct(frame, ["sender_bank"], "failure_type")
+        grouped["avg_amount"] = grouped["total_amount"] / grouped["total_transactions"]
+        grouped["success_rate"] = (
+            (grouped["total_transactions"] - grouped["failed_transactions"]) / grouped["total_transactions"] * 100
+        )
+        grouped = grouped.sort_values("success_rate", ascending=False).reset_index()
+        rows = _records(grouped)
+        for row in rows:
+            row["_id"] = row.pop("sender_bank")
+        return rows
+
+    def get_hourly_analytics(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None, granularity: str = "hour"
+    ) -> List[Dict[str, Any]]:
+        frame, _ = self._window(start, end)
+        hours = frame["timestamp"].dt.floor("h" if granularity == "hour" else "D")
+        grouped = frame.assign(
+            failed=(frame["status"] == "failed").to_numpy(),
+            successful=(frame["status"] == "success").to_numpy(),
+        ).groupby(hours).agg(total=("amount", "size"), failed=("failed", "sum"), successful=("successful", "sum"))
+        return [
+            {
+                "hour": f"{bucket.hour:02d}:00" if granularity == "hour" else None,
+                "date": bucket.strftime("%Y-%m-%d"),
+                "timestamp": bucket.strftime("%Y-%m-%dT%H:00:00"),
+                "total": int(row.total),
+                "failed": int(row.failed),
+                "successful": int(row.successful)
+            }
+            for bucket, row in zip(grouped.index, grouped.itertuples())
+        ]
+
+    def get_live_metrics(self) -> Dict[str, Any]:
+        total = len(self.frame)
+        if not total:
+            return {}
+        volume = float(self.frame["amount"].sum())
+        return {
+            "_id": None,
+            "total_transactions": total,
+            "active_failures": int(self.failed.sum()),
+            "total_volume": volume,
+            "avg_transaction_value": volume / total
+        }
+
+    def get_vpa_domain_analysis(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        frame, failed = self._window(start, end)
+        frame = frame.assign(failed=failed, **_domains(frame))
+        keys = ["sender_domain", "receiver_domain"]
+        result = frame.groupby(keys, observed=True, dropna=False).agg(
+            transaction_count=("amount", "size"),
+            failure_count=("failed", "sum"),
+            avg_amount=("amount", "mean"),
+        )
+        result["common_failures"] = _distinct(frame, keys, "failure_type")
+        result["failure_rate"] = result["failure_count"] / result["transaction_count"] * 100
+        result = result.sort_values("transaction_count", ascending=False).reset_index()
+        return _grouped_id(result, keys)
+
+    def get_pair_matrix(
+        self,
+        dimension: str = "bank",
+        measure: str = "count",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        frame, failed = self._window(start, end)
+        if dimension == "domain":
+            frame = frame.assign(**_domains(frame))
+        keys = list(PAIR_DIMENSIONS[dimension])
+        frame = frame.assign(failed=failed)
+        totals = frame.groupby(keys, observed=True, dropna=False).agg(
+            count=("amount", "size"), failed=("failed", "sum"), amount_sum=("amount", "sum")
+        )
+        histogram = frame.groupby(keys + ["failure_type"], observed=True).size()
+
+        cells = {
+            tuple(_python(value) for value in key): {
+                "count": int(row.count), "failed": int(row.failed), "amount_sum": float(row.amount_sum),
+                "failure_types": {}
+            }
+            for key, row in zip(totals.index, totals.itertuples())
+        }
+        for (sender, receiver, failure_type), count in histogram.items():
+            if count:
+                cells[(_python(sender), _python(receiver))]["failure_types"][failure_type] = int(count)
+
+        senders, receivers, values = dense_matrix(cells, measure)
+        return {
+            "dimension": dimension,
+            "measure": measure,
+            "since": start.isoformat() if start else None,
+            "until": end.isoformat() if end else None,
+            "senders": senders,
+            "receivers": receivers,
+            "matrix": [[_python(value) for value in row] for row in values],
+            "total_transactions": len(frame)
+        }
+
+    def get_amount_based_failure_analysis(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        frame, _ = self._window(start, end)
+        amount_range = pd.cut(frame["amount"], AMOUNT_RANGE_EDGES, labels=AMOUNT_RANGE_LABELS, right=False)
+        grouped = frame.assign(amount_range=amount_range).groupby(
+            ["amount_range", "failure_type"], observed=True, dropna=False
+        )["retry_count"].agg(count="size", avg_retry_count="mean").reset_index()
+        grouped["amount_range"] = grouped["amount_range"].astype(object)
+        grouped = grouped.sort_values(["amount_range", "count"], ascending=[True, False])
+        return _grouped_id(grouped, ["amount_range", "failure_type"])
+
+    def get_retry_pattern_analysis(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        frame, _ = self._window(start, end)
+        frame = frame[(frame["retry_count"] > 0).to_numpy()]
+        grouped = frame.assign(eventual_success=(frame["status"] == "success").to_numpy()).groupby(
+            ["retry_count", "failure_type"], observed=True, dropna=False
+        ).agg(transaction_count=("amount", "size"), eventual_success=("eventual_success", "sum")).reset_index()
+        grouped["success_after_retry_rate"] = grouped["eventual_success"] / grouped["transaction_count"] * 100
+        grouped = grouped.sort_values("retry_count", kind="stable")
+        return _grouped_id(grouped, ["retry_count", "failure_type"])
+
+    def get_retry_chain_analysis(
+        self, start: Optional[datetime] = None, end: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        engine = retry_chain_engine
+        # Chains starting in the window may continue (or have been started) up to max_span outside it
+        frame, _ = self._window(
+            start - engine.max_span if start is not None else None,
+            end + engine.max_span if end is not None else None
+        )
+        chains = link_chains(frame, engine.gap, engine.max_span)
+        if start is not None:
+            chains = chains[(chains["start"] >= start).to_numpy()]
+        if end is not None:
+            chains = chains[(chains["start"] < end).to_numpy()]
+        return {
+            "since": start.isoformat() if start else None,
+            "until": end.isoformat() if end else None,
+            "linked_until": None,
+            "gap_seconds": engine.gap.total_seconds(),
+            "chains": len(chains),
+            "failure_types": summarize_chains(chain_stats(chains), engine.min_success_probability)
+        }
+
+    def get_real_time_dashboard_data(self, since: Optional[datetime] = None) -> Dict[str, Any]:
+        """Full dashboard snapshot; rows carry no ingestion time here, so since is not honored"""
+        as_of = datetime.utcnow()
+        window_start = as_of - timedelta(hours=24)
+
+        frame, failed = self._window(window_start, as_of)
+
+        recent_stats = {}
+        if len(frame):
+            recent_stats = {
+                "_id": None,
+                "total": len(frame),
+                "failed": int(failed.sum()),
+                "avg_amount": float(frame["amount"].mean()),
+                "total_volume": float(frame["amount"].sum())
+            }
+        top_failures = frame[failed]["failure_type"].astype(object).value_counts(dropna=False)
+        hourly = frame.assign(failed=failed).groupby(frame["timestamp"].dt.hour).agg(
+            total=("amount", "size"), failed=("failed", "sum")
+        )
+
+        return {
+            "recent_stats": recent_stats,
+            "top_failures": [{"_id": _python(key), "count": int(count)} for key, count in top_failures.items()],
+            "hourly_trend": [
+                {"_id": int(hour), "total": int(row.total), "failed": int(row.failed)}
+                for hour, row in zip(hourly.index, hourly.itertuples())
+            ],
+            "incremental": False,
+            "since": None,
+            "as_of": as_of.isoformat(),
+            "last_updated": datetime.utcnow().isoformat()
+        }
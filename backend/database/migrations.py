@@ -0,0 +1,252 @@
+"""
+Versioned schema migrations for the MongoDB collections
+Each migration runs once and is recorded in schema_migrations; retention TTLs are reconciled on every run
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from database.search import TEXT_INDEX_FIELDS, TEXT_INDEX_NAME, TEXT_INDEX_WEIGHTS
+
+logger = logging.getLogger(__name__)
+
+INDEX_NOT_FOUND = 27
+LOCK_ID = "__lock__"
+LOCK_LEASE = timedelta(minutes=5)
+FAILED_ONLY = {"status": "failed"}
+
+
+async def _drop_index(collection, name: str):
+    try:
+        await collection.drop_index(name)
+    except OperationFailure as e:
+        if e.code != INDEX_NOT_FOUND:
+            raise
+
+
+async def baseline_indexes(db):
+    """Indexes previously created on every connect"""
+    transactions = db.transactions_collection
+    await transactions.create_index("transaction_id", unique=True)
+    await transactions.create_index("timestamp")
+    await transactions.create_index("status")
+    await transactions.create_index("failure_type")
+    await transactions.create_index("sender_vpa")
+    await transactions.create_index("receiver_vpa")
+    await transactions.create_index([("timestamp", -1), ("status", 1)])
+    await transactions.create_index(TEXT_INDEX_FIELDS, weights=TEXT_INDEX_WEIGHTS, name=TEXT_INDEX_NAME)
+
+    await db.analytics_collection.create_index("date")
+    await db.analytics_collection.create_index("metric_type")
+
+    # Minute rollups expire via expires_at
+    await db.rollups_collection.create_index([("granularity", 1), ("bucket", 1)])
+    await db.rollups_collection.create_index("expires_at", expireAfterSeconds=0)
+
+
+async def workload_indexes(db):
+    """Compound indexes shaped after the hot filters/sorts, partial indexes over failed rows"""
+    transactions = db.transactions_collection
+
+    # Transaction list: equality filter, newest first
+    await transactions.create_index([("status", 1), ("timestamp", -1)], name="status_timestamp")
+    await transactions.create_index([("failure_type", 1), ("timestamp", -1)], name="failure_type_timestamp")
+    await transactions.create_index([("sender_bank", 1), ("timestamp", -1)], name="sender_bank_timestamp")
+
+    # Covers the open-bucket rollup scans (time range grouped by bank/status/failure type)
+    await transactions.create_index(
+        [("timestamp", 1), ("sender_bank", 1), ("status", 1), ("failure_type", 1), ("amount", 1)],
+        name="timestamp_rollup_cover"
+    )
+
+    # Failures are a minority of rows; these only index them
+    await transactions.create_index(
+        [("timestamp", -1)], name="failed_timestamp", partialFilterExpression=FAILED_ONLY
+    )
+    await transactions.create_index(
+        [("failure_type", 1), ("timestamp", -1)], name="failed_failure_type_timestamp",
+        partialFilterExpression=FAILED_ONLY
+    )
+    await transactions.create_index(
+        [("sender_bank", 1), ("failure_type", 1)], name="failed_sender_bank_failure_type",
+        partialFilterExpression=FAILED_ONLY
+    )
+    await transactions.create_index(
+        [("retry_count", 1), ("failure_type", 1)], name="retried",
+        partialFilterExpression={"retry_count": {"$gt": 0}}
+    )
+
+    # Left prefixes of the compound indexes above
+    for redundant in ("status_1", "failure_type_1", "timestamp_1"):
+        await _drop_index(transactions, redundant)
+
+
+async def vpa_domains(db):
+    """Index the pair matrix; existing rows get their VPA domains from backfill_vpa_domains"""
+    await db.pair_matrix_collection.create_index([("dimension", 1), ("day", 1)])
+
+
+async def retry_chain_indexes(db):
+    """Retry chain outcome counts are read and replaced by hour bucket"""
+    await db.retry_chains_collection.create_index("bucket")
+
+
+# (id, description, migration) in application order; never reorder or edit applied entries
+MIGRATIONS: List[Tuple[str, str, Callable[[Any], Awaitable[None]]]] = [
+    ("0001_baseline_indexes", "Baseline single-field, text and rollup indexes", baseline_indexes),
+    ("0002_workload_indexes", "Workload compound indexes and partial indexes for failed transactions", workload_indexes),
+    ("0003_vpa_domains", "Stored sender/receiver VPA domains and the pair matrix index", vpa_domains),
+    ("0004_retry_chain_indexes", "Retry chain outcome count index", retry_chain_indexes),
+]
+
+
+async def _backfill_domains(collection, batch_size: int) -> int:
+    domains = {
+        f"{side}_domain": {"$ifNull": [{"$arrayElemAt": [{"$split": [f"${side}_vpa", "@"]}, 1]}, None]}
+        for side in ("sender", "receiver")
+    }
+    updated, last_id = 0, None
+    while True:
+        # Walk the _id index so each batch resumes where the last one stopped
+        query: Dict[str, Any] = {"sender_domain": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await collection.find(query, {"_id": 1}).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            return updated
+        last_id = docs[-1]["_id"]
+        result = await collection.update_many({"_id": {"$in": [doc["_id"] for doc in docs]}}, [{"$set": domains}])
+        updated += result.modified_count
+
+
+async def backfill_vpa_domains(db, batch_size: int = 5000) -> int:
+    """Store sender/receiver VPA domains on rows ingested before they were stored; returns rows updated
+
+    Runs in batches outside of connect (see scripts/migrate.py), so startup never waits on a
+    full-collection rewrite. Interrupted runs resume where they stopped.
+    """
+    updated = await _backfill_domains(db.transactions_collection, batch_size)
+    if db.archive_collection is not None:
+        try:
+            updated += await _backfill_domains(db.archive_collection, batch_size)
+        except OperationFailure as e:
+            # Time-series archives reject updates to measurement fields; the pair matrix rebuild then skips their domains
+            logger.warning(f"⚠️ Could not backfill archived VPA domains: {e}")
+    return updated
+
+
+async def reconcile_retention(db):
+    """Create, update or drop the transaction TTL index to match TRANSACTION_RETENTION_DAYS"""
+    retention_days = os.getenv("TRANSACTION_RETENTION_DAYS", "")
+    expire_after = int(float(retention_days) * 86400) if retention_days else None
+
+    indexes = await db.transactions_collection.index_information()
+    current = indexes.get("created_at_ttl")
+
+    if expire_after is None:
+        if current is not None:
+            await _drop_index(db.transactions_collection, "created_at_ttl")
+            logger.info("🗑️ Transaction retention disabled")
+    elif current is None:
+        await db.transactions_collection.create_index(
+            "created_at", name="created_at_ttl", expireAfterSeconds=expire_after
+        )
+        logger.info(f"⏳ Transactions expire {retention_days} days after ingestion")
+    elif current.get("expireAfterSeconds") != expire_after:
+        await db.database.command({
+            "collMod": db.transactions_collection.name,
+            "index": {"name": "created_at_ttl", "expireAfterSeconds": expire_after}
+        })
+        logger.info(f"⏳ Transaction retention changed to {retention_days} days")
+
+
+async def _acquire_lock(migrations, owner: ObjectId) -> bool:
+    now = datetime.utcnow()
+    try:
+        await migrations.insert_one({"_id": LOCK_ID, "owner": owner, "expires_at": now + LOCK_LEASE})
+        return True
+    except DuplicateKeyError:
+        # Take over a lease abandoned by a crashed process
+        result = await migrations.update_one(
+            {"_id": LOCK_ID, "expires_at": {"$lt": now}},
+            {"$set": {"owner": owner, "expires_at": now + LOCK_LEASE}}
+        )
+        return result.modified_count == 1
+
+
+async def _renew_lock(migrations, owner: ObjectId) -> bool:
+    """Extend the lease; False when it expired and another process has taken the lock over"""
+    result = await migrations.update_one(
+        {"_id": LOCK_ID, "owner": owner},
+        {"$set": {"expires_at": datetime.utcnow() + LOCK_LEASE}}
+    )
+    return result.matched_count == 1
+
+
+async def _keep_lock(migrations, owner: ObjectId):
+    """Renew the lease while one long migration (e.g. an index build) runs"""
+    while True:
+        await asyncio.sleep(LOCK_LEASE.total_seconds() / 3)
+        try:
+            if not await _renew_lock(migrations, owner):
+                return
+        except Exception as e:
+            logger.warning(f"⚠️ Could not renew the migration lock: {e}")
+
+
+async def migration_status(db) -> List[Dict[str, Any]]:
+    applied = {
+        doc["_id"]: doc for doc in
+        await db.database.schema_migrations.find({"_id": {"$ne": LOCK_ID}}).to_list(length=None)
+    }
+    return [
+        {
+            "id": migration_id,
+            "description": description,
+            "applied_at": applied[migration_id]["applied_at"].isoformat() if migration_id in applied else None
+        }
+        for migration_id, description, _ in MIGRATIONS
+    ]
+
+
+async def run_migrations(db) -> List[str]:
+    """Apply pending migrations once across all processes; returns the IDs applied here"""
+    migrations = db.database.schema_migrations
+    owner = ObjectId()
+    if not await _acquire_lock(migrations, owner):
+        logger.info("🔒 Another process is running migrations, skipping")
+        return []
+
+    applied_now = []
+    heartbeat = asyncio.create_task(_keep_lock(migrations, owner))
+    try:
+        applied = {doc["_id"] for doc in await migrations.find({}, {"_id": 1}).to_list(length=None)}
+        for migration_id, description, migrate in MIGRATIONS:
+            if migration_id in applied:
+                continue
+            if not await _renew_lock(migrations, owner):
+                logger.warning("🔒 Migration lock taken over by another process, leaving the rest to it")
+                break
+            logger.info(f"🛠️ Applying migration {migration_id}: {description}")
+            await migrate(db)
+            # Upserted: a process that took over an expired lease may have recorded it too
+            await migrations.update_one(
+                {"_id": migration_id},
+                {"$setOnInsert": {"description": description, "applied_at": datetime.utcnow()}},
+                upsert=True
+            )
+            applied_now.append(migration_id)
+        else:
+            await reconcile_retention(db)
+    finally:
+        heartbeat.cancel()
+        # Only release a lock this process still owns
+        await migrations.delete_one({"_id": LOCK_ID, "owner": owner})
+
+    if applied_now:
+        logger.info(f"📊 Applied {len(applied_now)} migrations")
+    return applied_now
@@ -4,24 +4,112 @@ MongoDB database connection and operations for UPI Diagnosis Platform
 
 import os
 import asyncio
+from collections import Counter
+from contextlib import contextmanager
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
-from typing import List, Dict, Optional, Any
+from pymongo import InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure, ServerSelectionTimeoutError
+from typing import List, Dict, Optional, Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Union
 from datetime import datetime, timedelta
 import logging
 from models.transaction import Transaction, FailureType
+from database.codec import encode_transaction, encode_transactions
+from database.instrumentation import query_profiler
+from database.migrations import run_migrations
+from database.search import combine, plan_search, substring_filter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DUPLICATE_KEY_ERROR = 11000
+
+async def _chunked(
+    transactions: Union[Iterable[Transaction], AsyncIterable[Transaction]],
+    batch_size: int
+) -> AsyncIterator[List[Transaction]]:
+    """Group a sync or async stream of transactions into lists of at most batch_size"""
+    batch: List[Transaction] = []
+    if hasattr(transactions, "__aiter__"):
+        async for transaction in transactions:
+            batch.append(transaction)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    else:
+        for transaction in transactions:
+            batch.append(transaction)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+                # Let other coroutines run between batches of a synchronous source
+                await asyncio.sleep(0)
+    if batch:
+        yield batch
+
 class MongoDB:
     def __init__(self):
         self.client: Optional[AsyncIOMotorClient] = None
         self.database = None
+        # Separate client for analytics reads: own pool, read preference and read concern
+        self.analytics_client: Optional[AsyncIOMotorClient] = None
+        self.analytics_transactions = None
+        self.analytics_rollups = None
+        self.analytics_pair_matrix = None
+        self.analytics_retry_chains = None
+        self.analytics_state = None
         self.transactions_collection = None
         self.analytics_collection = None
         self.users_collection = None
+        self.rollups_collection = None
+        self.pair_matrix_collection = None
+        self.retry_chains_collection = None
+        # Cold tier: rows older than archived_until may live here (set by the tiering manager)
+        self.archive_collection = None
+        self.archived_until: Optional[datetime] = None
+        self._write_listeners: List[Callable[[List[Transaction]], None]] = []
+        self._insert_listeners: List[Callable[[List[Transaction]], None]] = []
+        # created_at stamps of writes still in flight (see wait_for_writes)
+        self._writes_in_flight: Counter = Counter()
+    
+    def add_write_listener(self, listener: Callable[[List[Transaction]], None]):
+        """Register a callback invoked with every batch of transactions written"""
+        self._write_listeners.append(listener)
+    
+    def add_insert_listener(self, listener: Callable[[List[Transaction]], None]):
+        """Register a callback invoked with only the transactions that created new documents"""
+        self._insert_listeners.append(listener)
+    
+    @contextmanager
+    def _stamped_write(self) -> Iterator[datetime]:
+        """created_at for one write, tracked as in flight until the block exits"""
+        now = datetime.utcnow()
+        self._writes_in_flight[now] += 1
+        try:
+            yield now
+        finally:
+            self._writes_in_flight[now] -= 1
+            if not self._writes_in_flight[now]:
+                del self._writes_in_flight[now]
+    
+    async def wait_for_writes(self, before: datetime):
+        """Wait until every write of this process stamped before `before` has finished"""
+        while any(stamp < before for stamp in self._writes_in_flight):
+            await asyncio.sleep(0.01)
+    
+    def _notify_write(self, transactions: List[Transaction], inserted: Optional[List[Transaction]] = None):
+        """Tell write listeners about every written transaction, insert listeners about new ones"""
+        for listener in self._write_listeners:
+            try:
+                listener(transactions)
+            except Exception as e:
+                logger.error(f"❌ Write listener failed: {e}")
+        if inserted:
+            for listener in self._insert_listeners:
+                try:
+                    listener(inserted)
+                except Exception as e:
+                    logger.error(f"❌ Insert listener failed: {e}")
         
     async def connect(self):
         """Connect to MongoDB database"""
@@ -30,12 +118,13 @@ class MongoDB:
             mongodb_url = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
             database_name = os.getenv("DATABASE_NAME", "upi_diagnosis")
             
-            # Create async MongoDB client
+            # Create async MongoDB client for point lookups and writes (primary)
+            oltp_pool_size = int(os.getenv("MONGODB_OLTP_POOL_SIZE", "50"))
             self.client = AsyncIOMotorClient(
                 mongodb_url,
                 serverSelectionTimeoutMS=5000,  # 5 second timeout
-                maxPoolSize=50,
-                minPoolSize=5
+                maxPoolSize=oltp_pool_size,
+                minPoolSize=min(5, oltp_pool_size)
             )
             
             # Test connection
@@ -44,71 +133,95 @@ class MongoDB:
             
             # Get database and collections
             self.database = self.client[database_name]
-            self.transactions_collection = self.database.transactions
-            self.analytics_collection = self.database.analytics
+            self.transactions_collection = query_profiler.instrument(self.database.transactions)
+            self.analytics_collection = query_profiler.instrument(self.database.analytics)
             self.users_collection = self.database.users
+            self.rollups_collection = query_profiler.instrument(self.database.transaction_rollups)
+            self.archive_collection = query_profiler.instrument(self.database.transactions_archive)
+            self.pair_matrix_collection = query_profiler.instrument(self.database.transaction_pair_matrix)
+            self.retry_chains_collection = query_profiler.instrument(self.database.retry_chain_stats)
+            
+            # Heavy aggregations prefer secondaries so spikes don't queue behind transaction lookups
+            analytics_options = {
+                "serverSelectionTimeoutMS": 5000,
+                "maxPoolSize": int(os.getenv("MONGODB_ANALYTICS_POOL_SIZE", "10")),
+                "readPreference": os.getenv("MONGODB_ANALYTICS_READ_PREFERENCE", "secondaryPreferred"),
+                "readConcernLevel": os.getenv("MONGODB_ANALYTICS_READ_CONCERN", "local")
+            }
+            if os.getenv("MONGODB_ANALYTICS_MAX_STALENESS"):
+                analytics_options["maxStalenessSeconds"] = int(os.getenv("MONGODB_ANALYTICS_MAX_STALENESS"))
+            self.analytics_client = AsyncIOMotorClient(
+                os.getenv("MONGODB_ANALYTICS_URL", mongodb_url), **analytics_options
+            )
+            analytics_database = self.analytics_client[database_name]
+            self.analytics_transactions = query_profiler.instrument(analytics_database.transactions, "analytics")
+            self.analytics_rollups = query_profiler.instrument(analytics_database.transaction_rollups, "analytics")
+            self.analytics_pair_matrix = query_profiler.instrument(analytics_database.transaction_pair_matrix, "analytics")
+            self.analytics_retry_chains = query_profiler.instrument(analytics_database.retry_chain_stats, "analytics")
+            # Readers take watermarks from here, so a watermark is never ahead of the rollups read beside it
+            self.analytics_state = query_profiler.instrument(analytics_database.analytics, "analytics")
             
-            # Create indexes for better performance
-            await self._create_indexes()
+            # Bring indexes up to date for better performance
+            await self._apply_migrations()
             
             return True
             
         except (ConnectionFailure, ServerSelectionTimeoutError) as e:
             logger.error(f"❌ Failed to connect to MongoDB: {e}")
+            self._close_failed_client()
             return False
         except Exception as e:
             logger.error(f"❌ Unexpected error connecting to MongoDB: {e}")
+            self._close_failed_client()
             return False
     
+    def _close_failed_client(self):
+        """Release the clients of a failed connection attempt so retries don't leak monitors"""
+        if self.client:
+            self.client.close()
+            self.client = None
+        if self.analytics_client:
+            self.analytics_client.close()
+            self.analytics_client = None
+    
     async def disconnect(self):
         """Disconnect from MongoDB"""
         if self.client:
             self.client.close()
             logger.info("🔌 Disconnected from MongoDB")
+        if self.analytics_client:
+            self.analytics_client.close()
+    
+    def needs_archive(self, start: Optional[datetime] = None) -> bool:
+        """Whether a query starting at `start` (None = all history) reaches the archive tier"""
+        return (self.archived_until is not None and self.archive_collection is not None and
+                (start is None or start < self.archived_until))
+    
+    def archive_union(self, pipeline: List[Dict[str, Any]], start: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Extend a transactions pipeline to also read archived rows when its range needs them
+        
+        The leading $match (if any) is repeated inside $unionWith so both tiers are filtered.
+        """
+        if not self.needs_archive(start):
+            return pipeline
+        head = pipeline[:1] if pipeline and "$match" in pipeline[0] else []
+        union = {"$unionWith": {"coll": self.archive_collection.name, "pipeline": head}}
+        return head + [union] + pipeline[len(head):]
     
-    async def _create_indexes(self):
-        """Create database indexes for optimal performance"""
+    async def _apply_migrations(self):
+        """Apply pending index migrations (recorded in schema_migrations, so usually a no-op)"""
         try:
-            # Transactions collection indexes
-            await self.transactions_collection.create_index("transaction_id", unique=True)
-            await self.transactions_collection.create_index("timestamp")
-            await self.transactions_collection.create_index("status")
-            await self.transactions_collection.create_index("failure_type")
-            await self.transactions_collection.create_index("sender_vpa")
-            await self.transactions_collection.create_index("receiver_vpa")
-            await self.transactions_collection.create_index([("timestamp", -1), ("status", 1)])
-            
-            # Analytics collection indexes
-            await self.analytics_collection.create_index("date")
-            await self.analytics_collection.create_index("metric_type")
-            
-            logger.info("📊 Database indexes created successfully")
-            
+            await run_migrations(self)
         except Exception as e:
-            logger.error(f"❌ Error creating indexes: {e}")
+            logger.error(f"❌ Error applying migrations: {e}")
     
     async def insert_transaction(self, transaction: Transaction) -> bool:
         """Insert a single transaction into MongoDB"""
         try:
-            transaction_doc = {
-                "transaction_id": transaction.transaction_id,
-                "timestamp": transaction.timestamp,
-                "amount": transaction.amount,
-                "sender_vpa": transaction.sender_vpa,
-                "receiver_vpa": transaction.receiver_vpa,
-                "sender_bank": transaction.sender_bank,
-                "receiver_bank": transaction.receiver_bank,
-                "status": transaction.status,
-                "failure_reason": transaction.failure_reason,
-                "failure_type": transaction.failure_type.value if transaction.failure_type else None,
-                "error_code": transaction.error_code,
-                "retry_count": transaction.retry_count,
-                "metadata": transaction.metadata,
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            
-            result = await self.transactions_collection.insert_one(transaction_doc)
+            with self._stamped_write() as now:
+                transaction_doc = encode_transaction(transaction, now)
+                result = await self.transactions_collection.insert_one(transaction_doc)
+            self._notify_write([transaction], inserted=[transaction])
             logger.info(f"✅ Inserted transaction {transaction.transaction_id}")
             return True
             
@@ -116,41 +229,183 @@ class MongoDB:
             logger.error(f"❌ Error inserting transaction: {e}")
             return False
     
-    async def bulk_insert_transactions(self, transactions: List[Transaction]) -> int:
-        """Insert multiple transactions in bulk"""
-        try:
-            transaction_docs = []
-            for transaction in transactions:
-                doc = {
-                    "transaction_id": transaction.transaction_id,
-                    "timestamp": transaction.timestamp,
-                    "amount": transaction.amount,
-                    "sender_vpa": transaction.sender_vpa,
-                    "receiver_vpa": transaction.receiver_vpa,
-                    "sender_bank": transaction.sender_bank,
-                    "receiver_bank": transaction.receiver_bank,
-                    "status": transaction.status,
-                    "failure_reason": transaction.failure_reason,
-                    "failure_type": transaction.failure_type.value if transaction.failure_type else None,
-                    "error_code": transaction.error_code,
-                    "retry_count": transaction.retry_count,
-                    "metadata": transaction.metadata,
-                    "created_at": datetime.utcnow(),
-                    "updated_at": datetime.utcnow()
-                }
-                transaction_docs.append(doc)
-            
-            if transaction_docs:
-                result = await self.transactions_collection.insert_many(transaction_docs, ordered=False)
-                inserted_count = len(result.inserted_ids)
-                logger.info(f"✅ Bulk inserted {inserted_count} transactions")
-                return inserted_count
-            
-            return 0
-            
-        except Exception as e:
-            logger.error(f"❌ Error bulk inserting transactions: {e}")
-            return 0
+    async def bulk_insert_transactions(self, transactions: Iterable[Transaction]) -> int:
+        """Insert multiple transactions in bulk; returns the number of new documents"""
+        stats = await self.bulk_upsert_transactions(transactions, upsert=False)
+        return stats["inserted"]
+    
+    async def bulk_upsert_transactions(
+        self,
+        transactions: Union[Iterable[Transaction], AsyncIterable[Transaction]],
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        upsert: bool = True,
+        on_batch_failed: Optional[Callable[[List[Transaction], Exception], Awaitable[None]]] = None
+    ) -> Dict[str, Any]:
+        """Stream transactions into MongoDB as concurrent unordered bulk_write batches
+        
+        With upsert=True documents are upserted on transaction_id; otherwise they are
+        inserted and existing transaction_ids are counted as duplicates. Batches that
+        fail outright (e.g. connection loss) are passed to on_batch_failed.
+        """
+        batch_size = batch_size or int(os.getenv("BULK_WRITE_BATCH_SIZE", "1000"))
+        concurrency = concurrency or int(os.getenv("BULK_WRITE_CONCURRENCY", "4"))
+        
+        stats = {
+            "inserted": 0,
+            "updated": 0,
+            "duplicates": 0,
+            "errors": 0,
+            "batches": 0,
+            "failed_batches": 0,
+            "error_messages": []
+        }
+        semaphore = asyncio.Semaphore(concurrency)
+        in_flight = set()
+        
+        async def write_batch(batch: List[Transaction]):
+            try:
+                await self._write_batch(batch, upsert, stats)
+            except Exception as e:
+                stats["errors"] += len(batch)
+                stats["failed_batches"] += 1
+                if len(stats["error_messages"]) < 10:
+                    stats["error_messages"].append(str(e))
+                logger.error(f"❌ Bulk write batch of {len(batch)} failed: {e}")
+                if on_batch_failed:
+                    await on_batch_failed(batch, e)
+            finally:
+                semaphore.release()
+        
+        async for batch in _chunked(transactions, batch_size):
+            # Bounded in-flight batches keep memory constant for arbitrarily long streams
+            await semaphore.acquire()
+            stats["batches"] += 1
+            task = asyncio.create_task(write_batch(batch))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        
+        if in_flight:
+            await asyncio.gather(*in_flight)
+        
+        logger.info(
+            f"✅ Bulk write: {stats['inserted']} inserted, {stats['updated']} updated, "
+            f"{stats['duplicates']} duplicates, {stats['errors']} errors in {stats['batches']} batches"
+        )
+        return stats
+    
+    async def _write_batch(self, batch: List[Transaction], upsert: bool, stats: Dict[str, Any]):
+        """Write one batch with bulk_write and fold the result into stats"""
+        # Listeners run inside the stamped write, so wait_for_writes also covers them
+        with self._stamped_write() as now:
+            docs = encode_transactions(batch, now)
+            if upsert:
+                operations = []
+                for doc in docs:
+                    # updated_at stays in $set so it moves on every update; created_at only on insert
+                    created_at = doc.pop("created_at")
+                    operations.append(UpdateOne(
+                        {"transaction_id": doc["transaction_id"]},
+                        {"$set": doc, "$setOnInsert": {"created_at": created_at}},
+                        upsert=True
+                    ))
+            else:
+                operations = [InsertOne(doc) for doc in docs]
+            
+            try:
+                result = await self.transactions_collection.bulk_write(operations, ordered=False)
+                details = result.bulk_api_result
+            except BulkWriteError as e:
+                # Unordered: every operation without a write error has been applied
+                details = e.details
+            
+            # Only operations that created a document are new rows (not duplicates or re-sends)
+            if upsert:
+                inserted = [batch[upserted["index"]] for upserted in details.get("upserted", [])]
+            else:
+                failed = {error["index"] for error in details.get("writeErrors", [])}
+                inserted = [transaction for index, transaction in enumerate(batch) if index not in failed]
+            self._notify_write(batch, inserted=inserted)
+        
+        for error in details.get("writeErrors", []):
+            if error.get("code") == DUPLICATE_KEY_ERROR:
+                stats["duplicates"] += 1
+            else:
+                stats["errors"] += 1
+                if len(stats["error_messages"]) < 10:
+                    stats["error_messages"].append(error.get("errmsg", "unknown write error"))
+        
+        stats["inserted"] += details.get("nInserted", 0) + details.get("nUpserted", 0)
+        stats["updated"] += details.get("nModified", 0)
+        # Matched but unmodified upserts are identical re-sends of stored documents
+        stats["duplicates"] += details.get("nMatched", 0) - details.get("nModified", 0)
+    
+    @staticmethod
+    def _transaction_filter(
+        status: Optional[str] = None,
+        failure_type: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        end_inclusive: bool = True
+    ) -> Dict[str, Any]:
+        """Equality and date-range filter shared by the list and export reads"""
+        query_filter = {}
+        
+        if status:
+            query_filter["status"] = status
+        
+        if failure_type:
+            query_filter["failure_type"] = failure_type
+        
+        if start_date or end_date:
+            date_filter = {}
+            if start_date:
+                date_filter["$gte"] = start_date
+            if end_date:
+                date_filter["$lte" if end_inclusive else "$lt"] = end_date
+            query_filter["timestamp"] = date_filter
+        
+        return query_filter
+    
+    async def iter_transactions(
+        self,
+        status: Optional[str] = None,
+        failure_type: Optional[str] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        search_term: Optional[str] = None,
+        projection: Optional[Dict[str, int]] = None,
+        batch_size: int = 5000
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream every matching transaction, newest first, in lists of at most batch_size
+        
+        Same filters as get_transactions (with an exclusive end_date); the hot collection
+        is read first, then the archive, so memory stays bounded by one batch.
+        """
+        query_filter = self._transaction_filter(status, failure_type, start_date, end_date, end_inclusive=False)
+        if search_term:
+            search_filter = combine(query_filter, plan_search(search_term)["filter"])
+            if not await self.transactions_collection.find_one(search_filter, {"_id": 1}):
+                search_filter = combine(query_filter, substring_filter(search_term))
+        else:
+            search_filter = query_filter
+        
+        collections = [(self.transactions_collection, search_filter)]
+        if self.needs_archive(start_date):
+            # The archive has no text index; search it with the substring scan
+            archive_filter = combine(query_filter, substring_filter(search_term)) if search_term else query_filter
+            collections.append((self.archive_collection, archive_filter))
+        
+        for collection, collection_filter in collections:
+            cursor = collection.find(collection_filter, projection).sort("timestamp", -1).batch_size(batch_size)
+            batch = []
+            async for doc in cursor:
+                batch.append(doc)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
     
     async def get_transactions(
         self, 
@@ -160,42 +415,36 @@ class MongoDB:
         failure_type: Optional[str] = None,
         start_date: Optional[datetime] = None,
         end_date: Optional[datetime] = None,
-        search_term: Optional[str] = None
+        search_term: Optional[str] = None,
+        projection: Optional[Dict[str, int]] = None
     ) -> List[Dict[str, Any]]:
         """Get transactions with filtering and pagination"""
         try:
-            # Build query filter
-            query_filter = {}
-            
-            if status:
-                query_filter["status"] = status
-            
-            if failure_type:
-                query_filter["failure_type"] = failure_type
-            
-            if start_date or end_date:
-                date_filter = {}
-                if start_date:
-                    date_filter["$gte"] = start_date
-                if end_date:
-                    date_filter["$lte"] = end_date
-                query_filter["timestamp"] = date_filter
-            
-            if search_term:
-                query_filter["$or"] = [
-                    {"transaction_id": {"$regex": search_term, "$options": "i"}},
-                    {"sender_vpa": {"$regex": search_term, "$options": "i"}},
-                    {"receiver_vpa": {"$regex": search_term, "$options": "i"}},
-                    {"failure_reason": {"$regex": search_term, "$options": "i"}}
-                ]
+            query_filter = self._transaction_filter(status, failure_type, start_date, end_date)
+            
+            search_filter = plan_search(search_term)["filter"] if search_term else None
+            indexed_filter = combine(query_filter, search_filter)
             
             # Execute query with pagination
-            cursor = self.transactions_collection.find(query_filter).sort("timestamp", -1).skip(skip).limit(limit)
+            cursor = self.transactions_collection.find(indexed_filter, projection).sort("timestamp", -1).skip(skip).limit(limit)
             transactions = await cursor.to_list(length=limit)
             
+            # Substring scan only for terms the indexed strategies cannot match at all
+            if search_term and not transactions and not await self.transactions_collection.find_one(indexed_filter, {"_id": 1}):
+                scan_filter = combine(query_filter, substring_filter(search_term))
+                cursor = self.transactions_collection.find(scan_filter, projection).sort("timestamp", -1).skip(skip).limit(limit)
+                transactions = await cursor.to_list(length=limit)
+            
+            # Archived rows are older than hot ones, so pages past the hot tier continue there
+            if not search_term and len(transactions) < limit and self.needs_archive(start_date):
+                archive_skip = max(0, skip - await self.transactions_collection.count_documents(query_filter))
+                cursor = self.archive_collection.find(query_filter, projection).sort("timestamp", -1).skip(archive_skip).limit(limit - len(transactions))
+                transactions += await cursor.to_list(length=limit - len(transactions))
+            
             # Convert ObjectId to string for JSON serialization
             for transaction in transactions:
-                transaction["_id"] = str(transaction["_id"])
+                if "_id" in transaction:
+                    transaction["_id"] = str(transaction["_id"])
             
             logger.info(f"📊 Retrieved {len(transactions)} transactions")
             return transactions
@@ -204,12 +453,15 @@ class MongoDB:
             logger.error(f"❌ Error retrieving transactions: {e}")
             return []
     
-    async def get_transaction_by_id(self, transaction_id: str) -> Optional[Dict[str, Any]]:
+    async def get_transaction_by_id(self, transaction_id: str, projection: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
         """Get a specific transaction by ID"""
         try:
-            transaction = await self.transactions_collection.find_one({"transaction_id": transaction_id})
+            transaction = await self.transactions_collection.find_one({"transaction_id": transaction_id}, projection)
+            if transaction is None and self.needs_archive():
+                transaction = await self.archive_collection.find_one({"transaction_id": transaction_id}, projection)
             if transaction:
-                transaction["_id"] = str(transaction["_id"])
+                if "_id" in transaction:
+                    transaction["_id"] = str(transaction["_id"])
                 logger.info(f"📊 Retrieved transaction {transaction_id}")
             return transaction
             
@@ -241,7 +493,7 @@ class MongoDB:
                 }
             ]
             
-            result = await self.transactions_collection.aggregate(pipeline).to_list(length=1)
+            result = await self.analytics_transactions.aggregate(self.archive_union(pipeline)).to_list(length=1)
             
             if result:
                 stats = result[0]
@@ -278,7 +530,7 @@ class MongoDB:
                 {"$sort": {"count": -1}}
             ]
             
-            result = await self.transactions_collection.aggregate(pipeline).to_list(length=None)
+            result = await self.analytics_transactions.aggregate(self.archive_union(pipeline)).to_list(length=None)
             
             distribution = {}
             for item in result:
@@ -312,7 +564,7 @@ class MongoDB:
                 {"$sort": {"_id.date": 1, "_id.hour": 1}}
             ]
             
-            result = await self.transactions_collection.aggregate(pipeline).to_list(length=None)
+            result = await self.analytics_transactions.aggregate(self.archive_union(pipeline, start_date)).to_list(length=None)
             
             # Format data for charts
             chart_data = []
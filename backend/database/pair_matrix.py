@@ -0,0 +1,353 @@
+"""
+Persisted sender x receiver matrices of bank pairs and VPA-domain pairs
+Daily cells are updated incrementally from inserts and read back as dense NumPy matrices for heat maps
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from pymongo import UpdateOne
+from database.codec import vpa_domain
+from database.mongodb import mongodb
+from database.rollups import ceil_day, floor_day
+from models.transaction import FailureType, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Dimension name -> (sender field, receiver field) on stored transactions
+PAIR_DIMENSIONS: Dict[str, Tuple[str, str]] = {
+    "bank": ("sender_bank", "receiver_bank"),
+    "domain": ("sender_domain", "receiver_domain"),
+}
+
+# Measures a matrix can be drawn with; failure type values select that type's count
+PAIR_MEASURES = ("count", "failed", "amount_sum", "failure_rate", "avg_amount") + tuple(ft.value for ft in FailureType)
+
+
+def _new_cell() -> Dict[str, Any]:
+    return {"count": 0, "failed": 0, "amount_sum": 0.0, "failure_types": {}}
+
+
+def _add_cell(target: Dict[str, Any], other: Dict[str, Any]):
+    target["count"] += other["count"]
+    target["failed"] += other["failed"]
+    target["amount_sum"] += other["amount_sum"]
+    for failure_type, count in other["failure_types"].items():
+        target["failure_types"][failure_type] = target["failure_types"].get(failure_type, 0) + count
+
+
+def _label_key(label: Optional[str]) -> Tuple[bool, str]:
+    """Sort labels alphabetically with missing values last"""
+    return (label is None, label or "")
+
+
+def dense_matrix(
+    cells: Dict[Tuple[Optional[str], Optional[str]], Dict[str, Any]],
+    measure: str = "count"
+) -> Tuple[List[Optional[str]], List[Optional[str]], np.ndarray]:
+    """Lay (sender, receiver) cells out as a senders x receivers float matrix
+
+    Pairs that never transacted are 0 for counts and sums, NaN for failure_rate and avg_amount.
+    """
+    if measure not in PAIR_MEASURES:
+        raise ValueError(f"Unknown pair matrix measure: {measure}")
+    senders = sorted({sender for sender, _ in cells}, key=_label_key)
+    receivers = sorted({receiver for _, receiver in cells}, key=_label_key)
+    row_of = {sender: index for index, sender in enumerate(senders)}
+    column_of = {receiver: index for index, receiver in enumerate(receivers)}
+
+    shape = (len(senders), len(receivers))
+    count = np.zeros(shape)
+    values = np.zeros(shape)
+    for (sender, receiver), cell in cells.items():
+        row, column = row_of[sender], column_of[receiver]
+        count[row, column] = cell["count"]
+        if measure in ("failed", "failure_rate"):
+            values[row, column] = cell["failed"]
+        elif measure in ("amount_sum", "avg_amount"):
+            values[row, column] = cell["amount_sum"]
+        elif measure != "count":
+            values[row, column] = cell["failure_types"].get(measure, 0)
+
+    if measure == "count":
+        return senders, receivers, count
+    if measure in ("failure_rate", "avg_amount"):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = np.where(count > 0, values / count, np.nan)
+        if measure == "failure_rate":
+            values *= 100
+    return senders, receivers, values
+
+
+class PairMatrix:
+    """Maintains daily (sender, receiver) cells per dimension in the pair matrix collection"""
+
+    def __init__(self):
+        self.flush_interval = float(os.getenv("PAIR_MATRIX_FLUSH_INTERVAL", "5"))
+        self._pending: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Transactions inserted while a rebuild runs, replayed unless its scan counted them
+        self._held: Optional[List[Transaction]] = None
+        self.ready = False
+        # Only newly created documents: duplicates and re-sent upserts must not count twice
+        mongodb.add_insert_listener(self.record)
+
+    def record(self, transactions: List[Transaction]):
+        """Accumulate increments for inserted transactions; flushed in bulk by the background loop"""
+        if self._held is not None:
+            self._held.extend(transactions)
+            return
+        self._accumulate(self._pending, transactions)
+
+    def _accumulate(self, pending: Dict[tuple, Dict[str, Any]], transactions: List[Transaction]):
+        for transaction in transactions:
+            day = floor_day(transaction.timestamp)
+            failed = transaction.status == "failed"
+            failure_type = transaction.failure_type.value if transaction.failure_type else None
+            pairs = (
+                ("bank", transaction.sender_bank, transaction.receiver_bank),
+                ("domain", vpa_domain(transaction.sender_vpa), vpa_domain(transaction.receiver_vpa)),
+            )
+            for dimension, sender, receiver in pairs:
+                key = (day, dimension, sender, receiver)
+                cell = pending.get(key)
+                if cell is None:
+                    cell = pending[key] = _new_cell()
+                cell["count"] += 1
+                cell["amount_sum"] += transaction.amount
+                if failed:
+                    cell["failed"] += 1
+                if failure_type:
+                    cell["failure_types"][failure_type] = cell["failure_types"].get(failure_type, 0) + 1
+
+    async def flush(self) -> int:
+        """Apply pending increments with one unordered bulk write; returns the cells touched"""
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            operations = []
+            for (day, dimension, sender, receiver), cell in pending.items():
+                increments = {"count": cell["count"], "failed": cell["failed"], "amount_sum": cell["amount_sum"]}
+                for failure_type, count in cell["failure_types"].items():
+                    increments[f"failure_types.{failure_type}"] = count
+                operations.append(UpdateOne(
+                    {"_id": {"day": day, "dimension": dimension, "sender": sender, "receiver": receiver}},
+                    {
+                        "$inc": increments,
+                        "$setOnInsert": {"day": day, "dimension": dimension, "sender": sender, "receiver": receiver}
+                    },
+                    upsert=True
+                ))
+
+            try:
+                await mongodb.pair_matrix_collection.bulk_write(operations, ordered=False)
+            except Exception:
+                # Keep the increments for the next flush rather than losing them
+                for key, cell in pending.items():
+                    if key in self._pending:
+                        _add_cell(self._pending[key], cell)
+                    else:
+                        self._pending[key] = cell
+                raise
+            return len(operations)
+
+    async def rebuild(self) -> int:
+        """Recompute every cell from the stored transactions (including the archive); returns the cells written
+
+        The scan counts rows created before a cut-off. Rows inserted while it runs are held
+        back and replayed only if they were created after the cut-off, so none count twice.
+        The cells are built in a staging collection and swapped in with $out, so readers
+        never see a partial matrix.
+        """
+        async with self._lock:
+            cutoff = datetime.utcnow()
+            self._held = []
+            early: List[Transaction] = []
+            try:
+                # Rows written before the cut-off must be visible to the scan
+                await mongodb.wait_for_writes(cutoff)
+                # Rows recorded from here on were created after the cut-off; those recorded while waiting may be either
+                early, self._held = self._held, []
+                replay = await self._created_since(early, cutoff)
+                cells = await self._scan(cutoff)
+                await self._replace(cells)
+            except Exception:
+                held, self._held = self._held, None
+                self._accumulate(self._pending, early + held)
+                raise
+
+            held, self._held = self._held, None
+            # Pending increments were all created before the cut-off, so the scan counted them
+            self._pending = {}
+            self._accumulate(self._pending, replay + held)
+
+            await mongodb.analytics_collection.update_one(
+                {"metric_type": "pair_matrix_state"},
+                {"$set": {"rebuilt_at": datetime.utcnow(), "cells": len(cells)}},
+                upsert=True
+            )
+            self.ready = True
+            logger.info(f"🧮 Rebuilt pair matrix: {len(cells)} daily cells")
+            return len(cells)
+
+    async def _created_since(self, transactions: List[Transaction], cutoff: datetime) -> List[Transaction]:
+        """The transactions whose stored created_at is at or after cutoff"""
+        if not transactions:
+            return []
+        query = {"transaction_id": {"$in": [transaction.transaction_id for transaction in transactions]}}
+        created = {}
+        async for doc in mongodb.transactions_collection.find(query, {"_id": 0, "transaction_id": 1, "created_at": 1}):
+            created[doc["transaction_id"]] = doc.get("created_at")
+        return [
+            transaction for transaction in transactions
+            if created.get(transaction.transaction_id) is not None and created[transaction.transaction_id] >= cutoff
+        ]
+
+    async def _scan(self, cutoff: datetime) -> Dict[tuple, Dict[str, Any]]:
+        """Daily cells of every dimension from the rows created before cutoff"""
+        cells: Dict[tuple, Dict[str, Any]] = {}
+        for dimension, (sender_field, receiver_field) in PAIR_DIMENSIONS.items():
+            pipeline = mongodb.archive_union([
+                # Documents from before created_at was stored predate every cut-off
+                {"$match": {"created_at": {"$not": {"$gte": cutoff}}}},
+                {
+                    "$group": {
+                        "_id": {
+                            "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+                            "sender": f"${sender_field}",
+                            "receiver": f"${receiver_field}",
+                            "failure_type": "$failure_type"
+                        },
+                        "count": {"$sum": 1},
+                        "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}},
+                        "amount_sum": {"$sum": "$amount"}
+                    }
+                }
+            ])
+            async for row in mongodb.transactions_collection.aggregate(pipeline):
+                group = row["_id"]
+                day = datetime.strptime(group["day"], "%Y-%m-%d")
+                key = (day, dimension, group.get("sender"), group.get("receiver"))
+                cell = cells.get(key)
+                if cell is None:
+                    cell = cells[key] = _new_cell()
+                failure_type = group.get("failure_type")
+                _add_cell(cell, {
+                    "count": row["count"],
+                    "failed": row["failed"],
+                    "amount_sum": row["amount_sum"],
+                    "failure_types": {failure_type: row["count"]} if failure_type else {}
+                })
+        return cells
+
+    async def _replace(self, cells: Dict[tuple, Dict[str, Any]]):
+        """Swap the cells in as the whole matrix: written to a staging collection, then $out over the live one"""
+        collection = mongodb.pair_matrix_collection
+        staging = mongodb.database[f"{collection.name}_staging"]
+        await staging.drop()
+        try:
+            if cells:
+                await staging.insert_many([
+                    {
+                        "_id": {"day": day, "dimension": dimension, "sender": sender, "receiver": receiver},
+                        "day": day,
+                        "dimension": dimension,
+                        "sender": sender,
+                        "receiver": receiver,
+                        **cell
+                    }
+                    for (day, dimension, sender, receiver), cell in cells.items()
+                ])
+                # $out replaces the target atomically and keeps its indexes
+                await staging.aggregate([{"$out": collection.name}]).to_list(None)
+            else:
+                await collection.delete_many({})
+        finally:
+            await staging.drop()
+
+    async def cells(
+        self,
+        dimension: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[Tuple[Optional[str], Optional[str]], Dict[str, Any]]:
+        """Sum the daily cells of one dimension over the days touching [start, end)"""
+        query: Dict[str, Any] = {"dimension": dimension}
+        days = {}
+        if start is not None:
+            days["$gte"] = floor_day(start)
+        if end is not None:
+            days["$lt"] = ceil_day(end)
+        if days:
+            query["day"] = days
+
+        cells: Dict[Tuple[Optional[str], Optional[str]], Dict[str, Any]] = {}
+        projection = {"_id": 0, "sender": 1, "receiver": 1, "count": 1, "failed": 1, "amount_sum": 1, "failure_types": 1}
+        async for doc in mongodb.analytics_pair_matrix.find(query, projection):
+            key = (doc.get("sender"), doc.get("receiver"))
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = _new_cell()
+            _add_cell(cell, {
+                "count": doc.get("count", 0),
+                "failed": doc.get("failed", 0),
+                "amount_sum": doc.get("amount_sum", 0.0),
+                "failure_types": doc.get("failure_types") or {}
+            })
+        return cells
+
+    async def matrix(
+        self,
+        dimension: str = "bank",
+        measure: str = "count",
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Tuple[List[Optional[str]], List[Optional[str]], np.ndarray]:
+        """Dense senders x receivers matrix of one measure (see dense_matrix)"""
+        return dense_matrix(await self.cells(dimension, start, end), measure)
+
+    async def load_state(self):
+        """Rebuild once on first start; afterwards the incremental updates keep the matrix current"""
+        state = await mongodb.analytics_collection.find_one({"metric_type": "pair_matrix_state"})
+        if state:
+            self.ready = True
+        else:
+            await self.rebuild()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if mongodb.pair_matrix_collection is not None:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Error flushing pair matrix: {e}")
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                if mongodb.pair_matrix_collection is not None:
+                    if not self.ready:
+                        await self.load_state()
+                    await self.flush()
+            except Exception as e:
+                logger.error(f"❌ Error updating pair matrix: {e}")
+            await asyncio.sleep(self.flush_interval)
+
+
+# Global pair matrix instance
+pair_matrix = PairMatrix()
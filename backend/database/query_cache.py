@@ -0,0 +1,126 @@
+"""
+Shared async result cache for heavy analytics aggregations
+Serves stale results while one task recomputes; entries also expire after enough new writes
+"""
+
+import os
+import time
+import asyncio
+import logging
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+from database.mongodb import mongodb
+from models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+
+class QueryCache:
+    """Results keyed on (query name, parameters) with TTL, stale-while-revalidate and single-flight"""
+
+    def __init__(self):
+        self.ttl = float(os.getenv("QUERY_CACHE_TTL", "30"))
+        self.stale_ttl = float(os.getenv("QUERY_CACHE_STALE_SECONDS", "300"))
+        self.max_writes = int(os.getenv("QUERY_CACHE_MAX_WRITES", "1000"))
+        # Time-windowed queries make the key space open-ended
+        self.max_entries = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "256"))
+        # key -> {"value", "computed_at", "writes_at"}
+        self._entries: Dict[Hashable, Dict[str, Any]] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.write_count = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        mongodb.add_write_listener(self._on_write)
+
+    def _on_write(self, transactions: List[Transaction]):
+        self.write_count += len(transactions)
+
+    def _is_fresh(self, entry: Dict[str, Any], now: float) -> bool:
+        return (now - entry["computed_at"] < self.ttl and
+                self.write_count - entry["writes_at"] < self.max_writes)
+
+    def _is_servable(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry["computed_at"] < self.ttl + self.stale_ttl
+
+    async def _compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        writes_at = self.write_count
+        try:
+            value = await compute()
+            # The query methods swallow errors and return empty results, which must not stick
+            if value:
+                now = time.monotonic()
+                self._entries[key] = {"value": value, "computed_at": now, "writes_at": writes_at}
+                self._evict(now)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def _evict(self, now: float):
+        """Drop entries past their stale window, then the oldest ones beyond max_entries"""
+        if len(self._entries) <= self.max_entries:
+            return
+        for key in [key for key, entry in self._entries.items() if not self._is_servable(entry, now)]:
+            del self._entries[key]
+        if len(self._entries) > self.max_entries:
+            oldest = sorted(self._entries, key=lambda key: self._entries[key]["computed_at"])
+            for key in oldest[:len(self._entries) - self.max_entries]:
+                del self._entries[key]
+
+    def _recompute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Start (or join) the single recomputation for key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._compute(key, compute))
+            self._inflight[key] = task
+        return task
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+
+        if entry is not None and self._is_fresh(entry, now):
+            self.hits += 1
+            return entry["value"]
+
+        if entry is not None and self._is_servable(entry, now):
+            self.stale_hits += 1
+            self._recompute(key, compute)
+            return entry["value"]
+
+        self.misses += 1
+        # Shield so a cancelled request does not cancel the computation other callers share
+        return await asyncio.shield(self._recompute(key, compute))
+
+    def invalidate(self, name: Optional[str] = None):
+        """Drop every entry, or only the entries of one query"""
+        if name is None:
+            self._entries.clear()
+        else:
+            for key in [key for key in self._entries if key[0] == name]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "writes_seen": self.write_count
+        }
+
+
+# Global query cache instance
+query_cache = QueryCache()
+
+
+def cached_query(name: str):
+    """Cache an async query function's result under (name, args, kwargs)"""
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            return await query_cache.get_or_compute(key, lambda: func(*args, **kwargs))
+        return wrapper
+    return decorator
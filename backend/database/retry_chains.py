@@ -0,0 +1,356 @@
+"""
+Retry chains: attempts linked by (sender_vpa, receiver_vpa, amount) and time proximity
+Chains are linked with a vectorized sort-and-sweep and materialized as hourly outcome counts
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from bson import ObjectId
+from pymongo import ReplaceOne
+from database.mongodb import mongodb
+from database.rollups import ONE_DAY, ONE_HOUR, ceil_hour, floor_hour, time_range
+from models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+CHAIN_PROJECTION = {
+    "_id": 0, "timestamp": 1, "sender_vpa": 1, "receiver_vpa": 1, "amount": 1, "status": 1, "failure_type": 1
+}
+# Time-to-success histogram bin edges in seconds; the last bin is open-ended
+TIME_TO_SUCCESS_EDGES = (0, 5, 15, 30, 60, 120, 300, 600, 1800)
+CHAIN_COLUMNS = ("start", "failure_type", "attempts", "succeeded", "time_to_success")
+
+
+def link_chains(frame: pd.DataFrame, gap: timedelta, max_span: timedelta) -> pd.DataFrame:
+    """Link attempts into chains and return one row per chain whose first attempt failed
+
+    Rows with the same sender, receiver and amount belong to one chain while each attempt
+    follows the previous one within gap; a success ends the chain, and chains are split
+    once they span more than max_span. Result columns: start, failure_type (of the first
+    attempt), attempts, succeeded and time_to_success (seconds, NaN when never succeeded).
+    """
+    if frame.empty:
+        return pd.DataFrame(columns=list(CHAIN_COLUMNS))
+
+    keys = frame.groupby(
+        ["sender_vpa", "receiver_vpa", "amount"], sort=False, observed=True, dropna=False
+    ).ngroup().to_numpy()
+    timestamps = frame["timestamp"].to_numpy("datetime64[ns]").astype(np.int64)
+    order = np.lexsort((timestamps, keys))
+    keys, timestamps = keys[order], timestamps[order]
+    success = (frame["status"].astype(object).to_numpy() == "success")[order]
+
+    # Sweep: a row starts a new chain on a new key, a long pause, or after a success
+    new_chain = np.ones(len(keys), dtype=bool)
+    new_chain[1:] = (
+        (keys[1:] != keys[:-1]) |
+        (timestamps[1:] - timestamps[:-1] > gap // timedelta(microseconds=1) * 1000) |
+        success[:-1]
+    )
+    span = max_span // timedelta(microseconds=1) * 1000
+    while True:
+        chain = np.cumsum(new_chain) - 1
+        starts = np.flatnonzero(new_chain)
+        too_long = np.flatnonzero(timestamps - timestamps[starts][chain] > span)
+        if not len(too_long):
+            break
+        # The first attempt past the span starts a new chain; repeat for very long chains
+        _, first = np.unique(chain[too_long], return_index=True)
+        new_chain[too_long[first]] = True
+
+    ends = np.append(starts[1:], len(keys)) - 1
+    first_failed = ~success[starts]
+    succeeded = success[ends]
+    starts, ends, succeeded = starts[first_failed], ends[first_failed], succeeded[first_failed]
+    failure_types = frame["failure_type"].astype(object).to_numpy()[order][starts]
+    return pd.DataFrame({
+        "start": pd.to_datetime(timestamps[starts]),
+        "failure_type": pd.Series(failure_types, dtype=object).where(pd.notna(failure_types), None),
+        "attempts": ends - starts + 1,
+        "succeeded": succeeded,
+        "time_to_success": np.where(succeeded, (timestamps[ends] - timestamps[starts]) / 1e9, np.nan),
+    })
+
+
+def chain_stats(chains: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Hourly outcome counts: one row per (bucket, failure_type, attempts, succeeded)"""
+    if chains.empty:
+        return []
+    chains = chains.assign(
+        bucket=chains["start"].dt.floor("h"),
+        failure_type=chains["failure_type"].fillna("unknown"),
+        tts_bin=np.digitize(chains["time_to_success"].fillna(0), TIME_TO_SUCCESS_EDGES[1:])
+    )
+    keys = ["bucket", "failure_type", "attempts", "succeeded"]
+    grouped = chains.groupby(keys).agg(
+        count=("start", "size"), time_to_success_sum=("time_to_success", "sum")
+    )
+    histograms = chains[chains["succeeded"]].groupby(keys + ["tts_bin"]).size()
+
+    rows = {}
+    for key, row in zip(grouped.index, grouped.itertuples()):
+        bucket, failure_type, attempts, succeeded = key
+        rows[key] = {
+            "bucket": bucket.to_pydatetime(),
+            "failure_type": failure_type,
+            "attempts": int(attempts),
+            "succeeded": bool(succeeded),
+            "count": int(row.count),
+            "time_to_success_sum": float(row.time_to_success_sum) if succeeded else 0.0,
+            "time_to_success_histogram": [0] * len(TIME_TO_SUCCESS_EDGES),
+        }
+    for (*key, tts_bin), count in histograms.items():
+        rows[tuple(key)]["time_to_success_histogram"][int(tts_bin)] = int(count)
+    return list(rows.values())
+
+
+def _histogram_quantile(histogram: List[int], q: float) -> Optional[float]:
+    """Quantile interpolated within the fixed bins (the open last bin reports its lower edge)"""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for index, count in enumerate(histogram):
+        if count and seen + count >= target:
+            lo = TIME_TO_SUCCESS_EDGES[index]
+            if index + 1 == len(TIME_TO_SUCCESS_EDGES):
+                return float(lo)
+            return lo + (TIME_TO_SUCCESS_EDGES[index + 1] - lo) * (target - seen) / count
+        seen += count
+    return float(TIME_TO_SUCCESS_EDGES[-1])
+
+
+def summarize_chains(
+    rows: List[Dict[str, Any]],
+    min_success_probability: float = 0.2,
+    min_chains: int = 10
+) -> List[Dict[str, Any]]:
+    """Per failure type: eventual success, time-to-success and per-attempt success probability
+
+    recommended_max_retries counts the retries whose conditional success probability
+    stays at or above min_success_probability (with at least min_chains observations).
+    """
+    by_type: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        summary = by_type.setdefault(row["failure_type"], {
+            "chains": 0, "succeeded": 0, "attempts_sum": 0, "time_to_success_sum": 0.0,
+            "histogram": [0] * len(TIME_TO_SUCCESS_EDGES), "ended_at": {}, "succeeded_at": {}
+        })
+        count, attempts = row["count"], row["attempts"]
+        summary["chains"] += count
+        summary["attempts_sum"] += attempts * count
+        summary["ended_at"][attempts] = summary["ended_at"].get(attempts, 0) + count
+        if row["succeeded"]:
+            summary["succeeded"] += count
+            summary["time_to_success_sum"] += row["time_to_success_sum"]
+            summary["succeeded_at"][attempts] = summary["succeeded_at"].get(attempts, 0) + count
+            for index, binned in enumerate(row["time_to_success_histogram"]):
+                summary["histogram"][index] += binned
+
+    result = []
+    for failure_type, summary in by_type.items():
+        chains, succeeded = summary["chains"], summary["succeeded"]
+        longest = max(summary["ended_at"])
+        attempts = []
+        reached = chains
+        recommended, recommending = 0, True
+        for attempt in range(2, longest + 1):
+            # Chains still going at this attempt: those that didn't end earlier
+            reached -= summary["ended_at"].get(attempt - 1, 0)
+            successes = summary["succeeded_at"].get(attempt, 0)
+            probability = successes / reached if reached else None
+            attempts.append({
+                "attempt": attempt,
+                "reached": reached,
+                "succeeded": successes,
+                "success_probability": probability * 100 if probability is not None else None
+            })
+            if recommending and reached >= min_chains and probability is not None and probability >= min_success_probability:
+                recommended += 1
+            else:
+                recommending = False
+        result.append({
+            "failure_type": failure_type,
+            "chains": chains,
+            "eventual_success_rate": succeeded / chains * 100 if chains else None,
+            "avg_attempts": summary["attempts_sum"] / chains if chains else None,
+            "avg_time_to_success_seconds": summary["time_to_success_sum"] / succeeded if succeeded else None,
+            "median_time_to_success_seconds": _histogram_quantile(summary["histogram"], 0.5),
+            "p90_time_to_success_seconds": _histogram_quantile(summary["histogram"], 0.9),
+            "attempts": attempts,
+            "recommended_max_retries": recommended
+        })
+    result.sort(key=lambda item: item["chains"], reverse=True)
+    return result
+
+
+def _stats_id(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Stable _id of an hourly outcome count, so a relink replaces it in place"""
+    return {key: row[key] for key in ("bucket", "failure_type", "attempts", "succeeded")}
+
+
+class RetryChainEngine:
+    """Links retry chains over closed time ranges and keeps hourly outcome counts up to date"""
+
+    def __init__(self):
+        self.gap = timedelta(seconds=float(os.getenv("RETRY_CHAIN_GAP_SECONDS", "600")))
+        self.max_span = timedelta(seconds=float(os.getenv("RETRY_CHAIN_MAX_SPAN_SECONDS", "3600")))
+        self.min_success_probability = float(os.getenv("RETRY_MIN_SUCCESS_PROBABILITY", "0.2"))
+        self.refresh_interval = float(os.getenv("RETRY_CHAIN_REFRESH_INTERVAL", "300"))
+        self._dirty_hours: set = set()
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._watermark: Optional[datetime] = None
+        mongodb.add_write_listener(self.mark_dirty)
+
+    def mark_dirty(self, transactions: List[Transaction]):
+        """Late writes up to max_span past the watermark can relink chains in the hours around them"""
+        watermark = self._watermark
+        if watermark is None:
+            return
+        for transaction in transactions:
+            if transaction.timestamp < watermark + self.max_span:
+                self._dirty_hours.add(floor_hour(transaction.timestamp))
+
+    async def get_watermark(self, collection=None) -> Optional[datetime]:
+        """Chains starting before the watermark are linked and counted
+
+        Readers pass mongodb.analytics_state to read it from the same members as the chain stats.
+        """
+        state = await (collection if collection is not None else mongodb.analytics_collection).find_one(
+            {"metric_type": "retry_chain_state"}
+        )
+        watermark = state["linked_until"] if state else None
+        if collection is None:
+            self._watermark = watermark
+        return watermark
+
+    async def _set_watermark(self, watermark: datetime):
+        await mongodb.analytics_collection.update_one(
+            {"metric_type": "retry_chain_state"},
+            {"$set": {"linked_until": watermark, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        self._watermark = watermark
+
+    async def _load(self, lo: datetime, hi: datetime) -> pd.DataFrame:
+        pipeline = mongodb.archive_union(
+            [{"$match": {"timestamp": time_range(lo, hi)}}, {"$project": CHAIN_PROJECTION}], lo
+        )
+        rows = await mongodb.transactions_collection.aggregate(pipeline).to_list(length=None)
+        return pd.DataFrame(rows, columns=[field for field in CHAIN_PROJECTION if field != "_id"])
+
+    async def _rebuild_range(self, lo: datetime, hi: datetime) -> int:
+        """Relink chains starting in [lo, hi); rows up to max_span either side complete them"""
+        frame = await self._load(lo - self.max_span, hi + self.max_span)
+        loop = asyncio.get_running_loop()
+        chains = await loop.run_in_executor(None, link_chains, frame, self.gap, self.max_span)
+        chains = chains[(chains["start"] >= lo) & (chains["start"] < hi)]
+        rows = await loop.run_in_executor(None, chain_stats, chains)
+
+        # Counts are replaced in place and tagged with this run; only those the relink no
+        # longer produced are deleted afterwards, so stats() never finds the hours empty
+        collection = mongodb.retry_chains_collection
+        run = ObjectId()
+        if rows:
+            await collection.bulk_write([
+                ReplaceOne({"_id": _stats_id(row)}, dict(row, _id=_stats_id(row), run=run), upsert=True)
+                for row in rows
+            ], ordered=False)
+        await collection.delete_many({"bucket": time_range(lo, hi), "run": {"$ne": run}})
+        return len(chains)
+
+    async def refresh(self, full: bool = False) -> int:
+        """Link chains in every hour that can no longer change, plus dirty hours; returns chains linked"""
+        async with self._refresh_lock:
+            watermark = None if full else await self.get_watermark()
+            # Chains starting before this can't gain attempts any more
+            horizon = floor_hour(datetime.utcnow() - self.max_span)
+
+            if watermark is None:
+                first = await mongodb.transactions_collection.find_one(
+                    {}, projection={"timestamp": 1}, sort=[("timestamp", 1)]
+                )
+                if mongodb.needs_archive():
+                    archived = await mongodb.archive_collection.find_one(
+                        {}, projection={"timestamp": 1}, sort=[("timestamp", 1)]
+                    )
+                    if archived and (not first or archived["timestamp"] < first["timestamp"]):
+                        first = archived
+                if not first:
+                    await self._set_watermark(horizon)
+                    return 0
+                watermark = floor_hour(first["timestamp"])
+                await mongodb.retry_chains_collection.delete_many({})
+
+            # Day-sized slices bound the rows held in memory at once
+            ranges = []
+            lo = watermark
+            while lo < horizon:
+                hi = min(lo + ONE_DAY, horizon)
+                ranges.append((lo, hi))
+                lo = hi
+
+            dirty, self._dirty_hours = self._dirty_hours, set()
+            for hour in sorted(dirty):
+                # A late attempt can join or split chains up to max_span away
+                lo = floor_hour(hour - self.max_span)
+                if lo < watermark:
+                    ranges.append((lo, min(ceil_hour(hour + ONE_HOUR + self.max_span), watermark)))
+
+            # Attempts landing from here on near the hours being linked are marked dirty for the
+            # next run; writes stamped earlier are waited for, so the scans see them
+            self._watermark = max(watermark, horizon)
+            linked = 0
+            try:
+                await mongodb.wait_for_writes(datetime.utcnow())
+                for lo, hi in ranges:
+                    linked += await self._rebuild_range(lo, hi)
+            except Exception:
+                self._watermark = watermark
+                self._dirty_hours |= dirty
+                raise
+            await self._set_watermark(max(watermark, horizon))
+
+            if ranges:
+                logger.info(f"🔗 Linked {linked} retry chains over {len(ranges)} ranges up to {horizon.isoformat()}")
+            return linked
+
+    async def stats(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Stored hourly outcome counts for chains starting in the hours touching [start, end)"""
+        query = {}
+        buckets = time_range(floor_hour(start) if start else None, ceil_hour(end) if end else None)
+        if buckets:
+            query["bucket"] = buckets
+        return await mongodb.analytics_retry_chains.find(query, {"_id": 0, "run": 0}).to_list(length=None)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                if mongodb.transactions_collection is not None:
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Error linking retry chains: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+
+# Global retry chain engine instance
+retry_chain_engine = RetryChainEngine()
@@ -0,0 +1,488 @@
+"""
+Time-bucketed pre-aggregation rollups for analytics
+Closed minute/hour/day buckets are materialized with $merge; only the open bucket is scanned raw
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from bson import Binary, ObjectId
+from pymongo import ReplaceOne
+from database.mongodb import mongodb
+from database.sketches import HyperLogLog, TDigest
+from models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+ONE_HOUR = timedelta(hours=1)
+ONE_DAY = timedelta(days=1)
+
+# Dimension name -> (expression over rollup documents, expression over raw transactions, finest granularity needed)
+DIMENSIONS: Dict[str, Tuple[Any, Any, str]] = {
+    "hour_of_day": ({"$hour": "$bucket"}, {"$hour": "$timestamp"}, "hour"),
+    "date": (
+        {"$dateToString": {"format": "%Y-%m-%d", "date": "$bucket"}},
+        {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+        "day"
+    ),
+    "sender_bank": ("$sender_bank", "$sender_bank", "day"),
+    "status": ("$status", "$status", "day"),
+    "failure_type": ("$failure_type", "$failure_type", "day"),
+}
+
+MEASURES = ("count", "failed", "successful", "amount_sum")
+
+# Per-bank sketch documents share the rollup collection under their own granularities
+SKETCH_GRANULARITY = {"hour": "sketch_hour", "day": "sketch_day"}
+SKETCH_PROJECTION = {"_id": 0, "timestamp": 1, "sender_bank": 1, "sender_vpa": 1, "receiver_vpa": 1, "amount": 1}
+
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(value: datetime) -> datetime:
+    floored = floor_hour(value)
+    return floored if floored == value else floored + ONE_HOUR
+
+
+def floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_day(value: datetime) -> datetime:
+    floored = floor_day(value)
+    return floored if floored == value else floored + ONE_DAY
+
+
+def plan_segments(
+    start: Optional[datetime],
+    end: Optional[datetime],
+    watermark: Optional[datetime],
+    needs_hours: bool
+) -> List[Tuple[str, Optional[datetime], Optional[datetime]]]:
+    """Split [start, end) into (source, lo, hi) pieces read from day/hour rollups or raw data
+
+    Rollups cover whole buckets before the watermark; unaligned edges and everything
+    from the watermark on (the open bucket) are read from the raw collection.
+    """
+    if watermark is None:
+        return [("raw", start, end)]
+
+    rolled_lo = ceil_hour(start) if start is not None else None
+    rolled_hi = floor_hour(min(end, watermark)) if end is not None else watermark
+    if rolled_lo is not None and rolled_hi <= rolled_lo:
+        return [("raw", start, end)]
+
+    segments = []
+    if start is not None and start < rolled_lo:
+        segments.append(("raw", start, rolled_lo))
+
+    day_lo = ceil_day(rolled_lo) if rolled_lo is not None else None
+    day_hi = floor_day(rolled_hi)
+    if needs_hours or (day_lo is not None and day_lo >= day_hi):
+        segments.append(("hour", rolled_lo, rolled_hi))
+    else:
+        if rolled_lo is not None and rolled_lo < day_lo:
+            segments.append(("hour", rolled_lo, day_lo))
+        segments.append(("day", day_lo, day_hi))
+        if day_hi < rolled_hi:
+            segments.append(("hour", day_hi, rolled_hi))
+
+    if end is None or rolled_hi < end:
+        segments.append(("raw", rolled_hi, end))
+    return segments
+
+
+def time_range(lo: Optional[datetime], hi: Optional[datetime]) -> Dict[str, datetime]:
+    condition = {}
+    if lo is not None:
+        condition["$gte"] = lo
+    if hi is not None:
+        condition["$lt"] = hi
+    return condition
+
+
+def _whole_range(value: datetime) -> None:
+    """Bucket function that folds every row into a single bucket"""
+    return None
+
+
+class RollupManager:
+    """Maintains per-minute/hour/day aggregate documents and answers grouped queries from them"""
+
+    def __init__(self):
+        self.refresh_interval = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "60"))
+        self.minute_retention = timedelta(days=float(os.getenv("ROLLUP_MINUTE_RETENTION_DAYS", "7")))
+        self._dirty_hours: set = set()
+        self._refresh_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._watermark: Optional[datetime] = None
+        mongodb.add_write_listener(self.mark_dirty)
+
+    def mark_dirty(self, transactions: List[Transaction]):
+        """Closed hour buckets touched by late writes are recomputed on the next refresh"""
+        watermark = self._watermark
+        if watermark is None:
+            return
+        for transaction in transactions:
+            if transaction.timestamp < watermark:
+                self._dirty_hours.add(floor_hour(transaction.timestamp))
+
+    async def get_watermark(self, collection=None) -> Optional[datetime]:
+        """End of the rolled-up range; buckets before it are served from rollups
+
+        Readers pass mongodb.analytics_state to read it from the same members as the rollups;
+        only the primary's watermark is kept for marking late writes dirty.
+        """
+        state = await (collection if collection is not None else mongodb.analytics_collection).find_one(
+            {"metric_type": "rollup_state"}
+        )
+        watermark = state["rolled_up_until"] if state else None
+        if collection is None:
+            self._watermark = watermark
+        return watermark
+
+    async def _set_watermark(self, watermark: datetime):
+        await mongodb.analytics_collection.update_one(
+            {"metric_type": "rollup_state"},
+            {"$set": {"rolled_up_until": watermark, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        self._watermark = watermark
+
+    def _bucket_pipeline(
+        self, granularity: str, lo: datetime, hi: datetime, from_rollups: bool, run: ObjectId
+    ) -> List[Dict[str, Any]]:
+        """Group raw rows (or finer rollups) into buckets and $merge them, tagged with run, into the rollup collection"""
+        if from_rollups:
+            match = {"granularity": "hour", "bucket": time_range(lo, hi)}
+            date_field, count, amount = "$bucket", "$count", "$amount_sum"
+        else:
+            match = {"timestamp": time_range(lo, hi)}
+            date_field, count, amount = "$timestamp", 1, "$amount"
+
+        fields = {
+            "granularity": "$_id.granularity",
+            "bucket": "$_id.bucket",
+            "sender_bank": "$_id.sender_bank",
+            "status": "$_id.status",
+            "failure_type": "$_id.failure_type",
+            "run": run,
+        }
+        if granularity == "minute":
+            fields["expires_at"] = {"$add": ["$_id.bucket", int(self.minute_retention.total_seconds() * 1000)]}
+
+        return [
+            {"$match": match},
+            {
+                "$group": {
+                    "_id": {
+                        "granularity": granularity,
+                        "bucket": {"$dateTrunc": {"date": date_field, "unit": granularity}},
+                        "sender_bank": "$sender_bank",
+                        "status": "$status",
+                        "failure_type": "$failure_type"
+                    },
+                    "count": {"$sum": count},
+                    "amount_sum": {"$sum": amount}
+                }
+            },
+            {"$set": fields},
+            {"$merge": {"into": mongodb.rollups_collection.name, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}}
+        ]
+
+    async def _rebuild_range(self, lo: datetime, hi: datetime):
+        """Recompute minute and hour buckets in [lo, hi) from raw data, then the days they touch
+
+        Recomputed documents replace the stored ones in place and are tagged with this run;
+        only buckets the recompute no longer produced are deleted afterwards, so readers
+        never find the range empty.
+        """
+        rollups = mongodb.rollups_collection
+        run = ObjectId()
+        for granularity in ("minute", "hour"):
+            pipeline = self._bucket_pipeline(granularity, lo, hi, from_rollups=False, run=run)
+            await mongodb.transactions_collection.aggregate(mongodb.archive_union(pipeline, lo)).to_list(length=None)
+
+        hour_sketches = await self._sketch_raw(lo, hi, floor_hour)
+        await self._replace_sketches("hour", hour_sketches, run)
+        # Stale hours must be gone before the days are recomputed from them
+        await rollups.delete_many({
+            "granularity": {"$in": ["minute", "hour", SKETCH_GRANULARITY["hour"]]},
+            "bucket": time_range(lo, hi),
+            "run": {"$ne": run}
+        })
+
+        day_lo, day_hi = floor_day(lo), ceil_day(hi)
+        pipeline = self._bucket_pipeline("day", day_lo, day_hi, from_rollups=True, run=run)
+        await rollups.aggregate(pipeline).to_list(length=None)
+
+        day_sketches = await self._sketch_rollups("hour", day_lo, day_hi, floor_day)
+        await self._replace_sketches("day", day_sketches, run)
+        await rollups.delete_many({
+            "granularity": {"$in": ["day", SKETCH_GRANULARITY["day"]]},
+            "bucket": time_range(day_lo, day_hi),
+            "run": {"$ne": run}
+        })
+
+    async def _replace_sketches(self, granularity: str, sketches: Dict[tuple, Dict[str, Any]], run: ObjectId):
+        """Upsert sketch documents tagged with run"""
+        if sketches:
+            await mongodb.rollups_collection.bulk_write([
+                ReplaceOne({"_id": doc["_id"]}, dict(doc, run=run), upsert=True)
+                for doc in self._sketch_documents(granularity, sketches)
+            ], ordered=False)
+
+    @staticmethod
+    def _new_sketch() -> Dict[str, Any]:
+        return {"count": 0, "senders": HyperLogLog(), "receivers": HyperLogLog(), "amounts": TDigest()}
+
+    @staticmethod
+    def _merge_sketch(target: Dict[str, Any], other: Dict[str, Any]):
+        target["count"] += other["count"]
+        target["senders"].merge(other["senders"])
+        target["receivers"].merge(other["receivers"])
+        target["amounts"].merge(other["amounts"])
+
+    async def _sketch_raw(self, lo: Optional[datetime], hi: Optional[datetime], bucket_of) -> Dict[tuple, Dict[str, Any]]:
+        """Build (bucket, sender_bank) sketches from raw rows in [lo, hi)"""
+        match = {"timestamp": time_range(lo, hi)} if lo is not None or hi is not None else {}
+        pipeline = mongodb.archive_union([{"$match": match}, {"$project": SKETCH_PROJECTION}], lo)
+        sketches: Dict[tuple, Dict[str, Any]] = {}
+        async for row in mongodb.transactions_collection.aggregate(pipeline):
+            key = (bucket_of(row["timestamp"]), row.get("sender_bank"))
+            sketch = sketches.get(key)
+            if sketch is None:
+                sketch = sketches[key] = self._new_sketch()
+            sketch["count"] += 1
+            sketch["senders"].add(row.get("sender_vpa"))
+            sketch["receivers"].add(row.get("receiver_vpa"))
+            sketch["amounts"].add(row.get("amount"))
+        return sketches
+
+    async def _sketch_rollups(
+        self, source: str, lo: Optional[datetime], hi: Optional[datetime], bucket_of, collection=None
+    ) -> Dict[tuple, Dict[str, Any]]:
+        """Merge stored sketches of one granularity in [lo, hi) into (bucket, sender_bank) sketches"""
+        query = {"granularity": SKETCH_GRANULARITY[source]}
+        if lo is not None or hi is not None:
+            query["bucket"] = time_range(lo, hi)
+        collection = collection if collection is not None else mongodb.rollups_collection
+        sketches: Dict[tuple, Dict[str, Any]] = {}
+        async for doc in collection.find(query):
+            key = (bucket_of(doc["bucket"]), doc["sender_bank"])
+            stored = {
+                "count": doc["count"],
+                "senders": HyperLogLog.from_bytes(doc["sender_vpa_hll"]),
+                "receivers": HyperLogLog.from_bytes(doc["receiver_vpa_hll"]),
+                "amounts": TDigest.from_dict(doc["amount_digest"]),
+            }
+            if key in sketches:
+                self._merge_sketch(sketches[key], stored)
+            else:
+                sketches[key] = stored
+        return sketches
+
+    @staticmethod
+    def _sketch_documents(granularity: str, sketches: Dict[tuple, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        name = SKETCH_GRANULARITY[granularity]
+        return [
+            {
+                "_id": {"granularity": name, "bucket": bucket, "sender_bank": sender_bank},
+                "granularity": name,
+                "bucket": bucket,
+                "sender_bank": sender_bank,
+                "count": sketch["count"],
+                "sender_vpa_hll": Binary(sketch["senders"].to_bytes()),
+                "receiver_vpa_hll": Binary(sketch["receivers"].to_bytes()),
+                "amount_digest": sketch["amounts"].to_dict(),
+            }
+            for (bucket, sender_bank), sketch in sketches.items()
+        ]
+
+    async def refresh(self, full: bool = False) -> int:
+        """Roll up every bucket closed since the last run plus dirty buckets; returns ranges rebuilt"""
+        async with self._refresh_lock:
+            watermark = None if full else await self.get_watermark()
+            now_hour = floor_hour(datetime.utcnow())
+
+            if watermark is None:
+                first = await mongodb.transactions_collection.find_one(
+                    {}, projection={"timestamp": 1}, sort=[("timestamp", 1)]
+                )
+                if mongodb.needs_archive():
+                    archived = await mongodb.archive_collection.find_one(
+                        {}, projection={"timestamp": 1}, sort=[("timestamp", 1)]
+                    )
+                    if archived and (not first or archived["timestamp"] < first["timestamp"]):
+                        first = archived
+                if not first:
+                    await self._set_watermark(now_hour)
+                    return 0
+                watermark = floor_hour(first["timestamp"])
+                await mongodb.rollups_collection.delete_many({})
+
+            # Newly closed buckets, in day-sized slices to bound each aggregation
+            ranges = []
+            lo = watermark
+            while lo < now_hour:
+                hi = min(lo + ONE_DAY, now_hour)
+                ranges.append((lo, hi))
+                lo = hi
+
+            dirty, self._dirty_hours = self._dirty_hours, set()
+            ranges.extend((hour, hour + ONE_HOUR) for hour in sorted(dirty) if hour < watermark)
+
+            # Writes landing from here on into the hours being rolled up are marked dirty for the
+            # next run; writes stamped earlier are waited for, so the aggregations see them
+            self._watermark = max(watermark, now_hour)
+            try:
+                await mongodb.wait_for_writes(datetime.utcnow())
+                for lo, hi in ranges:
+                    await self._rebuild_range(lo, hi)
+            except Exception:
+                self._watermark = watermark
+                self._dirty_hours |= dirty
+                raise
+            await self._set_watermark(max(watermark, now_hour))
+
+            if ranges:
+                logger.info(f"📊 Rolled up {len(ranges)} ranges up to {now_hour.isoformat()}")
+            return len(ranges)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                if mongodb.transactions_collection is not None:
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"❌ Error refreshing rollups: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def _segment_pipeline(
+        self,
+        source: str,
+        lo: Optional[datetime],
+        hi: Optional[datetime],
+        dimensions: Sequence[str],
+        match: Dict[str, Any]
+    ) -> List[Dict[str, Any]]:
+        raw = source == "raw"
+        group_id = {name: DIMENSIONS[name][1 if raw else 0] for name in dimensions}
+        count = 1 if raw else "$count"
+        stage_match = dict(match)
+        if raw:
+            window = time_range(lo, hi)
+            if window:
+                stage_match["timestamp"] = window
+        else:
+            stage_match["granularity"] = source
+            window = time_range(lo, hi)
+            if window:
+                stage_match["bucket"] = window
+
+        return [
+            {"$match": stage_match},
+            {
+                "$group": {
+                    "_id": group_id,
+                    "count": {"$sum": count},
+                    "failed": {"$sum": {"$cond": [{"$eq": ["$status", "failed"]}, count, 0]}},
+                    "successful": {"$sum": {"$cond": [{"$eq": ["$status", "success"]}, count, 0]}},
+                    "amount_sum": {"$sum": "$amount" if raw else "$amount_sum"}
+                }
+            }
+        ]
+
+    async def cube(
+        self,
+        dimensions: Sequence[str],
+        match: Optional[Dict[str, Any]] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[Dict[str, Any]]:
+        """Grouped counts/amounts over [start, end), read from rollups where buckets are closed
+
+        match may only reference sender_bank, status and failure_type. Each row holds the
+        dimension values plus count, failed, successful and amount_sum.
+        """
+        match = match or {}
+        try:
+            watermark = await self.get_watermark(collection=mongodb.analytics_state)
+        except Exception:
+            watermark = None
+        needs_hours = any(DIMENSIONS[name][2] == "hour" for name in dimensions)
+
+        segments = plan_segments(start, end, watermark, needs_hours)
+        results = await asyncio.gather(*[
+            (
+                mongodb.analytics_transactions.aggregate(
+                    mongodb.archive_union(self._segment_pipeline(source, lo, hi, dimensions, match), lo)
+                ) if source == "raw" else
+                mongodb.analytics_rollups.aggregate(self._segment_pipeline(source, lo, hi, dimensions, match))
+            ).to_list(length=None)
+            for source, lo, hi in segments
+        ])
+
+        merged: Dict[tuple, Dict[str, Any]] = {}
+        for rows in results:
+            for row in rows:
+                key = tuple(row["_id"].get(name) for name in dimensions)
+                target = merged.get(key)
+                if target is None:
+                    target = merged[key] = dict(zip(dimensions, key))
+                    target.update({measure: 0 for measure in MEASURES})
+                for measure in MEASURES:
+                    target[measure] += row[measure]
+        return list(merged.values())
+
+
+    async def sketches(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Per-bank distinct-VPA and amount sketches over [start, end)
+
+        Closed buckets merge stored day/hour sketches; unaligned edges and the open
+        bucket are sketched from raw rows. Each value holds count, senders and
+        receivers (HyperLogLog) and amounts (TDigest).
+        """
+        try:
+            watermark = await self.get_watermark(collection=mongodb.analytics_state)
+        except Exception:
+            watermark = None
+
+        parts = await asyncio.gather(*[
+            self._sketch_raw(lo, hi, _whole_range) if source == "raw" else
+            self._sketch_rollups(source, lo, hi, _whole_range, collection=mongodb.analytics_rollups)
+            for source, lo, hi in plan_segments(start, end, watermark, needs_hours=False)
+        ])
+
+        merged: Dict[str, Dict[str, Any]] = {}
+        for part in parts:
+            for (_, sender_bank), sketch in part.items():
+                if sender_bank in merged:
+                    self._merge_sketch(merged[sender_bank], sketch)
+                else:
+                    merged[sender_bank] = sketch
+        return merged
+
+
+# Global rollup manager instance
+rollup_manager = RollupManager()
@@ -0,0 +1,93 @@
+"""
+Transaction search query planning
+Routes search terms to anchored index lookups or the text index instead of unanchored regex scans
+"""
+
+import re
+from typing import Any, Dict, List, Optional
+
+# Weighted text index over the searchable fields; textScore doubles as the relevance score
+TEXT_INDEX_NAME = "transaction_text_search"
+TEXT_INDEX_FIELDS = [
+    ("transaction_id", "text"),
+    ("failure_reason", "text"),
+    ("sender_vpa", "text"),
+    ("receiver_vpa", "text"),
+    ("error_code", "text")
+]
+TEXT_INDEX_WEIGHTS = {
+    "transaction_id": 10,
+    "failure_reason": 5,
+    "sender_vpa": 3,
+    "receiver_vpa": 3,
+    "error_code": 1
+}
+
+# TXN000123, UPI20240101000001, VOICE_20240101_...: letters then digits, no spaces
+_TRANSACTION_ID_PATTERN = re.compile(r"^[A-Za-z]{2,}_?\d[\w]*$")
+_VPA_PATTERN = re.compile(r"^[\w.\-]*@[\w.\-]*$")
+
+
+def escape_regex(term: str) -> str:
+    """Escape user input so it is matched literally by $regex"""
+    return re.escape(term)
+
+
+def plan_search(term: str) -> Dict[str, Any]:
+    """Pick the cheapest indexed strategy for a search term
+
+    Returns {"strategy", "filter", "score"} where score is a constant relevance for
+    anchored lookups, or None when the text index's textScore should be used.
+    """
+    term = term.strip()
+
+    if _TRANSACTION_ID_PATTERN.match(term):
+        # Anchored, case-sensitive prefix regexes are bounded scans on the unique index
+        return {
+            "strategy": "transaction_id_prefix",
+            "filter": {"transaction_id": {"$regex": "^" + escape_regex(term.upper())}},
+            "score": TEXT_INDEX_WEIGHTS["transaction_id"]
+        }
+
+    if _VPA_PATTERN.match(term):
+        prefix = {"$regex": "^" + escape_regex(term.lower())}
+        return {
+            "strategy": "vpa_prefix",
+            "filter": {"$or": [{"sender_vpa": prefix}, {"receiver_vpa": prefix}]},
+            "score": TEXT_INDEX_WEIGHTS["sender_vpa"]
+        }
+
+    return {
+        "strategy": "text",
+        "filter": {"$text": {"$search": term}},
+        "score": None
+    }
+
+
+def substring_filter(term: str) -> Dict[str, Any]:
+    """Escaped case-insensitive substring match; a full scan kept for terms the indexes miss"""
+    pattern = {"$regex": escape_regex(term.strip()), "$options": "i"}
+    return {"$or": [
+        {"transaction_id": pattern},
+        {"sender_vpa": pattern},
+        {"receiver_vpa": pattern},
+        {"failure_reason": pattern},
+        {"error_code": pattern}
+    ]}
+
+
+def relevance_stage(score: Optional[int]) -> Dict[str, Any]:
+    """$addFields stage computing relevance_score once per matched document"""
+    if score is None:
+        return {"$addFields": {"relevance_score": {"$meta": "textScore"}}}
+    return {"$addFields": {"relevance_score": score}}
+
+
+def combine(*filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """AND together non-empty filters without nesting when only one is present"""
+    parts: List[Dict[str, Any]] = [f for f in filters if f]
+    if not parts:
+        return {}
+    if len(parts) == 1:
+        return parts[0]
+    return {"$and": parts}
@@ -0,0 +1,158 @@
+"""
+Mergeable probabilistic sketches stored alongside analytics rollups
+HyperLogLog estimates distinct counts, t-digest estimates quantiles; both merge across buckets
+"""
+
+import math
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+
+HLL_PRECISION = 12
+TDIGEST_COMPRESSION = 200
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HyperLogLog:
+    """Distinct-count sketch; 2^precision one-byte registers, ~1.04/sqrt(2^precision) relative error"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[np.ndarray] = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else np.zeros(self.size, dtype=np.uint8)
+
+    def add(self, value: Optional[str]):
+        if not value:
+            return
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        remainder = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remainder.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[Optional[str]]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        raw = alpha * self.size ** 2 / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        # Linear counting is more accurate while many registers are still empty
+        if raw <= 2.5 * self.size and zeros:
+            return int(round(self.size * math.log(self.size / zeros)))
+        return int(round(raw))
+
+    def to_bytes(self) -> bytes:
+        return self.registers.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        registers = np.frombuffer(data, dtype=np.uint8).copy()
+        return cls(precision=int(math.log2(len(registers))), registers=registers)
+
+
+class TDigest:
+    """Merging t-digest; centroids are bounded by the k1 scale function so tails stay precise"""
+
+    def __init__(self, compression: int = TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._buffer: List[float] = []
+
+    @property
+    def count(self) -> float:
+        self._flush()
+        return float(self.weights.sum())
+
+    def add(self, value: Optional[float]):
+        if value is None:
+            return
+        self._buffer.append(float(value))
+        if len(self._buffer) >= 50 * self.compression:
+            self._flush()
+
+    def update(self, values: Iterable[Optional[float]]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "TDigest"):
+        other._flush()
+        self._flush()
+        if not len(other.weights):
+            return
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        values = np.asarray(self._buffer)
+        self._buffer = []
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]))
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray):
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+        # k1 scale: every merged centroid spans at most one unit of k, so the tails keep small centroids
+        centres = (np.cumsum(weights) - weights / 2) / weights.sum()
+        scale = self.compression / (2 * math.pi) * np.arcsin(2 * centres - 1)
+        groups = np.floor(scale - scale[0]).astype(np.int64)
+        merged_weights = np.bincount(groups, weights=weights)
+        merged_sums = np.bincount(groups, weights=means * weights)
+        occupied = merged_weights > 0
+        self.weights = merged_weights[occupied]
+        self.means = merged_sums[occupied] / self.weights
+
+    def quantile(self, q: float) -> Optional[float]:
+        self._flush()
+        if not len(self.weights):
+            return None
+        if len(self.weights) == 1:
+            return float(self.means[0])
+
+        total = self.weights.sum()
+        target = q * total
+        # Each centroid's weight is centred on its mean; interpolate between neighbouring centres
+        centres = np.cumsum(self.weights) - self.weights / 2
+        if target <= centres[0]:
+            return float(self.min + (self.means[0] - self.min) * target / centres[0])
+        if target >= centres[-1]:
+            tail = total - centres[-1]
+            return float(self.means[-1] + (self.max - self.means[-1]) * (target - centres[-1]) / tail)
+        upper = int(np.searchsorted(centres, target))
+        lower = upper - 1
+        fraction = (target - centres[lower]) / (centres[upper] - centres[lower])
+        return float(self.means[lower] + (self.means[upper] - self.means[lower]) * fraction)
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._flush()
+        return {
+            "means": self.means.tolist(),
+            "weights": self.weights.tolist(),
+            "min": self.min,
+            "max": self.max,
+            "compression": self.compression,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TDigest":
+        digest = cls(compression=data.get("compression", TDIGEST_COMPRESSION))
+        digest.means = np.asarray(data["means"], dtype=float)
+        digest.weights = np.asarray(data["weights"], dtype=float)
+        digest.min, digest.max = data.get("min"), data.get("max")
+        return digest
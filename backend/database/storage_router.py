@@ -0,0 +1,295 @@
+"""
+Health-monitored storage routing between MongoDB and the in-memory fallback
+Buffers writes in an on-disk journal while MongoDB is down and drains them on recovery
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, List, Optional
+from pydantic import ValidationError
+from database.mongodb import mongodb
+from models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+
+class WriteJournal:
+    """Append-only NDJSON journal of transactions waiting to be written to MongoDB"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.getenv("WRITE_JOURNAL_PATH", os.path.join("data", "write_journal.ndjson"))
+        # Entries being drained live in a separate file so new writes never race the drain
+        self.draining_path = f"{self.path}.draining"
+        # Lines that no longer parse (e.g. torn by a crash mid-append) are set aside here
+        self.quarantine_path = f"{self.path}.quarantine"
+
+    def append(self, transactions: Iterable[Transaction]) -> int:
+        lines = [transaction.model_dump_json() + "\n" for transaction in transactions]
+        if not lines:
+            return 0
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a+b") as journal:
+            # Terminate a line torn by a crash, so it does not swallow the first new entry
+            if journal.tell() > 0:
+                journal.seek(-1, os.SEEK_END)
+                if journal.read(1) != b"\n":
+                    journal.write(b"\n")
+            journal.write("".join(lines).encode("utf-8"))
+            journal.flush()
+            os.fsync(journal.fileno())
+        return len(lines)
+
+    def has_pending(self) -> bool:
+        return any(
+            os.path.exists(path) and os.path.getsize(path) > 0
+            for path in (self.draining_path, self.path)
+        )
+
+    def iter_transactions(self, path: Optional[str] = None, quarantine: bool = False) -> Iterator[Transaction]:
+        """Pending transactions oldest first, from one journal file or all of them
+
+        Unparseable lines are skipped; with quarantine they are also copied to the quarantine
+        file, so a drain that then removes its file keeps them for inspection.
+        """
+        for journal_path in ((path,) if path else (self.draining_path, self.path)):
+            if not os.path.exists(journal_path):
+                continue
+            with open(journal_path, encoding="utf-8", errors="replace") as journal:
+                for number, line in enumerate(journal, start=1):
+                    if not line.strip():
+                        continue
+                    try:
+                        yield Transaction.model_validate_json(line)
+                    except ValidationError as e:
+                        logger.warning(f"⚠️ Skipping unreadable journal line {journal_path}:{number}: {e.errors()[0]['msg']}")
+                        if quarantine:
+                            self._quarantine(line)
+
+    def _quarantine(self, line: str):
+        with open(self.quarantine_path, "a", encoding="utf-8") as quarantine:
+            quarantine.write(line if line.endswith("\n") else line + "\n")
+            quarantine.flush()
+            os.fsync(quarantine.fileno())
+
+    def begin_drain(self) -> Optional[str]:
+        """Rotate the live journal out for draining; an unfinished drain is resumed first"""
+        if os.path.exists(self.draining_path):
+            return self.draining_path
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return None
+        os.replace(self.path, self.draining_path)
+        return self.draining_path
+
+    def finish_drain(self):
+        if os.path.exists(self.draining_path):
+            os.remove(self.draining_path)
+
+
+class StorageRouter:
+    """Routes reads and writes to MongoDB or the in-memory fallback based on live health checks"""
+
+    def __init__(self):
+        self.health_interval = float(os.getenv("MONGODB_HEALTH_INTERVAL", "5"))
+        self.health_timeout = float(os.getenv("MONGODB_HEALTH_TIMEOUT", "2"))
+        self.drain_batch_size = int(os.getenv("WRITE_JOURNAL_DRAIN_BATCH", "1000"))
+        self.buffer_chunk_size = 1000
+        self.journal = WriteJournal()
+        self.mongodb_available = False
+        self.last_change: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._listeners: List[Callable[[bool], None]] = []
+        self._buffer_sinks: List[Callable[[List[Transaction]], None]] = []
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._drain_lock = asyncio.Lock()
+
+    def add_listener(self, listener: Callable[[bool], None]):
+        """Register a callback invoked with the new availability on every failover/recovery"""
+        self._listeners.append(listener)
+
+    def add_buffer_sink(self, sink: Callable[[List[Transaction]], None]):
+        """Register a callback that receives writes buffered while MongoDB is down"""
+        self._buffer_sinks.append(sink)
+
+    def _set_available(self, available: bool, error: Optional[Exception] = None):
+        if error is not None:
+            self.last_error = str(error)
+        if available == self.mongodb_available:
+            return
+        self.mongodb_available = available
+        self.last_change = datetime.utcnow()
+        if available:
+            logger.info("✅ MongoDB available, routing to database")
+        else:
+            logger.warning(f"⚠️ MongoDB unavailable, routing to in-memory fallback: {self.last_error}")
+        for listener in self._listeners:
+            try:
+                listener(available)
+            except Exception as e:
+                logger.error(f"❌ Storage listener failed: {e}")
+
+    async def connect(self) -> bool:
+        """Initial connection attempt; the monitor keeps retrying afterwards"""
+        self._set_available(await mongodb.connect())
+        if self.mongodb_available:
+            await self.drain_journal()
+        return self.mongodb_available
+
+    def report_failure(self, error: Exception):
+        """Fail over immediately when a caller sees a database error"""
+        self._set_available(False, error)
+
+    async def _ping(self) -> bool:
+        try:
+            await asyncio.wait_for(mongodb.client.admin.command('ping'), timeout=self.health_timeout)
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            return False
+
+    async def check_health(self) -> bool:
+        """Ping (or reconnect to) MongoDB, update routing and drain the journal on recovery"""
+        if mongodb.client is None:
+            healthy = await mongodb.connect()
+        else:
+            healthy = await self._ping()
+
+        self._set_available(healthy)
+        if healthy and self.journal.has_pending():
+            await self.drain_journal()
+        return healthy
+
+    def start(self):
+        if self._monitor_task is None or self._monitor_task.done():
+            self._monitor_task = asyncio.create_task(self._monitor_loop())
+
+    async def stop(self):
+        if self._monitor_task and not self._monitor_task.done():
+            self._monitor_task.cancel()
+            try:
+                await self._monitor_task
+            except asyncio.CancelledError:
+                pass
+
+    async def _monitor_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check_health()
+            except Exception as e:
+                logger.error(f"❌ Error in storage health monitor: {e}")
+
+    def _buffer(self, transactions: List[Transaction]) -> int:
+        buffered = self.journal.append(transactions)
+        for sink in self._buffer_sinks:
+            try:
+                sink(transactions)
+            except Exception as e:
+                logger.error(f"❌ Buffer sink failed: {e}")
+        return buffered
+
+    def _buffer_stream(self, transactions: Iterable[Transaction]) -> int:
+        buffered = 0
+        chunk: List[Transaction] = []
+        for transaction in transactions:
+            chunk.append(transaction)
+            if len(chunk) >= self.buffer_chunk_size:
+                buffered += self._buffer(chunk)
+                chunk = []
+        if chunk:
+            buffered += self._buffer(chunk)
+        logger.info(f"📝 Buffered {buffered} transactions in write journal")
+        return buffered
+
+    async def insert_transaction(self, transaction: Transaction) -> bool:
+        """Write one transaction to MongoDB, or buffer it while MongoDB is down"""
+        if self.mongodb_available:
+            if await mongodb.insert_transaction(transaction):
+                return True
+            # The MongoDB layer swallows errors; only buffer if the database is actually down
+            if await self._ping():
+                return False
+            self._set_available(False)
+        return self._buffer_stream([transaction]) == 1
+
+    async def insert_transactions(self, transactions: Iterable[Transaction]) -> int:
+        """Stream transactions into MongoDB, journaling them if MongoDB is (or goes) down
+
+        Returns the number of transactions inserted or buffered.
+        """
+        if not self.mongodb_available:
+            return self._buffer_stream(transactions)
+
+        failed_batches: List[List[Transaction]] = []
+
+        async def keep_failed(batch: List[Transaction], error: Exception):
+            failed_batches.append(batch)
+
+        stats = await mongodb.bulk_upsert_transactions(
+            transactions, upsert=False, on_batch_failed=keep_failed
+        )
+        written = stats["inserted"]
+
+        if failed_batches:
+            failed = [transaction for batch in failed_batches for transaction in batch]
+            if await self._ping():
+                # Healthy database, failed batch (e.g. a timeout): journal it for the next drain
+                logger.warning(f"⚠️ Journaled {len(failed)} transactions that failed to write: {stats['error_messages']}")
+                written += self.journal.append(failed)
+            else:
+                self._set_available(False)
+                written += self._buffer_stream(failed)
+        return written
+
+    async def drain_journal(self) -> int:
+        """Replay buffered writes into MongoDB with the streaming bulk writer"""
+        async with self._drain_lock:
+            path = self.journal.begin_drain()
+            if path is None:
+                return 0
+
+            failed_batches: List[List[Transaction]] = []
+
+            async def keep_failed(batch: List[Transaction], error: Exception):
+                failed_batches.append(batch)
+
+            stats = await mongodb.bulk_upsert_transactions(
+                self.journal.iter_transactions(path, quarantine=True),
+                batch_size=self.drain_batch_size,
+                upsert=False,
+                on_batch_failed=keep_failed
+            )
+            # Duplicates from an earlier partial drain are already stored
+            if stats["failed_batches"]:
+                if not await self._ping():
+                    # Keep the whole drain file for the next attempt (at-least-once)
+                    self._set_available(False)
+                    logger.warning(f"⚠️ Journal drain interrupted after {stats['inserted']} transactions")
+                    return stats["inserted"]
+                # Healthy database: only the failed batches go back into the journal for a later drain
+                requeued = self.journal.append(t for batch in failed_batches for t in batch)
+                self.journal.finish_drain()
+                logger.warning(f"⚠️ Journal drain re-queued {requeued} transactions that failed to write")
+                return stats["inserted"]
+
+            self.journal.finish_drain()
+            drained = stats["inserted"] + stats["duplicates"]
+            logger.info(f"✅ Drained {drained} buffered transactions into MongoDB")
+
+        # Writes that arrived during the drain went to a fresh journal
+        if self.journal.has_pending() and self.mongodb_available:
+            drained += await self.drain_journal()
+        return drained
+
+    def status(self) -> dict:
+        return {
+            "mongodb_available": self.mongodb_available,
+            "last_change": self.last_change.isoformat() if self.last_change else None,
+            "last_error": self.last_error,
+            "journal_pending": self.journal.has_pending()
+        }
+
+
+# Global storage router instance
+storage_router = StorageRouter()
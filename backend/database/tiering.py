@@ -0,0 +1,169 @@
+"""
+Hot/cold tiering for transaction storage
+Moves rows older than a horizon out of the hot collection into an archive collection or Parquet files
+"""
+
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo.errors import CollectionInvalid
+from database.local_analytics import LocalAnalytics
+from database.mongodb import mongodb
+
+logger = logging.getLogger(__name__)
+
+
+class TieringManager:
+    """Archives cold transactions on a schedule and publishes the archive horizon for query routing"""
+
+    def __init__(self):
+        horizon_days = os.getenv("ARCHIVE_AFTER_DAYS", "")
+        self.horizon = timedelta(days=float(horizon_days)) if horizon_days else None
+        self.target = os.getenv("ARCHIVE_TARGET", "collection")
+        self.timeseries = os.getenv("ARCHIVE_TIMESERIES", "false").lower() == "true"
+        self.parquet_dir = os.getenv("ARCHIVE_PARQUET_DIR", os.path.join("data", "archive"))
+        self.batch_size = int(os.getenv("ARCHIVE_BATCH_SIZE", "5000"))
+        self.interval = float(os.getenv("ARCHIVE_INTERVAL", "3600"))
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Embedded analytics over the Parquet archive, reloaded when its files change
+        self._archive_analytics: Optional[LocalAnalytics] = None
+        self._archive_files: Optional[Tuple] = None
+
+    async def _ensure_archive_collection(self):
+        """Create the archive, as a time-series collection when enabled"""
+        if self.timeseries:
+            try:
+                await mongodb.database.create_collection(
+                    mongodb.archive_collection.name,
+                    timeseries={"timeField": "timestamp", "metaField": "meta", "granularity": "minutes"}
+                )
+                logger.info("🗄️ Created time-series archive collection")
+            except CollectionInvalid:
+                pass
+            # Time-series collections cannot enforce uniqueness
+            await mongodb.archive_collection.create_index("transaction_id")
+        else:
+            await mongodb.archive_collection.create_index("transaction_id", unique=True)
+            await mongodb.archive_collection.create_index([("timestamp", -1)])
+
+    async def load_state(self):
+        """Restore the archive horizon so reads route to the archive after a restart"""
+        state = await mongodb.analytics_collection.find_one({"metric_type": "archive_state"})
+        # Parquet archives are offline; only an archive collection is queryable
+        if state and state.get("target") == "collection":
+            mongodb.archived_until = state["archived_until"]
+
+    async def _save_state(self, archived_until: datetime):
+        await mongodb.analytics_collection.update_one(
+            {"metric_type": "archive_state"},
+            {"$set": {"archived_until": archived_until, "target": self.target, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+        if self.target == "collection":
+            mongodb.archived_until = archived_until
+
+    async def _archive_to_collection(self, docs: List[Dict[str, Any]]):
+        if self.timeseries:
+            for doc in docs:
+                doc["meta"] = {"sender_bank": doc.get("sender_bank"), "status": doc.get("status")}
+        # Replace copies left by an interrupted earlier run so the move stays idempotent
+        transaction_ids = [doc["transaction_id"] for doc in docs]
+        await mongodb.archive_collection.delete_many({"transaction_id": {"$in": transaction_ids}})
+        await mongodb.archive_collection.insert_many(docs, ordered=False)
+
+    def _archive_to_parquet(self, docs: List[Dict[str, Any]]):
+        import pandas as pd
+
+        frame = pd.DataFrame([{key: value for key, value in doc.items() if key != "_id"} for doc in docs])
+        if "metadata" in frame:
+            frame["metadata"] = frame["metadata"].map(lambda value: json.dumps(value or {}, default=str))
+        os.makedirs(self.parquet_dir, exist_ok=True)
+        # Named after the batch's time span and first row so rewriting an interrupted batch
+        # overwrites it, while batches sharing a time span get distinct files
+        first, last = docs[0]["timestamp"], docs[-1]["timestamp"]
+        path = os.path.join(
+            self.parquet_dir,
+            f"transactions_{first:%Y%m%dT%H%M%S}_{last:%Y%m%dT%H%M%S}_{docs[0]['_id']}.parquet"
+        )
+        frame.to_parquet(path, compression="zstd", index=False)
+
+    async def archive(self) -> int:
+        """Move every hot row older than the horizon to the cold tier; returns rows moved"""
+        if self.horizon is None or mongodb.transactions_collection is None:
+            return 0
+
+        async with self._lock:
+            cutoff = (datetime.utcnow() - self.horizon).replace(hour=0, minute=0, second=0, microsecond=0)
+            if self.target == "collection":
+                await self._ensure_archive_collection()
+                # Route older ranges to the archive before rows start moving there
+                mongodb.archived_until = max(mongodb.archived_until or cutoff, cutoff)
+
+            moved = 0
+            while True:
+                docs = await mongodb.transactions_collection.find(
+                    {"timestamp": {"$lt": cutoff}}
+                ).sort([("timestamp", 1), ("_id", 1)]).limit(self.batch_size).to_list(length=self.batch_size)
+                if not docs:
+                    break
+
+                if self.target == "parquet":
+                    await asyncio.get_running_loop().run_in_executor(None, self._archive_to_parquet, docs)
+                else:
+                    await self._archive_to_collection(docs)
+                await mongodb.transactions_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+                moved += len(docs)
+
+            await self._save_state(max(mongodb.archived_until or cutoff, cutoff))
+            if moved:
+                logger.info(f"🧊 Archived {moved} transactions older than {cutoff.date()} to {self.target}")
+            return moved
+
+    async def query_archive(self, name: str, **kwargs) -> Any:
+        """Run a LocalAnalytics analytic on the Parquet archive; None when it has no files"""
+        if not os.path.isdir(self.parquet_dir):
+            return None
+        files = tuple(sorted(
+            (entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+            for entry in os.scandir(self.parquet_dir) if entry.name.endswith(".parquet")
+        ))
+        if not files:
+            return None
+        loop = asyncio.get_running_loop()
+        if files != self._archive_files:
+            self._archive_analytics = await loop.run_in_executor(None, LocalAnalytics.from_path, self.parquet_dir)
+            self._archive_files = files
+        analytics = self._archive_analytics
+        return await loop.run_in_executor(None, lambda: getattr(analytics, name)(**kwargs))
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._archive_loop())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _archive_loop(self):
+        while True:
+            try:
+                if mongodb.transactions_collection is not None:
+                    # An archive from an earlier run stays routable even with archiving now off
+                    if mongodb.archived_until is None:
+                        await self.load_state()
+                    await self.archive()
+            except Exception as e:
+                logger.error(f"❌ Error archiving transactions: {e}")
+            await asyncio.sleep(self.interval)
+
+
+# Global tiering manager instance
+tiering_manager = TieringManager()
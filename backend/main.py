@@ -1,20 +1,35 @@
-from fastapi import FastAPI, HTTPException, Query, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uvicorn
 from services.diagnosis_service import DiagnosisService
 from models.transaction import Transaction, DiagnosisResponse, FailureType
 from utils.data_loader import DataLoader
 from database.mongodb import mongodb
+from database.storage_router import storage_router
+from database.rollups import rollup_manager
+from database.tiering import tiering_manager
+from database.pair_matrix import PAIR_MEASURES, pair_matrix
+from database.retry_chains import retry_chain_engine
+from database.query_cache import query_cache
+from database.instrumentation import query_profiler
 from data_ingestion.huggingface_loader import HuggingFaceDataLoader
 from database.advanced_queries import advanced_queries
+from database.downsampling import bucket_sums, lttb
 from services.voice_service import voice_service
+from services.live_feed import live_feed
+from services.anomaly_detector import anomaly_monitor
+from utils.export import (
+    EXPORT_CHUNK_SIZE, EXPORT_FORMATS, EXPORTABLE_ANALYTICS, TRANSACTION_EXPORT_COLUMNS, TRANSACTION_EXPORT_TYPES,
+    encode_stream, flatten_row, make_encoder, row_chunks
+)
 from fastapi import UploadFile, File, Form
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse
 import tempfile
 import os
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -43,12 +58,30 @@ diagnosis_service = DiagnosisService()
 data_loader = DataLoader()
 hf_loader = HuggingFaceDataLoader()
 
+def _time_window(from_: Optional[datetime], to: Optional[datetime]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """Normalize ?from=&to= to naive UTC (how timestamps are stored) and reject empty ranges"""
+    start, end = (
+        value.astimezone(timezone.utc).replace(tzinfo=None) if value is not None and value.tzinfo is not None else value
+        for value in (from_, to)
+    )
+    if start is not None and end is not None and start >= end:
+        raise HTTPException(status_code=400, detail="'from' must be earlier than 'to'")
+    return start, end
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize data and services on startup"""
     try:
         print("Loading transaction data...")
         await data_loader.load_transaction_data()
+        data_loader.start_background_refresh()
+        storage_router.start()
+        rollup_manager.start()
+        tiering_manager.start()
+        pair_matrix.start()
+        retry_chain_engine.start()
+        anomaly_monitor.start()
+        await live_feed.start()
         print("Transaction data loaded successfully")
         
         print("Initializing diagnosis service...")
@@ -60,6 +93,18 @@ async def startup_event():
         print(f"Error during startup: {e}")
         print("API will continue with limited functionality")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work on shutdown"""
+    await live_feed.stop()
+    await anomaly_monitor.stop()
+    await rollup_manager.stop()
+    await tiering_manager.stop()
+    await pair_matrix.stop()
+    await retry_chain_engine.stop()
+    await storage_router.stop()
+    await data_loader.stop_background_refresh()
+
 @app.get("/")
 async def root():
     return {"message": "UPI Payment Failure Diagnosis API", "status": "running"}
@@ -138,21 +183,31 @@ async def get_failure_types():
         raise HTTPException(status_code=500, detail=f"Failed to fetch failure types: {str(e)}")
 
 @app.get("/analytics/hourly")
-async def get_hourly_analytics(days: int = Query(7, description="Number of days to analyze")):
+async def get_hourly_analytics(
+    days: int = Query(7, description="Number of days to analyze when 'from' is not given"),
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)"),
+    granularity: str = Query("hour", pattern="^(hour|day)$", description="Bucket size: hour or day"),
+    points: Optional[int] = Query(None, ge=3, description="Downsample the series to at most this many points"),
+    downsample: str = Query("lttb", pattern="^(lttb|sum)$", description="lttb keeps the shape-defining buckets, sum merges neighbouring buckets")
+):
     """
     Get hourly transaction analytics for charts
     """
+    start, end = _time_window(from_, to)
+    if start is None:
+        start = datetime.utcnow() - timedelta(days=days)
     try:
-        if data_loader.mongodb_connected:
-            hourly_data = await mongodb.get_hourly_transaction_data(days=days)
-            return hourly_data
-        else:
-            # Fallback to mock data for charts
-            return [
-                {"hour": "00:00", "date": "2024-01-01", "total": 12, "failed": 2, "successful": 10},
-                {"hour": "01:00", "date": "2024-01-01", "total": 8, "failed": 1, "successful": 7},
-                {"hour": "02:00", "date": "2024-01-01", "total": 15, "failed": 3, "successful": 12},
-            ]
+        # Served by the embedded engine over the fallback snapshot while MongoDB is down
+        hourly_data = await data_loader.get_analytics(
+            "get_hourly_analytics", start=start, end=end, granularity=granularity
+        )
+        if points:
+            if downsample == "lttb":
+                hourly_data = lttb(hourly_data, points, x="timestamp", y="total")
+            else:
+                hourly_data = bucket_sums(hourly_data, points, measures=("total", "failed", "successful"))
+        return hourly_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch analytics: {str(e)}")
 
@@ -164,13 +219,16 @@ async def database_health_check():
     try:
         if data_loader.mongodb_connected:
             health_status = await mongodb.health_check()
+            health_status["routing"] = storage_router.status()
+            health_status["query_cache"] = query_cache.stats()
             return health_status
         else:
             return {
                 "status": "fallback",
                 "connected": False,
                 "message": "Using CSV/memory storage",
-                "transactions_count": len(data_loader.transactions_cache)
+                "transactions_count": len(data_loader.transactions_cache),
+                "routing": storage_router.status()
             }
     except Exception as e:
         return {
@@ -179,15 +237,41 @@ async def database_health_check():
             "error": str(e)
         }
 
+@app.get("/database/query-stats")
+async def database_query_stats(limit: int = Query(20, description="Number of query shapes and slow queries to return")):
+    """
+    Per-shape query latency, sampled explain plans and the slow-query log
+    """
+    return query_profiler.report(limit=limit)
+
+@app.get("/database/index-audit")
+async def database_index_audit():
+    """
+    Report indexes unused since server start and collection scans that need an index
+    """
+    if not data_loader.mongodb_connected:
+        raise HTTPException(status_code=503, detail="MongoDB is not available")
+    try:
+        return await query_profiler.index_audit([
+            mongodb.transactions_collection,
+            mongodb.analytics_collection,
+            mongodb.rollups_collection
+        ])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Index audit failed: {str(e)}")
+
 # Hugging Face Dataset Endpoints
 @app.post("/dataset/load-huggingface")
-async def load_huggingface_dataset(background_tasks: BackgroundTasks):
+async def load_huggingface_dataset(
+    background_tasks: BackgroundTasks,
+    refresh: bool = Query(False, description="Ignore the processed-dataset cache and remap the dataset")
+):
     """
     Load the Hugging Face UPI transaction dataset
     """
     try:
         # Load dataset in background
-        success = await hf_loader.load_dataset_from_huggingface()
+        success = await hf_loader.load_dataset_from_huggingface(use_cache=not refresh)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to load Hugging Face dataset")
         
@@ -202,7 +286,9 @@ async def load_huggingface_dataset(background_tasks: BackgroundTasks):
         return {
             "status": "success",
             "message": f"Successfully loaded and processed {len(transactions)} transactions",
-            "statistics": stats
+            "statistics": stats,
+            "cached": hf_loader.loaded_from_cache,
+            "revision": hf_loader.revision
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to load dataset: {str(e)}")
@@ -228,6 +314,34 @@ async def ingest_huggingface_to_mongodb():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to ingest data: {str(e)}")
 
+@app.post("/dataset/ingest-streaming")
+async def ingest_huggingface_streaming(
+    chunk_size: Optional[int] = Query(None, ge=1, description="Records loaded, mapped and written per chunk"),
+    resume: bool = Query(True, description="Continue from the last checkpointed record offset"),
+    workers: Optional[int] = Query(None, ge=1, description="Processes mapping chunks in parallel")
+):
+    """
+    Stream the Hugging Face dataset into MongoDB chunk by chunk in the background
+    """
+    if not hf_loader.start_streaming_ingest(chunk_size=chunk_size, resume=resume, workers=workers):
+        raise HTTPException(status_code=409, detail="A streaming ingestion is already running")
+    return {
+        "status": "started",
+        "message": "Streaming ingestion started; follow it at /dataset/ingest-progress",
+        "chunk_size": chunk_size or hf_loader.chunk_size,
+        "workers": workers or hf_loader.workers
+    }
+
+@app.get("/dataset/ingest-progress")
+async def get_ingest_progress():
+    """
+    Progress and checkpoint of the current or last streaming ingestion
+    """
+    return {
+        "status": "success",
+        "data": hf_loader.ingest_status()
+    }
+
 @app.get("/dataset/statistics")
 async def get_dataset_statistics():
     """
@@ -308,14 +422,18 @@ async def get_dataset_info():
         "status": "loaded" if hf_loader.processed_transactions else "not_loaded"
     }
 
-# Advanced Analytics Endpoints - Direct MongoDB Queries
+# Advanced Analytics Endpoints - MongoDB aggregations, or the embedded engine while MongoDB is down
 @app.get("/analytics/failure-patterns")
-async def get_failure_patterns_by_time():
+async def get_failure_patterns_by_time(
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
     """
     Analyze failure patterns by hour of day - Direct MongoDB aggregation
     """
+    start, end = _time_window(from_, to)
     try:
-        patterns = await advanced_queries.get_failure_patterns_by_time()
+        patterns = await data_loader.get_analytics("get_failure_patterns_by_time", start=start, end=end)
         return {
             "status": "success",
             "data": patterns,
@@ -325,12 +443,16 @@ async def get_failure_patterns_by_time():
         raise HTTPException(status_code=500, detail=f"Failed to analyze failure patterns: {str(e)}")
 
 @app.get("/analytics/bank-performance")
-async def get_bank_performance_metrics():
+async def get_bank_performance_metrics(
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
     """
     Get comprehensive bank performance metrics - Direct MongoDB aggregation
     """
+    start, end = _time_window(from_, to)
     try:
-        metrics = await advanced_queries.get_bank_performance_metrics()
+        metrics = await data_loader.get_analytics("get_bank_performance_metrics", start=start, end=end)
         return {
             "status": "success",
             "data": metrics,
@@ -340,12 +462,16 @@ async def get_bank_performance_metrics():
         raise HTTPException(status_code=500, detail=f"Failed to get bank metrics: {str(e)}")
 
 @app.get("/analytics/vpa-domains")
-async def get_vpa_domain_analysis():
+async def get_vpa_domain_analysis(
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
     """
     Analyze transaction patterns by VPA domain (paytm, phonepe, etc.) - Direct MongoDB
     """
+    start, end = _time_window(from_, to)
     try:
-        analysis = await advanced_queries.get_vpa_domain_analysis()
+        analysis = await data_loader.get_analytics("get_vpa_domain_analysis", start=start, end=end)
         return {
             "status": "success",
             "data": analysis,
@@ -354,13 +480,40 @@ async def get_vpa_domain_analysis():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to analyze VPA domains: {str(e)}")
 
+@app.get("/analytics/pair-matrix")
+async def get_pair_matrix(
+    dimension: str = Query("bank", pattern="^(bank|domain)$", description="Sender x receiver banks or VPA domains"),
+    measure: str = Query("count", pattern=f"^({'|'.join(PAIR_MEASURES)})$", description="Cell value (or a failure type's count)"),
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
+    """
+    Sender x receiver heat map of bank or VPA-domain pairs, served from the persisted pair matrix
+    """
+    start, end = _time_window(from_, to)
+    try:
+        matrix = await data_loader.get_analytics(
+            "get_pair_matrix", dimension=dimension, measure=measure, start=start, end=end
+        )
+        return {
+            "status": "success",
+            "data": matrix,
+            "message": f"Retrieved {len(matrix.get('senders', []))}x{len(matrix.get('receivers', []))} {dimension} pair matrix"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to build pair matrix: {str(e)}")
+
 @app.get("/analytics/amount-based-failures")
-async def get_amount_based_failure_analysis():
+async def get_amount_based_failure_analysis(
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
     """
     Analyze failure patterns based on transaction amounts - Direct MongoDB aggregation
     """
+    start, end = _time_window(from_, to)
     try:
-        analysis = await advanced_queries.get_amount_based_failure_analysis()
+        analysis = await data_loader.get_analytics("get_amount_based_failure_analysis", start=start, end=end)
         return {
             "status": "success",
             "data": analysis,
@@ -370,12 +523,16 @@ async def get_amount_based_failure_analysis():
         raise HTTPException(status_code=500, detail=f"Failed to analyze amount-based failures: {str(e)}")
 
 @app.get("/analytics/retry-patterns")
-async def get_retry_pattern_analysis():
+async def get_retry_pattern_analysis(
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
     """
     Analyze retry patterns and success rates - Direct MongoDB aggregation
     """
+    start, end = _time_window(from_, to)
     try:
-        patterns = await advanced_queries.get_retry_pattern_analysis()
+        patterns = await data_loader.get_analytics("get_retry_pattern_analysis", start=start, end=end)
         return {
             "status": "success",
             "data": patterns,
@@ -384,13 +541,76 @@ async def get_retry_pattern_analysis():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to analyze retry patterns: {str(e)}")
 
+@app.get("/analytics/retry-chains")
+async def get_retry_chain_analysis(
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
+    """
+    Retry outcomes of linked attempt chains: eventual success, time-to-success and per-attempt success probability
+    """
+    start, end = _time_window(from_, to)
+    try:
+        analysis = await data_loader.get_analytics("get_retry_chain_analysis", start=start, end=end)
+        return {
+            "status": "success",
+            "data": analysis,
+            "message": f"Analyzed {analysis.get('chains', 0)} retry chains"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to analyze retry chains: {str(e)}")
+
+@app.get("/analytics/approximate/failures")
+async def get_approximate_failure_analysis(
+    sample_size: int = Query(10000, ge=100, le=100000, description="Rows to $sample"),
+    confidence: float = Query(0.95, gt=0, lt=1, description="Confidence level of the intervals"),
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
+    """
+    Estimate failure rate, failure-type mix and amounts from a sample, with confidence intervals
+    """
+    start, end = _time_window(from_, to)
+    try:
+        estimate = await advanced_queries.get_approximate_failure_analysis(
+            sample_size=sample_size, confidence=confidence, start=start, end=end
+        )
+        return {
+            "status": "success",
+            "data": estimate,
+            "message": f"Estimated failure analysis from {estimate.get('sample_size', 0)} sampled transactions"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to estimate failure analysis: {str(e)}")
+
+@app.get("/analytics/approximate/banks")
+async def get_approximate_bank_distributions(
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
+    """
+    Distinct VPAs and amount percentiles per bank from HyperLogLog and t-digest rollup sketches
+    """
+    start, end = _time_window(from_, to)
+    try:
+        distributions = await advanced_queries.get_approximate_bank_distributions(start=start, end=end)
+        return {
+            "status": "success",
+            "data": distributions,
+            "message": f"Estimated distributions for {len(distributions.get('banks', []))} banks"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to estimate bank distributions: {str(e)}")
+
 @app.get("/dashboard/realtime")
-async def get_realtime_dashboard_data():
+async def get_realtime_dashboard_data(
+    since: Optional[datetime] = Query(None, description="Return changes since this timestamp (the previous response's as_of)")
+):
     """
     Get comprehensive real-time dashboard data - Optimized MongoDB queries
     """
     try:
-        dashboard_data = await advanced_queries.get_real_time_dashboard_data()
+        dashboard_data = await data_loader.get_analytics("get_real_time_dashboard_data", since=since)
         return {
             "status": "success",
             "data": dashboard_data,
@@ -439,29 +659,39 @@ async def advanced_search_transactions(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Advanced search failed: {str(e)}")
 
+@app.get("/analytics/archive/{name}")
+async def get_archive_analytics(
+    name: str,
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
+    """
+    Run an analytics query on transactions archived to Parquet files
+    """
+    if name not in EXPORTABLE_ANALYTICS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown analytics '{name}'; available: {', '.join(sorted(EXPORTABLE_ANALYTICS))}"
+        )
+    start, end = _time_window(from_, to)
+    try:
+        rows = await tiering_manager.query_archive(EXPORTABLE_ANALYTICS[name], start=start, end=end) or []
+        return {
+            "status": "success",
+            "data": rows,
+            "message": f"Retrieved {len(rows)} {name} rows from the Parquet archive"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to analyze archived transactions: {str(e)}")
+
 @app.get("/analytics/live-metrics")
 async def get_live_metrics():
     """
     Get live system metrics - Ultra-fast MongoDB queries for monitoring
     """
     try:
-        # Quick aggregation for live metrics
-        pipeline = [
-            {
-                "$group": {
-                    "_id": None,
-                    "total_transactions": {"$sum": 1},
-                    "active_failures": {
-                        "$sum": {"$cond": [{"$eq": ["$status", "failed"]}, 1, 0]}
-                    },
-                    "total_volume": {"$sum": "$amount"},
-                    "avg_transaction_value": {"$avg": "$amount"}
-                }
-            }
-        ]
-        
-        result = await mongodb.transactions_collection.aggregate(pipeline).to_list(1)
-        metrics = result[0] if result else {}
+        # Closed buckets come from rollups, only the open hour is scanned raw
+        metrics = await data_loader.get_analytics("get_live_metrics")
         
         # Add real-time timestamp
         metrics["timestamp"] = datetime.utcnow().isoformat()
@@ -475,6 +705,160 @@ async def get_live_metrics():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get live metrics: {str(e)}")
 
+@app.get("/analytics/anomalies")
+async def get_failure_anomalies(include_baselines: bool = Query(False, description="Also return every bank/error-code baseline")):
+    """
+    Open failure-rate anomaly alerts per bank and error code from the streaming detector
+    """
+    status = anomaly_monitor.status()
+    if include_baselines:
+        status["baselines"] = anomaly_monitor.detector.baselines()
+    return {
+        "status": "success",
+        "data": status,
+        "message": f"{len(status['alerts'])} open failure-rate anomalies"
+    }
+
+# Export Endpoints - streamed chunk by chunk from a MongoDB cursor or the fallback snapshot
+def _export_response(name: str, chunks, export_format: str, gzip: bool, columns=None, types=None) -> StreamingResponse:
+    if gzip and export_format == "parquet":
+        raise HTTPException(status_code=400, detail="Parquet exports are already compressed; gzip applies to ndjson and csv")
+    try:
+        encoder = make_encoder(export_format, columns, types)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    media_type, extension = EXPORT_FORMATS[export_format]
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.{extension}"
+    if gzip:
+        media_type = "application/gzip"
+        filename += ".gz"
+    return StreamingResponse(
+        encode_stream(chunks, encoder, gzip=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/export/transactions")
+async def export_transactions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv|parquet)$", description="ndjson, csv or parquet"),
+    gzip: bool = Query(False, description="gzip-compress the stream (ndjson and csv)"),
+    status: Optional[str] = Query(None, description="Filter by status"),
+    failure_type: Optional[str] = Query(None, description="Filter by failure type"),
+    search: Optional[str] = Query(None, description="Search term for transaction ID, VPA, or failure reason"),
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
+    """
+    Stream every matching transaction, newest first, without buffering the result set
+    """
+    start, end = _time_window(from_, to)
+    chunks = data_loader.iter_transactions(
+        status=status,
+        failure_type=failure_type,
+        search_term=search,
+        start=start,
+        end=end,
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    return _export_response(
+        "transactions", chunks, format, gzip, columns=TRANSACTION_EXPORT_COLUMNS, types=TRANSACTION_EXPORT_TYPES
+    )
+
+@app.get("/export/analytics/{name}")
+async def export_analytics(
+    name: str,
+    format: str = Query("csv", pattern="^(ndjson|csv|parquet)$", description="ndjson, csv or parquet"),
+    gzip: bool = Query(False, description="gzip-compress the stream (ndjson and csv)"),
+    from_: Optional[datetime] = Query(None, alias="from", description="Window start (inclusive)"),
+    to: Optional[datetime] = Query(None, description="Window end (exclusive)")
+):
+    """
+    Download an analytics result set as a file
+    """
+    if name not in EXPORTABLE_ANALYTICS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown analytics export '{name}'; available: {', '.join(sorted(EXPORTABLE_ANALYTICS))}"
+        )
+    start, end = _time_window(from_, to)
+    try:
+        rows = await data_loader.get_analytics(EXPORTABLE_ANALYTICS[name], start=start, end=end)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to export analytics: {str(e)}")
+    flat_rows = (flatten_row(row) for row in rows)
+    return _export_response(name, row_chunks(flat_rows, EXPORT_CHUNK_SIZE), format, gzip)
+
+@app.websocket("/ws/live")
+async def live_metrics_socket(websocket: WebSocket):
+    """
+    Stream live metric snapshots and per-interval deltas instead of polling
+    """
+    await websocket.accept()
+    queue = live_feed.subscribe()
+    try:
+        while True:
+            await websocket.send_json(await queue.get())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        live_feed.unsubscribe(queue)
+
+@app.post("/analytics/rollups/rebuild")
+async def rebuild_analytics_rollups(full: bool = Query(False, description="Recompute every bucket from raw data")):
+    """
+    Roll up closed time buckets now instead of waiting for the background job
+    """
+    if not data_loader.mongodb_connected:
+        raise HTTPException(status_code=503, detail="MongoDB is not available")
+    try:
+        ranges = await rollup_manager.refresh(full=full)
+        watermark = await rollup_manager.get_watermark()
+        return {
+            "status": "success",
+            "ranges_rebuilt": ranges,
+            "rolled_up_until": watermark.isoformat() if watermark else None,
+            "message": f"Rebuilt {ranges} rollup ranges"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild rollups: {str(e)}")
+
+@app.post("/analytics/pair-matrix/rebuild")
+async def rebuild_pair_matrix():
+    """
+    Recompute the bank/domain pair matrix from the stored transactions
+    """
+    if not data_loader.mongodb_connected:
+        raise HTTPException(status_code=503, detail="MongoDB is not available")
+    try:
+        cells = await pair_matrix.rebuild()
+        return {
+            "status": "success",
+            "cells": cells,
+            "message": f"Rebuilt {cells} daily pair matrix cells"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to rebuild pair matrix: {str(e)}")
+
+@app.post("/analytics/retry-chains/rebuild")
+async def rebuild_retry_chains(full: bool = Query(False, description="Relink every chain from raw data")):
+    """
+    Link retry chains in newly closed hours now instead of waiting for the background job
+    """
+    if not data_loader.mongodb_connected:
+        raise HTTPException(status_code=503, detail="MongoDB is not available")
+    try:
+        linked = await retry_chain_engine.refresh(full=full)
+        watermark = await retry_chain_engine.get_watermark()
+        return {
+            "status": "success",
+            "chains_linked": linked,
+            "linked_until": watermark.isoformat() if watermark else None,
+            "message": f"Linked {linked} retry chains"
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to link retry chains: {str(e)}")
+
 # Voice Feature Endpoints
 @app.post("/voice/upload-audio")
 async def upload_audio_for_transcription(
@@ -28,6 +28,22 @@ class Transaction(BaseModel):
     retry_count: int = Field(0, description="Number of retry attempts")
     metadata: Optional[Dict[str, Any]] = Field(default_factory=dict, description="Additional transaction metadata")
 
+_TRANSACTION_FIELDS_SET = frozenset(Transaction.model_fields)
+_new_transaction = Transaction.__new__
+_set_attribute = object.__setattr__
+
+def construct_transaction(values: Dict[str, Any]) -> Transaction:
+    """Build a Transaction from already-validated values holding every field (no validation)
+
+    Cheaper than Transaction.model_construct, which re-applies defaults per call.
+    """
+    transaction = _new_transaction(Transaction)
+    _set_attribute(transaction, "__dict__", values)
+    _set_attribute(transaction, "__pydantic_fields_set__", set(_TRANSACTION_FIELDS_SET))
+    _set_attribute(transaction, "__pydantic_extra__", None)
+    _set_attribute(transaction, "__pydantic_private__", None)
+    return transaction
+
 class DiagnosisResponse(BaseModel):
     transaction_id: str
     failure_type: FailureType
@@ -0,0 +1,303 @@
+"""
+Compact columnar storage for large in-memory transaction caches
+Holds rows as typed arrays with pooled strings and materializes Transaction objects on demand
+"""
+
+import json
+from array import array
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+from models.transaction import Transaction, FailureType, construct_transaction
+
+_EPOCH = datetime(1970, 1, 1)
+_ONE_MICROSECOND = timedelta(microseconds=1)
+
+# FailureType <-> small integer codes, 255 marks "no failure type"
+FAILURE_TYPES: List[FailureType] = list(FailureType)
+FAILURE_TYPE_CODES: Dict[FailureType, int] = {ft: code for code, ft in enumerate(FAILURE_TYPES)}
+NO_FAILURE_TYPE = 255
+
+
+def timestamp_to_micros(timestamp: datetime) -> int:
+    """Convert a datetime to microseconds since the epoch (aware values are normalized to naive UTC)"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return (timestamp - _EPOCH) // _ONE_MICROSECOND
+
+
+def micros_to_timestamp(micros: int) -> datetime:
+    """Convert microseconds since the epoch back to a naive datetime"""
+    return _EPOCH + timedelta(microseconds=micros)
+
+
+class StringPool:
+    """Interns repeated strings and hands out compact integer codes (code 0 is None)"""
+
+    __slots__ = ("_codes", "values")
+
+    def __init__(self):
+        self._codes: Dict[Optional[str], int] = {None: 0}
+        self.values: List[Optional[str]] = [None]
+
+    def encode(self, value: Optional[str]) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def decode(self, code: int) -> Optional[str]:
+        return self.values[code]
+
+    def code_of(self, value: Optional[str]) -> Optional[int]:
+        """Look up the code of a value without interning it"""
+        return self._codes.get(value)
+
+    def codes_matching(self, needle: str) -> set:
+        """Codes of every pooled string containing needle (case-insensitive)"""
+        needle = needle.lower()
+        return {
+            code for code, value in enumerate(self.values)
+            if value is not None and needle in value.lower()
+        }
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class TransactionStore:
+    """Struct-of-arrays container for transactions used for bulk in-memory storage"""
+
+    def __init__(self, transactions: Optional[Iterable[Transaction]] = None):
+        self.transaction_ids: List[str] = []
+        # Transaction ID -> row of its first occurrence, for by-ID lookups
+        self._rows_by_id: Dict[str, int] = {}
+        self.timestamps = array("q")
+        self.amounts = array("d")
+        self.sender_vpas = array("I")
+        self.receiver_vpas = array("I")
+        self.sender_banks = array("I")
+        self.receiver_banks = array("I")
+        self.statuses = array("I")
+        self.failure_reasons = array("I")
+        self.failure_types = array("B")
+        self.error_codes = array("I")
+        self.retry_counts = array("I")
+        self.metadata = array("I")
+
+        # Shared pools: VPAs and banks repeat heavily across sender/receiver
+        self.vpa_pool = StringPool()
+        self.bank_pool = StringPool()
+        self.status_pool = StringPool()
+        self.reason_pool = StringPool()
+        self.error_code_pool = StringPool()
+        self.metadata_pool = StringPool()
+
+        if transactions is not None:
+            self.extend(transactions)
+
+    @classmethod
+    def from_transactions(cls, transactions: Iterable[Transaction]) -> "TransactionStore":
+        return cls(transactions)
+
+    def append(self, transaction: Transaction) -> None:
+        """Append a transaction, copying its fields into the column arrays"""
+        self._rows_by_id.setdefault(transaction.transaction_id, len(self.transaction_ids))
+        self.transaction_ids.append(transaction.transaction_id)
+        self.timestamps.append(timestamp_to_micros(transaction.timestamp))
+        self.amounts.append(transaction.amount)
+        self.sender_vpas.append(self.vpa_pool.encode(transaction.sender_vpa))
+        self.receiver_vpas.append(self.vpa_pool.encode(transaction.receiver_vpa))
+        self.sender_banks.append(self.bank_pool.encode(transaction.sender_bank))
+        self.receiver_banks.append(self.bank_pool.encode(transaction.receiver_bank))
+        self.statuses.append(self.status_pool.encode(transaction.status))
+        self.failure_reasons.append(self.reason_pool.encode(transaction.failure_reason))
+        self.failure_types.append(
+            FAILURE_TYPE_CODES[transaction.failure_type] if transaction.failure_type else NO_FAILURE_TYPE
+        )
+        self.error_codes.append(self.error_code_pool.encode(transaction.error_code))
+        self.retry_counts.append(transaction.retry_count)
+        self.metadata.append(self.metadata_pool.encode(
+            json.dumps(transaction.metadata, sort_keys=True, default=str) if transaction.metadata else None
+        ))
+
+    def extend(self, transactions: Iterable[Transaction]) -> None:
+        for transaction in transactions:
+            self.append(transaction)
+
+    def extend_columns(self, columns: Dict[str, List[Any]]) -> None:
+        """Append rows given as field columns, without building Transaction objects
+
+        failure_type values may be FailureType members or their values; metadata values may be
+        dicts or JSON text as the store keeps it.
+        """
+        if not columns:
+            return
+        vpa, bank = self.vpa_pool.encode, self.bank_pool.encode
+        rows_by_id = self._rows_by_id
+        for row, transaction_id in enumerate(columns["transaction_id"], start=len(self.transaction_ids)):
+            rows_by_id.setdefault(transaction_id, row)
+        self.transaction_ids.extend(columns["transaction_id"])
+        self.timestamps.extend(map(timestamp_to_micros, columns["timestamp"]))
+        self.amounts.extend(columns["amount"])
+        self.sender_vpas.extend(map(vpa, columns["sender_vpa"]))
+        self.receiver_vpas.extend(map(vpa, columns["receiver_vpa"]))
+        self.sender_banks.extend(map(bank, columns["sender_bank"]))
+        self.receiver_banks.extend(map(bank, columns["receiver_bank"]))
+        self.statuses.extend(map(self.status_pool.encode, columns["status"]))
+        self.failure_reasons.extend(map(self.reason_pool.encode, columns["failure_reason"]))
+        self.failure_types.extend(
+            FAILURE_TYPE_CODES[FailureType(value)] if value else NO_FAILURE_TYPE
+            for value in columns["failure_type"]
+        )
+        self.error_codes.extend(map(self.error_code_pool.encode, columns["error_code"]))
+        self.retry_counts.extend(columns["retry_count"])
+        self.metadata.extend(
+            self.metadata_pool.encode(
+                value if value is None or isinstance(value, str)
+                else json.dumps(value, sort_keys=True, default=str) if value else None
+            )
+            for value in columns["metadata"]
+        )
+
+    def get(self, index: int) -> Transaction:
+        """Materialize the row at index as a Transaction (API boundary conversion)"""
+        failure_type_code = self.failure_types[index]
+        metadata_json = self.metadata_pool.decode(self.metadata[index])
+        # Values were validated when the row was appended, so skip re-validation
+        return construct_transaction({
+            "transaction_id": self.transaction_ids[index],
+            "timestamp": micros_to_timestamp(self.timestamps[index]),
+            "amount": self.amounts[index],
+            "sender_vpa": self.vpa_pool.decode(self.sender_vpas[index]),
+            "receiver_vpa": self.vpa_pool.decode(self.receiver_vpas[index]),
+            "sender_bank": self.bank_pool.decode(self.sender_banks[index]),
+            "receiver_bank": self.bank_pool.decode(self.receiver_banks[index]),
+            "status": self.status_pool.decode(self.statuses[index]),
+            "failure_reason": self.reason_pool.decode(self.failure_reasons[index]),
+            "failure_type": None if failure_type_code == NO_FAILURE_TYPE else FAILURE_TYPES[failure_type_code],
+            "error_code": self.error_code_pool.decode(self.error_codes[index]),
+            "retry_count": self.retry_counts[index],
+            "metadata": json.loads(metadata_json) if metadata_json else {}
+        })
+
+    def __len__(self) -> int:
+        return len(self.transaction_ids)
+
+    def __iter__(self) -> Iterator[Transaction]:
+        for index in range(len(self)):
+            yield self.get(index)
+
+    def __getitem__(self, key: Union[int, slice]) -> Union[Transaction, List[Transaction]]:
+        if isinstance(key, slice):
+            return [self.get(index) for index in range(*key.indices(len(self)))]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("transaction index out of range")
+        return self.get(key)
+
+    def find(self, transaction_id: str) -> Optional[int]:
+        """Row index of a transaction ID, or None"""
+        return self._rows_by_id.get(transaction_id)
+
+    def select(
+        self,
+        failure_type: Optional[str] = None,
+        status: Optional[str] = None,
+        search_term: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None
+    ) -> List[int]:
+        """Row indices matching the filters, evaluated on codes rather than materialized rows
+
+        start is inclusive and end exclusive.
+        """
+        indices: Iterable[int] = range(len(self))
+
+        if start is not None or end is not None:
+            lo = timestamp_to_micros(start) if start is not None else None
+            hi = timestamp_to_micros(end) if end is not None else None
+            timestamps = self.timestamps
+            indices = [
+                i for i in indices
+                if (lo is None or timestamps[i] >= lo) and (hi is None or timestamps[i] < hi)
+            ]
+
+        if failure_type:
+            try:
+                code = FAILURE_TYPE_CODES[FailureType(failure_type)]
+            except ValueError:
+                return []
+            failure_types = self.failure_types
+            indices = [i for i in indices if failure_types[i] == code]
+
+        if status:
+            code = self.status_pool.code_of(status)
+            if code is None:
+                return []
+            statuses = self.statuses
+            indices = [i for i in indices if statuses[i] == code]
+
+        if search_term:
+            search_lower = search_term.lower()
+            # Match each distinct pooled string once instead of once per row
+            vpa_codes = self.vpa_pool.codes_matching(search_lower)
+            reason_codes = self.reason_pool.codes_matching(search_lower)
+            ids, senders, receivers, reasons = (
+                self.transaction_ids, self.sender_vpas, self.receiver_vpas, self.failure_reasons
+            )
+            indices = [
+                i for i in indices
+                if (search_lower in ids[i].lower() or
+                    senders[i] in vpa_codes or
+                    receivers[i] in vpa_codes or
+                    reasons[i] in reason_codes)
+            ]
+
+        return list(indices)
+
+    def status_counts(self) -> Dict[str, int]:
+        counts = Counter(self.statuses)
+        return {self.status_pool.decode(code): count for code, count in counts.items()}
+
+    def failure_type_counts(self) -> Dict[str, int]:
+        counts = Counter(self.failure_types)
+        counts.pop(NO_FAILURE_TYPE, None)
+        return {FAILURE_TYPES[code].value: count for code, count in counts.items()}
+
+    def total_amount(self) -> float:
+        return sum(self.amounts)
+
+    def timestamp_range(self) -> Optional[tuple]:
+        """(earliest, latest) timestamps, or None when empty"""
+        if not self.timestamps:
+            return None
+        return micros_to_timestamp(min(self.timestamps)), micros_to_timestamp(max(self.timestamps))
+
+    def indices_by_timestamp(self) -> List[int]:
+        """Row indices ordered by timestamp (for replay)"""
+        timestamps = self.timestamps
+        return sorted(range(len(self)), key=timestamps.__getitem__)
+
+    def column_dict(self) -> Dict[str, Any]:
+        """Decoded columns as plain lists, suitable for building a DataFrame"""
+        vpas, banks = self.vpa_pool.values, self.bank_pool.values
+        return {
+            "transaction_id": list(self.transaction_ids),
+            "timestamp": [micros_to_timestamp(v) for v in self.timestamps],
+            "amount": list(self.amounts),
+            "sender_vpa": [vpas[c] for c in self.sender_vpas],
+            "receiver_vpa": [vpas[c] for c in self.receiver_vpas],
+            "sender_bank": [banks[c] for c in self.sender_banks],
+            "receiver_bank": [banks[c] for c in self.receiver_banks],
+            "status": [self.status_pool.values[c] for c in self.statuses],
+            "failure_reason": [self.reason_pool.values[c] for c in self.failure_reasons],
+            "failure_type": [
+                None if c == NO_FAILURE_TYPE else FAILURE_TYPES[c].value for c in self.failure_types
+            ],
+            "error_code": [self.error_code_pool.values[c] for c in self.error_codes],
+            "retry_count": list(self.retry_counts),
+        }
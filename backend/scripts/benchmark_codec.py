@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: shared Transaction <-> document codec vs the previous hand-written mapping
+Usage: python scripts/benchmark_codec.py --rows 100000
+"""
+
+import argparse
+import gc
+import sys
+import os
+import time
+from datetime import datetime
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.transaction import Transaction, FailureType
+from database.codec import encode_transactions, decode_documents, DOCUMENT_PROJECTION
+from scripts.benchmark_transaction_memory import generate_transactions
+
+
+def legacy_encode(transaction: Transaction) -> dict:
+    return {
+        "transaction_id": transaction.transaction_id,
+        "timestamp": transaction.timestamp,
+        "amount": transaction.amount,
+        "sender_vpa": transaction.sender_vpa,
+        "receiver_vpa": transaction.receiver_vpa,
+        "sender_bank": transaction.sender_bank,
+        "receiver_bank": transaction.receiver_bank,
+        "status": transaction.status,
+        "failure_reason": transaction.failure_reason,
+        "failure_type": transaction.failure_type.value if transaction.failure_type else None,
+        "error_code": transaction.error_code,
+        "retry_count": transaction.retry_count,
+        "metadata": transaction.metadata,
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    }
+
+
+def legacy_decode(doc: dict) -> Transaction:
+    return Transaction(
+        transaction_id=doc['transaction_id'],
+        timestamp=doc['timestamp'],
+        amount=doc['amount'],
+        sender_vpa=doc['sender_vpa'],
+        receiver_vpa=doc['receiver_vpa'],
+        sender_bank=doc['sender_bank'],
+        receiver_bank=doc['receiver_bank'],
+        status=doc['status'],
+        failure_reason=doc.get('failure_reason'),
+        failure_type=FailureType(doc['failure_type']) if doc.get('failure_type') else None,
+        error_code=doc.get('error_code'),
+        retry_count=doc.get('retry_count', 0),
+        metadata=doc.get('metadata', {})
+    )
+
+
+def timed(label: str, rows: int, func):
+    # Like timeit, keep the cyclic GC out of the measurement
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+    finally:
+        gc.enable()
+    print(f"{label:<34} {elapsed * 1000:9.1f} ms  {rows / elapsed:12,.0f} rows/s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=50_000, help="Number of synthetic transactions")
+    args = parser.parse_args()
+
+    transactions = list(generate_transactions(args.rows))
+    print(f"🧪 Codec micro-benchmark over {args.rows:,} transactions")
+    print("=" * 60)
+
+    legacy_docs, legacy_encode_time = timed("encode (hand-written)", args.rows, lambda: [legacy_encode(t) for t in transactions])
+    docs, encode_time = timed("encode (codec)", args.rows, lambda: encode_transactions(transactions))
+
+    stored = [{key: doc[key] for key in DOCUMENT_PROJECTION if key != "_id"} for doc in docs]
+    _, legacy_decode_time = timed("decode (hand-written)", args.rows, lambda: [legacy_decode(d) for d in legacy_docs])
+    decoded, decode_time = timed("decode (codec)", args.rows, lambda: decode_documents(stored))
+
+    assert [t.model_dump() for t in decoded[:100]] == [t.model_dump() for t in transactions[:100]]
+
+    print(f"Encode speedup: {legacy_encode_time / encode_time:.1f}x")
+    print(f"Decode speedup: {legacy_decode_time / decode_time:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
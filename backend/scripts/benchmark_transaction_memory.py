@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Memory benchmark: list of pydantic Transaction objects vs compact TransactionStore
+Usage: python scripts/benchmark_transaction_memory.py --rows 200000
+"""
+
+import argparse
+import gc
+import random
+import sys
+import os
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.transaction import Transaction, FailureType
+from models.transaction_store import TransactionStore
+
+BANKS = ["HDFC", "ICICI", "SBI", "AXIS", "KOTAK", "PNB", "BOB", "CANARA"]
+VPA_DOMAINS = ["paytm", "phonepe", "gpay", "amazonpay", "mobikwik"]
+FAILURES = [
+    (FailureType.INSUFFICIENT_FUNDS, "Insufficient balance in account", "E001"),
+    (FailureType.INVALID_VPA, "Invalid VPA provided", "E002"),
+    (FailureType.NETWORK_ISSUE, "Network timeout occurred", "E003"),
+    (FailureType.BANK_SERVER_ERROR, "Bank server temporarily unavailable", "E004"),
+]
+
+
+def generate_transactions(rows: int):
+    """Yield synthetic transactions shaped like the DataLoader's synthetic data"""
+    rng = random.Random(42)
+    now = datetime.now()
+    for i in range(rows):
+        failure = rng.choice(FAILURES) if rng.random() < 0.3 else None
+        yield Transaction(
+            transaction_id=f"TXN{str(i + 1).zfill(8)}",
+            timestamp=now - timedelta(seconds=rng.randint(0, 30 * 86400)),
+            amount=round(rng.uniform(10, 50000), 2),
+            sender_vpa=f"user{rng.randint(1000, 99999)}@{rng.choice(VPA_DOMAINS)}",
+            receiver_vpa=f"merchant{rng.randint(100, 999)}@{rng.choice(VPA_DOMAINS)}",
+            sender_bank=rng.choice(BANKS),
+            receiver_bank=rng.choice(BANKS),
+            status="failed" if failure else "success",
+            failure_reason=failure[1] if failure else None,
+            failure_type=failure[0] if failure else None,
+            error_code=failure[2] if failure else None,
+            retry_count=rng.randint(0, 3) if failure else 0,
+            metadata={"device": "mobile", "app_version": "1.2.3"}
+        )
+
+
+def measure(build):
+    """Return (container, bytes allocated, seconds) for building a container"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    container = build()
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return container, current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000, help="Number of synthetic transactions")
+    args = parser.parse_args()
+
+    print(f"🧪 Benchmarking memory for {args.rows:,} transactions")
+    print("=" * 60)
+
+    objects, object_bytes, object_time = measure(lambda: list(generate_transactions(args.rows)))
+    del objects
+
+    store, store_bytes, store_time = measure(lambda: TransactionStore(generate_transactions(args.rows)))
+
+    started = time.perf_counter()
+    page = store[:100]
+    page_time = time.perf_counter() - started
+
+    print(f"List[Transaction]:  {object_bytes / 1e6:10.1f} MB  ({object_bytes / args.rows:7.1f} B/row)  built in {object_time:.2f}s")
+    print(f"TransactionStore:   {store_bytes / 1e6:10.1f} MB  ({store_bytes / args.rows:7.1f} B/row)  built in {store_time:.2f}s")
+    print(f"Reduction:          {object_bytes / max(store_bytes, 1):10.1f}x")
+    print(f"Materialize 100 rows at the API boundary: {page_time * 1000:.2f} ms ({len(page)} rows)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
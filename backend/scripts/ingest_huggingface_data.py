@@ -2,8 +2,10 @@
 """
 Standalone script to ingest Hugging Face UPI transaction dataset
 Run this script to load real-world data into your MongoDB database
+Usage: python scripts/ingest_huggingface_data.py [--stream [--chunk-size 5000] [--workers 4] [--restart]]
 """
 
+import argparse
 import asyncio
 import sys
 import os
@@ -15,6 +17,39 @@ from data_ingestion.huggingface_loader import HuggingFaceDataLoader
 from database.mongodb import mongodb
 from dotenv import load_dotenv
 
+async def stream_ingest(args) -> int:
+    """Load, map and write the dataset chunk by chunk, resuming from the last checkpoint"""
+    print("🚀 Starting streaming Hugging Face ingestion")
+    print("=" * 60)
+    load_dotenv()
+    loader = HuggingFaceDataLoader()
+    
+    try:
+        print("\n🔌 Connecting to MongoDB...")
+        if not await mongodb.connect():
+            print("⚠️ MongoDB unavailable, transactions will be buffered in the write journal")
+        
+        def report(state):
+            total = f"/{state['total_records']:,}" if state.get("total_records") else ""
+            print(f"📦 record {state['offset']:,}{total}: {state['ingested']:,} ingested", end="\r", flush=True)
+        
+        state = await loader.ingest_streaming(
+            chunk_size=args.chunk_size, resume=not args.restart, progress=report,
+            workers=args.workers, seed=args.seed
+        )
+        print(f"\n✅ Ingested {state['ingested']:,} of {state['processed']:,} processed transactions")
+        print(f"💾 Checkpoint: {loader.checkpoint.path}")
+        return 0
+    except KeyboardInterrupt:
+        print(f"\n⚠️ Interrupted; rerun with --stream to resume from {loader.checkpoint.path}")
+        return 1
+    except Exception as e:
+        print(f"\n❌ Error during streaming ingestion: {e}")
+        return 1
+    finally:
+        if mongodb.client:
+            await mongodb.disconnect()
+
 async def main():
     """Main ingestion process"""
     print("🚀 Starting Hugging Face Dataset Ingestion Process")
@@ -131,5 +166,12 @@ async def main():
             await mongodb.disconnect()
 
 if __name__ == "__main__":
-    exit_code = asyncio.run(main())
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stream", action="store_true", help="Stream the dataset in chunks instead of loading it into memory")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Records per chunk (default: HF_INGEST_CHUNK_SIZE or 5000)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the first record")
+    parser.add_argument("--workers", type=int, default=None, help="Processes mapping chunks in parallel (default: HF_INGEST_WORKERS or 1)")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for generated fields, for reproducible runs (default: random)")
+    args = parser.parse_args()
+    exit_code = asyncio.run(stream_ingest(args) if args.stream else main())
     sys.exit(exit_code)
\ No newline at end of file
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Run the platform analytics offline over a CSV/Parquet file or a Parquet archive directory
+Usage: python scripts/local_analytics.py data/archive --analytics bank_performance retry_patterns
+"""
+
+import argparse
+import json
+import sys
+import os
+import time
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.local_analytics import LocalAnalytics
+
+ANALYTICS = {
+    "failure_patterns": "get_failure_patterns_by_time",
+    "bank_performance": "get_bank_performance_metrics",
+    "vpa_domains": "get_vpa_domain_analysis",
+    "amount_based_failures": "get_amount_based_failure_analysis",
+    "retry_patterns": "get_retry_pattern_analysis",
+    "live_metrics": "get_live_metrics",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("source", nargs="?", default=os.path.join("data", "upi_transactions.csv"),
+                        help="CSV file, Parquet file or directory of Parquet files")
+    parser.add_argument("--analytics", nargs="+", choices=sorted(ANALYTICS), default=sorted(ANALYTICS),
+                        help="Analytics to run (default: all)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    engine = LocalAnalytics.from_path(args.source)
+    print(f"📂 Loaded {len(engine.frame):,} transactions from {args.source} in {time.perf_counter() - started:.2f}s",
+          file=sys.stderr)
+
+    results = {}
+    for name in args.analytics:
+        started = time.perf_counter()
+        results[name] = getattr(engine, ANALYTICS[name])()
+        print(f"📊 {name}: {(time.perf_counter() - started) * 1000:.1f} ms", file=sys.stderr)
+
+    json.dump(results, sys.stdout, indent=2, default=str)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Apply pending MongoDB migrations, show which ones have been applied and run data backfills
+Usage: python scripts/migrate.py [--backfill] [--batch-size 5000]
+"""
+
+import argparse
+import asyncio
+import sys
+import os
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.mongodb import mongodb
+from database.migrations import backfill_vpa_domains, migration_status
+from dotenv import load_dotenv
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backfill", action="store_true", help="Store VPA domains on rows ingested before they were stored")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows updated per backfill batch")
+    args = parser.parse_args()
+    load_dotenv()
+
+    # Connecting applies any pending migrations
+    if not await mongodb.connect():
+        print("❌ Could not connect to MongoDB")
+        return 1
+
+    try:
+        print("🛠️ MongoDB migrations")
+        print("=" * 60)
+        for migration in await migration_status(mongodb):
+            state = f"applied {migration['applied_at']}" if migration["applied_at"] else "pending"
+            print(f"{migration['id']:<28} {state}")
+            print(f"    {migration['description']}")
+
+        if args.backfill:
+            print(f"🔄 Backfilling VPA domains in batches of {args.batch_size}...")
+            updated = await backfill_vpa_domains(mongodb, args.batch_size)
+            print(f"✅ Backfilled {updated} rows")
+            if updated:
+                print("   Rebuild the pair matrix with POST /analytics/pair-matrix/rebuild")
+        return 0
+    finally:
+        await mongodb.disconnect()
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
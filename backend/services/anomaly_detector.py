@@ -0,0 +1,344 @@
+"""
+Online failure-rate anomaly detection over the transaction stream
+Per-bank and per-error-code EWMA baselines with CUSUM change detection, O(1) work per event
+"""
+
+import os
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from services.live_feed import live_feed
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+# Keeps z-scores finite while a baseline failure rate is (close to) 0 or 1
+VARIANCE_FLOOR = 1e-4
+
+
+class _Baseline:
+    """Detector state for one bank or error code"""
+
+    __slots__ = (
+        "dimension", "key", "mean", "observations", "cusum", "calm",
+        "carry_events", "carry_failures", "window", "window_events", "window_failures", "alert"
+    )
+
+    def __init__(self, dimension: str, key: Any):
+        self.dimension = dimension
+        self.key = key
+        self.mean = 0.0
+        self.observations = 0
+        self.cusum = 0.0
+        self.calm = 0
+        # Buckets with too few events are carried into the next evaluation
+        self.carry_events = 0
+        self.carry_failures = 0
+        # (events, failures) per bucket of the sliding window, with running sums
+        self.window: Deque[Tuple[int, int]] = deque()
+        self.window_events = 0
+        self.window_failures = 0
+        self.alert: Optional[Dict[str, Any]] = None
+
+
+class AnomalyDetector:
+    """Failure-rate spike detector fed one event at a time, in event-time order
+
+    Events are counted into fixed time buckets; only closing a bucket (once per
+    bucket_seconds of event time) touches every key. Per-bank rates are failures over
+    that bank's transactions; per-error-code rates are that code's share of all
+    transactions. An alert opens when the CUSUM of standardized deviations from the
+    EWMA baseline exceeds cusum_h, or a single observation exceeds z_limit, and
+    resolves after clear_buckets observations back near the baseline.
+    """
+
+    def __init__(
+        self,
+        bucket_seconds: float = 60,
+        window_buckets: int = 5,
+        alpha: float = 0.05,
+        cusum_k: float = 1.0,
+        cusum_h: float = 6.0,
+        z_limit: float = 6.0,
+        min_events: int = 20,
+        warmup: int = 10,
+        clear_buckets: int = 3,
+        on_alert: Optional[Callable[[Dict[str, Any]], None]] = None,
+        history_size: int = 100
+    ):
+        self.bucket_delta = timedelta(seconds=bucket_seconds)
+        self.window_buckets = window_buckets
+        self.alpha = alpha
+        self.cusum_k = cusum_k
+        self.cusum_h = cusum_h
+        self.z_limit = z_limit
+        self.min_events = min_events
+        self.warmup = warmup
+        self.clear_buckets = clear_buckets
+        self.on_alert = on_alert
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=history_size)
+        self.events_processed = 0
+        self.buckets_closed = 0
+        self._bucket: Optional[int] = None
+        self._bucket_events = 0
+        # Latest event timestamp and the monotonic clock when an event last arrived
+        self._latest: Optional[datetime] = None
+        self._arrived_at = 0.0
+        self._bank_counts: Dict[Any, List[int]] = {}
+        self._code_counts: Dict[Any, int] = {}
+        self._states: Dict[Tuple[str, Any], _Baseline] = {}
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "AnomalyDetector":
+        return cls(
+            bucket_seconds=float(os.getenv("ANOMALY_BUCKET_SECONDS", "60")),
+            window_buckets=int(os.getenv("ANOMALY_WINDOW_BUCKETS", "5")),
+            alpha=float(os.getenv("ANOMALY_EWMA_ALPHA", "0.05")),
+            cusum_k=float(os.getenv("ANOMALY_CUSUM_K", "1")),
+            cusum_h=float(os.getenv("ANOMALY_CUSUM_H", "6")),
+            z_limit=float(os.getenv("ANOMALY_Z_LIMIT", "6")),
+            min_events=int(os.getenv("ANOMALY_MIN_EVENTS", "20")),
+            warmup=int(os.getenv("ANOMALY_WARMUP_BUCKETS", "10")),
+            clear_buckets=int(os.getenv("ANOMALY_CLEAR_BUCKETS", "3")),
+            **kwargs
+        )
+
+    def observe(self, timestamp: datetime, bank: Any, failed: bool, error_code: Any = None):
+        """Count one transaction; timestamps should be (roughly) increasing"""
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        bucket = (timestamp - EPOCH) // self.bucket_delta
+        if bucket != self._bucket:
+            if self._bucket is None:
+                self._bucket = bucket
+            elif bucket > self._bucket:
+                self._close(bucket)
+            # Late events fold into the open bucket
+
+        if self._latest is None or timestamp > self._latest:
+            self._latest = timestamp
+        self._arrived_at = time.monotonic()
+
+        self.events_processed += 1
+        self._bucket_events += 1
+        counts = self._bank_counts.get(bank)
+        if counts is None:
+            counts = self._bank_counts[bank] = [0, 0]
+        counts[0] += 1
+        if failed:
+            counts[1] += 1
+            if error_code is not None:
+                self._code_counts[error_code] = self._code_counts.get(error_code, 0) + 1
+
+    def observe_event(self, event: Dict[str, Any]):
+        """Live-feed event dict (timestamp, sender_bank, status, error_code or failure_type)"""
+        timestamp = event.get("timestamp")
+        if timestamp is None:
+            return
+        self.observe(
+            timestamp, event.get("sender_bank"), event.get("status") == "failed",
+            event.get("error_code") or event.get("failure_type")
+        )
+
+    def tick(self, now: Optional[float] = None):
+        """Close buckets that ended with no further events (live mode: called on a timer)
+
+        Buckets stay on event time: the clock is the latest event timestamp plus the time
+        since an event last arrived (time.monotonic() unless now is given). Live traffic
+        tracks the wall clock this way, and replays of old or sped-up traffic are not cut short.
+        """
+        if self._bucket is None:
+            return
+        idle = (time.monotonic() if now is None else now) - self._arrived_at
+        bucket = (self._latest + timedelta(seconds=idle) - EPOCH) // self.bucket_delta
+        if bucket > self._bucket:
+            self._close(bucket)
+
+    def _state(self, dimension: str, key: Any) -> _Baseline:
+        state = self._states.get((dimension, key))
+        if state is None:
+            state = self._states[(dimension, key)] = _Baseline(dimension, key)
+        return state
+
+    def _close(self, next_bucket: int):
+        """Evaluate every key on the closing bucket, then advance to next_bucket"""
+        closed_at = EPOCH + self.bucket_delta * (self._bucket + 1)
+        bank_counts, self._bank_counts = self._bank_counts, {}
+        code_counts, self._code_counts = self._code_counts, {}
+        total, self._bucket_events = self._bucket_events, 0
+
+        for bank in bank_counts:
+            self._state("bank", bank)
+        for code in code_counts:
+            self._state("error_code", code)
+        for state in self._states.values():
+            if state.dimension == "bank":
+                events, failures = bank_counts.get(state.key, (0, 0))
+            else:
+                events, failures = total, code_counts.get(state.key, 0)
+            self._evaluate(state, events, failures, closed_at)
+
+        # Buckets skipped without any events only age the sliding windows
+        empty = min(next_bucket - self._bucket - 1, self.window_buckets)
+        if empty > 0:
+            for state in self._states.values():
+                for _ in range(empty):
+                    self._slide(state, 0, 0)
+
+        self._bucket = next_bucket
+        self.buckets_closed += 1
+
+    def _slide(self, state: _Baseline, events: int, failures: int):
+        state.window.append((events, failures))
+        state.window_events += events
+        state.window_failures += failures
+        if len(state.window) > self.window_buckets:
+            old_events, old_failures = state.window.popleft()
+            state.window_events -= old_events
+            state.window_failures -= old_failures
+
+    def _evaluate(self, state: _Baseline, events: int, failures: int, closed_at: datetime):
+        self._slide(state, events, failures)
+        state.carry_events += events
+        state.carry_failures += failures
+        if state.carry_events < self.min_events:
+            return
+        events, failures = state.carry_events, state.carry_failures
+        state.carry_events = state.carry_failures = 0
+        rate = failures / events
+
+        if state.observations < self.warmup:
+            state.mean = rate if state.observations == 0 else state.mean + self.alpha * (rate - state.mean)
+            state.observations += 1
+            return
+        state.observations += 1
+
+        z = (rate - state.mean) / math.sqrt(max(state.mean * (1 - state.mean), VARIANCE_FLOOR) / events)
+        state.cusum = max(0.0, state.cusum + z - self.cusum_k)
+
+        if state.alert is None:
+            if state.cusum > self.cusum_h or z > self.z_limit:
+                state.calm = 0
+                state.alert = {
+                    "dimension": state.dimension,
+                    "key": state.key,
+                    "status": "open",
+                    "opened_at": closed_at.isoformat(),
+                    "baseline_failure_rate": state.mean * 100,
+                    "peak_failure_rate": rate * 100,
+                }
+                self._update_alert(state, rate, z, events, closed_at)
+                logger.warning(
+                    f"🚨 Failure-rate anomaly for {state.dimension} {state.key}: "
+                    f"{rate * 100:.1f}% vs baseline {state.mean * 100:.1f}%"
+                )
+                self._emit(state.alert)
+            else:
+                # The baseline only learns from normal traffic
+                state.mean += self.alpha * (rate - state.mean)
+            return
+
+        self._update_alert(state, rate, z, events, closed_at)
+        state.calm = state.calm + 1 if z < self.cusum_k else 0
+        if state.calm >= self.clear_buckets:
+            alert, state.alert = state.alert, None
+            alert["status"] = "resolved"
+            alert["resolved_at"] = closed_at.isoformat()
+            state.cusum = 0.0
+            state.calm = 0
+            self.history.append(alert)
+            logger.info(f"✅ Failure-rate anomaly resolved for {state.dimension} {state.key}")
+            self._emit(alert)
+
+    def _update_alert(self, state: _Baseline, rate: float, z: float, events: int, closed_at: datetime):
+        alert = state.alert
+        alert["failure_rate"] = rate * 100
+        alert["peak_failure_rate"] = max(alert["peak_failure_rate"], rate * 100)
+        alert["window_failure_rate"] = (
+            state.window_failures / state.window_events * 100 if state.window_events else None
+        )
+        alert["z_score"] = z
+        alert["cusum"] = state.cusum
+        alert["events"] = events
+        alert["updated_at"] = closed_at.isoformat()
+
+    def _emit(self, alert: Dict[str, Any]):
+        if self.on_alert is not None:
+            try:
+                self.on_alert(dict(alert))
+            except Exception as e:
+                logger.error(f"❌ Anomaly alert callback failed: {e}")
+
+    def alerts(self) -> List[Dict[str, Any]]:
+        """Currently open alerts, most severe first"""
+        open_alerts = [dict(state.alert) for state in self._states.values() if state.alert is not None]
+        open_alerts.sort(key=lambda alert: alert["cusum"], reverse=True)
+        return open_alerts
+
+    def baselines(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "dimension": state.dimension,
+                "key": state.key,
+                "baseline_failure_rate": state.mean * 100 if state.observations else None,
+                "window_failure_rate": (
+                    state.window_failures / state.window_events * 100 if state.window_events else None
+                ),
+                "window_events": state.window_events,
+                "cusum": state.cusum,
+                "warming_up": state.observations < self.warmup,
+                "alerting": state.alert is not None
+            }
+            for state in self._states.values()
+        ]
+
+
+class AnomalyMonitor:
+    """Runs a detector on the live transaction feed and pushes alerts to live subscribers"""
+
+    def __init__(self):
+        self.tick_interval = float(os.getenv("ANOMALY_TICK_INTERVAL", "5"))
+        self.detector = AnomalyDetector.from_env(on_alert=self._publish)
+        self._task: Optional[asyncio.Task] = None
+        live_feed.add_event_listener(self.detector.observe_event)
+
+    def _publish(self, alert: Dict[str, Any]):
+        live_feed.publish({"type": "anomaly", "alert": alert, "timestamp": datetime.utcnow().isoformat()})
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._tick_loop())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _tick_loop(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            try:
+                self.detector.tick()
+            except Exception as e:
+                logger.error(f"❌ Error advancing anomaly detector: {e}")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "alerts": self.detector.alerts(),
+            "recent": list(self.detector.history),
+            "events_processed": self.detector.events_processed,
+            "buckets_closed": self.detector.buckets_closed,
+            "bucket_seconds": self.detector.bucket_delta.total_seconds(),
+            "window_buckets": self.detector.window_buckets
+        }
+
+
+# Global anomaly monitor instance
+anomaly_monitor = AnomalyMonitor()
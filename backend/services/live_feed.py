@@ -0,0 +1,263 @@
+"""
+Push-based live metrics for the real-time monitor
+Follows new transactions through a MongoDB change stream (or the in-process write bus) and broadcasts deltas
+"""
+
+import os
+import asyncio
+import logging
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+from pymongo.errors import OperationFailure
+from database.mongodb import mongodb
+from database.advanced_queries import advanced_queries
+from models.transaction import Transaction
+
+logger = logging.getLogger(__name__)
+
+# The resume token can no longer be used: its point has left the oplog, or the stream is invalid
+CHANGE_STREAM_HISTORY_LOST = 286
+CHANGE_STREAM_FATAL = 280
+
+
+class LiveMetrics:
+    """Running totals plus a sliding per-second window, updated in O(1) per event"""
+
+    def __init__(self, window_seconds: int = 60):
+        self.window_seconds = window_seconds
+        self.total = 0
+        self.failed = 0
+        self.volume = 0.0
+        self.failure_types: Counter = Counter()
+        # (second, events, failures) buckets covering the sliding window
+        self._window: deque = deque()
+
+    def seed(self, totals: Dict[str, Any]):
+        self.total = totals.get("total_transactions") or 0
+        self.failed = totals.get("active_failures") or 0
+        self.volume = totals.get("total_volume") or 0.0
+
+    def add(self, event: Dict[str, Any], now: float):
+        failed = event["status"] == "failed"
+        self.total += 1
+        self.volume += event["amount"] or 0.0
+        if failed:
+            self.failed += 1
+            self.failure_types[event["failure_type"]] += 1
+
+        second = int(now)
+        if self._window and self._window[-1][0] == second:
+            _, events, failures = self._window[-1]
+            self._window[-1] = (second, events + 1, failures + failed)
+        else:
+            self._window.append((second, 1, int(failed)))
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        horizon = int(now) - self.window_seconds
+        while self._window and self._window[0][0] <= horizon:
+            self._window.popleft()
+        window_events = sum(bucket[1] for bucket in self._window)
+        window_failures = sum(bucket[2] for bucket in self._window)
+        return {
+            "total_transactions": self.total,
+            "active_failures": self.failed,
+            "total_volume": self.volume,
+            "avg_transaction_value": self.volume / self.total if self.total else None,
+            "transactions_per_second": window_events / self.window_seconds,
+            "window_failure_rate": window_failures / window_events * 100 if window_events else 0.0,
+            "failure_types": dict(self.failure_types)
+        }
+
+
+class LiveFeed:
+    """Fans live metric deltas out to WebSocket subscribers with per-client bounded queues"""
+
+    def __init__(self):
+        self.broadcast_interval = float(os.getenv("LIVE_BROADCAST_INTERVAL", "1"))
+        self.queue_size = int(os.getenv("LIVE_CLIENT_QUEUE_SIZE", "32"))
+        self.change_stream_retry = float(os.getenv("LIVE_CHANGE_STREAM_RETRY", "30"))
+        self.resume_attempts = int(os.getenv("LIVE_CHANGE_STREAM_RESUME_ATTEMPTS", "3"))
+        self.metrics = LiveMetrics(int(os.getenv("LIVE_WINDOW_SECONDS", "60")))
+        self.source = "event_bus"
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._pending: List[Dict[str, Any]] = []
+        self._resume_token = None
+        # Transaction IDs the event bus recorded while a resumable stream was down; its replay skips them
+        self._bus_recorded: Set[str] = set()
+        self._tasks: List[asyncio.Task] = []
+        self._event_listeners: List[Callable[[Dict[str, Any]], None]] = []
+        # Inserts only, matching the change stream's insert events
+        mongodb.add_insert_listener(self._on_write)
+
+    def add_event_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """Register a callback invoked with every transaction event, from either source"""
+        self._event_listeners.append(listener)
+
+    def _on_write(self, transactions: List[Transaction]):
+        """In-process event bus: used only while no change stream is feeding the metrics"""
+        if self.source != "event_bus":
+            return
+        now = time.monotonic()
+        for transaction in transactions:
+            if self._resume_token is not None:
+                self._bus_recorded.add(transaction.transaction_id)
+            self._record({
+                "transaction_id": transaction.transaction_id,
+                "timestamp": transaction.timestamp,
+                "status": transaction.status,
+                "amount": transaction.amount,
+                "sender_bank": transaction.sender_bank,
+                "failure_type": transaction.failure_type.value if transaction.failure_type else None,
+                "error_code": transaction.error_code
+            }, now)
+
+    def _record(self, event: Dict[str, Any], now: float):
+        self.metrics.add(event, now)
+        self._pending.append(event)
+        for listener in self._event_listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"❌ Live event listener failed: {e}")
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        queue.put_nowait(self._message("snapshot"))
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _message(self, message_type: str, **extra) -> Dict[str, Any]:
+        message = {
+            "type": message_type,
+            "source": self.source,
+            "subscribers": len(self._subscribers),
+            "metrics": self.metrics.snapshot(time.monotonic()),
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        message.update(extra)
+        return message
+
+    def publish(self, message: Dict[str, Any]):
+        """Queue a message for every subscriber; slow clients are resynced instead of blocking others"""
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Deltas the client missed are dropped; a fresh snapshot supersedes them
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self._message("snapshot", resync=True))
+
+    def _flush(self):
+        events, self._pending = self._pending, []
+        failed = [event for event in events if event["status"] == "failed"]
+        self.publish(self._message(
+            "delta",
+            delta={
+                "transactions": len(events),
+                "failures": len(failed),
+                "volume": sum(event["amount"] or 0.0 for event in events),
+                "failure_types": dict(Counter(event["failure_type"] for event in failed))
+            }
+        ))
+
+    async def start(self):
+        try:
+            self.metrics.seed(await advanced_queries.get_live_metrics())
+        except Exception as e:
+            logger.warning(f"⚠️ Could not seed live metrics: {e}")
+        self._tasks = [
+            asyncio.create_task(self._broadcast_loop()),
+            asyncio.create_task(self._change_stream_loop())
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+    async def _broadcast_loop(self):
+        while True:
+            await asyncio.sleep(self.broadcast_interval)
+            try:
+                # Empty deltas double as heartbeats so clients see the window decay
+                if self._subscribers:
+                    self._flush()
+                else:
+                    self._pending = []
+            except Exception as e:
+                logger.error(f"❌ Error broadcasting live metrics: {e}")
+
+    async def _change_stream_loop(self):
+        pipeline = [
+            {"$match": {"operationType": "insert"}},
+            {"$project": {
+                "fullDocument.transaction_id": 1,
+                "fullDocument.timestamp": 1,
+                "fullDocument.status": 1,
+                "fullDocument.amount": 1,
+                "fullDocument.sender_bank": 1,
+                "fullDocument.failure_type": 1,
+                "fullDocument.error_code": 1
+            }}
+        ]
+        resume_attempts = 0
+        while True:
+            try:
+                if mongodb.transactions_collection is None:
+                    raise RuntimeError("MongoDB is not connected")
+                async with mongodb.transactions_collection.watch(
+                    pipeline, resume_after=self._resume_token
+                ) as stream:
+                    resume_attempts = 0
+                    if self.source != "change_stream":
+                        logger.info("📡 Live metrics following MongoDB change stream")
+                    self.source = "change_stream"
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        doc = change["fullDocument"]
+                        if doc.get("transaction_id") in self._bus_recorded:
+                            self._bus_recorded.discard(doc.get("transaction_id"))
+                            continue
+                        self._record({
+                            "transaction_id": doc.get("transaction_id"),
+                            "timestamp": doc.get("timestamp"),
+                            "status": doc.get("status"),
+                            "amount": doc.get("amount"),
+                            "sender_bank": doc.get("sender_bank"),
+                            "failure_type": doc.get("failure_type"),
+                            "error_code": doc.get("error_code")
+                        }, time.monotonic())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if isinstance(e, OperationFailure) and e.code in (CHANGE_STREAM_HISTORY_LOST, CHANGE_STREAM_FATAL):
+                    logger.warning(f"⚠️ Change stream cannot resume, following new inserts only: {e}")
+                    self._resume_token = None
+                    self._bus_recorded.clear()
+                if self._resume_token is not None and resume_attempts < self.resume_attempts:
+                    # The resumed stream replays every insert after the token, so none are missed
+                    resume_attempts += 1
+                    logger.warning(f"⚠️ Change stream interrupted, resuming (attempt {resume_attempts}): {e}")
+                    await asyncio.sleep(min(2 ** (resume_attempts - 1), self.change_stream_retry))
+                    continue
+                # Standalone servers have no change streams; fall back to in-process writes.
+                # The resume token is kept, so the stream picks up where it stopped once it is back
+                if self.source != "event_bus":
+                    logger.warning(f"⚠️ Change stream unavailable, using in-process event bus: {e}")
+                self.source = "event_bus"
+            await asyncio.sleep(self.change_stream_retry)
+
+
+# Global live feed instance
+live_feed = LiveFeed()
@@ -0,0 +1,60 @@
+"""
+Shared fixtures for the backend test suite
+Tests import the backend packages the way the scripts do, with the backend directory on sys.path
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+# Add the backend directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.mongodb import mongodb
+from models.transaction import Transaction
+
+
+def make_transaction(transaction_id: str = "T1", **fields) -> Transaction:
+    """A valid Transaction; keyword arguments override the defaults"""
+    values = {
+        "transaction_id": transaction_id,
+        "timestamp": datetime(2024, 1, 1, 12, 0, 0),
+        "amount": 100.0,
+        "sender_vpa": "alice@paytm",
+        "receiver_vpa": "bob@ybl",
+        "sender_bank": "Paytm Payments Bank",
+        "receiver_bank": "Yes Bank",
+        "status": "success",
+    }
+    values.update(fields)
+    return Transaction(**values)
+
+
+@pytest.fixture
+def write_listeners(monkeypatch):
+    """Isolate mongodb write listeners, so engines built by a test don't outlive it"""
+    monkeypatch.setattr(mongodb, "_write_listeners", [])
+    monkeypatch.setattr(mongodb, "_insert_listeners", [])
+    return mongodb._write_listeners
+
+
+class StateCollection:
+    """In-memory stand-in for the analytics collection holding refresh watermarks"""
+
+    def __init__(self, *documents):
+        self.documents = [dict(document) for document in documents]
+
+    async def find_one(self, query, *args, **kwargs):
+        for document in self.documents:
+            if all(document.get(key) == value for key, value in query.items()):
+                return document
+        return None
+
+    async def update_one(self, query, update, upsert=False):
+        document = await self.find_one(query)
+        if document is None:
+            document = dict(query)
+            self.documents.append(document)
+        document.update(update["$set"])
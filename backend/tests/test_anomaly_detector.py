@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta
+
+from services.anomaly_detector import AnomalyDetector
+
+START = datetime(2024, 1, 1)
+
+
+def feed(detector, minute, events, failures, bank="HDFC", error_code="U30"):
+    """Spread one minute's events evenly across the bucket"""
+    for i in range(events):
+        timestamp = START + timedelta(minutes=minute, seconds=i * 60 / events)
+        detector.observe(timestamp, bank, i < failures, error_code if i < failures else None)
+
+
+def test_spike_opens_and_resolves_an_alert():
+    emitted = []
+    detector = AnomalyDetector(bucket_seconds=60, warmup=5, min_events=20, clear_buckets=2, on_alert=emitted.append)
+    minute = 0
+    for _ in range(10):
+        feed(detector, minute, 100, 2)
+        minute += 1
+    assert detector.alerts() == []
+
+    for _ in range(3):
+        feed(detector, minute, 100, 60)
+        minute += 1
+    alerts = detector.alerts()
+    assert {(alert["dimension"], alert["key"]) for alert in alerts} == {("bank", "HDFC"), ("error_code", "U30")}
+    assert all(alert["status"] == "open" for alert in alerts)
+    assert alerts[0]["peak_failure_rate"] == 60
+
+    for _ in range(4):
+        feed(detector, minute, 100, 2)
+        minute += 1
+    assert detector.alerts() == []
+    assert [alert["status"] for alert in emitted] == ["open", "open", "resolved", "resolved"]
+    assert len(detector.history) == 2
+
+
+def test_baseline_ignores_anomalous_buckets():
+    detector = AnomalyDetector(warmup=3, min_events=10)
+    for minute in range(5):
+        feed(detector, minute, 50, 5)
+    feed(detector, 5, 50, 40)
+    feed(detector, 6, 50, 5)
+    bank, = [row for row in detector.baselines() if row["dimension"] == "bank"]
+    assert abs(bank["baseline_failure_rate"] - 10) < 1
+    assert bank["alerting"]
+
+
+def test_sparse_buckets_are_carried_over():
+    detector = AnomalyDetector(warmup=1, min_events=20)
+    for minute in range(4):
+        feed(detector, minute, 10, 1)
+    # The first two closed buckets of 10 events are evaluated together
+    bank, = [row for row in detector.baselines() if row["dimension"] == "bank"]
+    assert bank["baseline_failure_rate"] == 10
+    assert not bank["warming_up"]
+
+
+def test_tick_closes_an_idle_bucket():
+    detector = AnomalyDetector(bucket_seconds=60, warmup=1, min_events=1)
+    detector.observe(START, "SBI", True)
+    assert detector.buckets_closed == 0
+    detector.tick(now=detector._arrived_at + 30)
+    assert detector.buckets_closed == 0
+    detector.tick(now=detector._arrived_at + 90)
+    assert detector.buckets_closed == 1
+    assert detector.baselines()[0]["window_events"] == 1
+
+
+def test_late_events_fold_into_the_open_bucket():
+    detector = AnomalyDetector(bucket_seconds=60)
+    detector.observe(START + timedelta(minutes=5), "SBI", False)
+    detector.observe(START, "SBI", False)
+    assert detector.buckets_closed == 0
+    assert detector.events_processed == 2
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from conftest import make_transaction
+from database.codec import DOCUMENT_PROJECTION, decode_document, encode_transaction, encode_transactions, vpa_domain
+from models.transaction import FailureType
+
+
+def test_round_trip():
+    transaction = make_transaction(
+        status="failed",
+        failure_reason="Bank server down",
+        failure_type=FailureType.BANK_SERVER_ERROR,
+        error_code="U30",
+        retry_count=2,
+        metadata={"source": "test"}
+    )
+    doc = encode_transaction(transaction)
+    assert doc["failure_type"] == "bank_server_error"
+    assert decode_document(doc) == transaction
+
+
+def test_encode_adds_domains_and_shared_timestamps():
+    now = datetime(2024, 2, 1)
+    docs = encode_transactions([make_transaction("T1"), make_transaction("T2", sender_vpa="malformed")], now)
+    assert docs[0]["sender_domain"] == "paytm" and docs[0]["receiver_domain"] == "ybl"
+    assert docs[1]["sender_domain"] is None
+    assert all(doc["created_at"] == doc["updated_at"] == now for doc in docs)
+
+
+def test_decode_fills_optional_fields():
+    doc = encode_transaction(make_transaction())
+    for field in ("failure_reason", "failure_type", "error_code", "retry_count", "metadata"):
+        del doc[field]
+    transaction = decode_document(doc)
+    assert transaction.failure_type is None
+    assert transaction.retry_count == 0
+    assert transaction.metadata == {}
+
+
+def test_projection_covers_every_field():
+    doc = encode_transaction(make_transaction())
+    projected = {field: doc[field] for field in DOCUMENT_PROJECTION if field != "_id"}
+    assert decode_document(projected) == decode_document(doc)
+
+
+def test_vpa_domain():
+    assert vpa_domain("alice@okaxis") == "okaxis"
+    assert vpa_domain("") is None
+    assert vpa_domain(None) is None
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+from database.downsampling import bucket_sums, lttb
+
+
+def series(count):
+    start = datetime(2024, 1, 1)
+    return [{"bucket": start + timedelta(minutes=i), "value": (i * 37) % 11} for i in range(count)]
+
+
+def test_lttb_keeps_endpoints_and_threshold():
+    rows = series(500)
+    sampled = lttb(rows, 50, "bucket", "value")
+    assert len(sampled) == 50
+    assert sampled[0] is rows[0] and sampled[-1] is rows[-1]
+    # Rows come back in x order, without duplicates
+    times = [row["bucket"] for row in sampled]
+    assert times == sorted(set(times))
+
+
+def test_lttb_keeps_a_spike():
+    rows = [{"x": i, "y": 0} for i in range(1000)]
+    rows[421]["y"] = 100
+    assert rows[421] in lttb(rows, 20, "x", "y")
+
+
+def test_lttb_accepts_iso_timestamps():
+    rows = [dict(row, bucket=row["bucket"].isoformat()) for row in series(100)]
+    assert len(lttb(rows, 10, "bucket", "value")) == 10
+
+
+def test_lttb_returns_short_series_unchanged():
+    rows = series(10)
+    assert lttb(rows, 10, "bucket", "value") is rows
+    assert lttb(rows, 2, "bucket", "value") is rows
+
+
+def test_bucket_sums_preserves_totals():
+    rows = [{"bank": f"B{i}", "count": i, "failed": i % 3} for i in range(103)]
+    merged = bucket_sums(rows, 10, ["count", "failed"])
+    assert len(merged) <= 10
+    assert sum(row["count"] for row in merged) == sum(row["count"] for row in rows)
+    assert sum(row["failed"] for row in merged) == sum(row["failed"] for row in rows)
+    assert sum(row["buckets"] for row in merged) == len(rows)
+    assert merged[0]["bank"] == "B0"
+
+
+def test_bucket_sums_treats_missing_measures_as_zero():
+    rows = [{"count": 1}, {"count": None}, {}, {"count": 2}]
+    assert bucket_sums(rows, 1, ["count"])[0]["count"] == 3
@@ -0,0 +1,76 @@
+import asyncio
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from conftest import make_transaction
+from models.transaction import FailureType
+from utils.export import (
+    TRANSACTION_EXPORT_COLUMNS, TRANSACTION_EXPORT_TYPES, encode_stream, flatten_row, make_encoder,
+    row_chunks, transaction_row
+)
+
+ROWS = [
+    transaction_row(make_transaction(
+        f"T{i}", amount=float(i), status="failed" if i % 2 else "success",
+        failure_type=FailureType.TIMEOUT if i % 2 else None, metadata={"i": i}
+    ))
+    for i in range(7)
+]
+
+
+def encode(export_format, chunks, columns=None, types=None):
+    encoder = make_encoder(export_format, columns, types)
+    return b"".join(encoder.encode(rows) for rows in chunks) + encoder.finish()
+
+
+def test_ndjson_round_trip():
+    data = encode("ndjson", [ROWS[:3], ROWS[3:]], TRANSACTION_EXPORT_COLUMNS)
+    rows = [json.loads(line) for line in data.decode().splitlines()]
+    assert [row["transaction_id"] for row in rows] == [f"T{i}" for i in range(7)]
+    assert rows[1]["failure_type"] == "timeout"
+    assert rows[0]["timestamp"] == "2024-01-01T12:00:00"
+    assert rows[2]["metadata"] == {"i": 2}
+
+
+def test_csv_writes_one_header_across_chunks():
+    data = encode("csv", [ROWS[:3], [], ROWS[3:]])
+    rows = list(csv.DictReader(io.StringIO(data.decode())))
+    assert len(rows) == 7
+    assert list(rows[0]) == list(ROWS[0])
+    assert json.loads(rows[4]["metadata"]) == {"i": 4}
+    assert rows[3]["failure_type"] == "timeout" and rows[0]["failure_type"] == ""
+
+
+def test_parquet_round_trip_with_types():
+    data = encode("parquet", [ROWS[:3], ROWS[3:]], TRANSACTION_EXPORT_COLUMNS, TRANSACTION_EXPORT_TYPES)
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 7
+    assert table.schema.field("timestamp").type == pa.timestamp("us")
+    assert table.column("amount").to_pylist() == [float(i) for i in range(7)]
+    assert table.column("timestamp")[0].as_py() == datetime(2024, 1, 1, 12)
+
+
+def test_parquet_infers_schema_with_null_first_chunk():
+    chunks = [[{"bank": "A", "rate": None}], [{"bank": "B", "rate": "12.5"}]]
+    table = pq.read_table(io.BytesIO(encode("parquet", chunks)))
+    assert table.column("rate").to_pylist() == [None, "12.5"]
+
+
+def test_encode_stream_gzip():
+    async def collect():
+        encoder = make_encoder("ndjson")
+        return b"".join([chunk async for chunk in encode_stream(row_chunks(ROWS, 2), encoder, gzip=True)])
+
+    data = zlib.decompress(asyncio.run(collect()), 31)
+    assert len(data.decode().splitlines()) == 7
+
+
+def test_flatten_row():
+    row = {"_id": {"bank": "A", "hour": 3}, "count": 2, "empty": {}}
+    assert flatten_row(row) == {"_id.bank": "A", "_id.hour": 3, "count": 2, "empty": {}}
@@ -0,0 +1,172 @@
+"""
+Interleavings of RetryChainEngine.refresh and relinks with concurrent writes and readers
+"""
+
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from conftest import StateCollection, make_transaction
+from database.mongodb import mongodb
+from database.retry_chains import RetryChainEngine
+from database.rollups import floor_hour
+
+
+class StatsCollection:
+    """In-memory retry_chain_stats collection; every call yields to the event loop like a round trip"""
+
+    def __init__(self):
+        self.documents = {}
+
+    @staticmethod
+    def _key(document_id):
+        return tuple(sorted(document_id.items()))
+
+    @staticmethod
+    def _in_range(value, condition):
+        return ("$gte" not in condition or value >= condition["$gte"]) and ("$lt" not in condition or value < condition["$lt"])
+
+    async def bulk_write(self, operations, ordered=True):
+        for operation in operations:
+            await asyncio.sleep(0)
+            self.documents[self._key(operation._filter["_id"])] = dict(operation._doc)
+
+    async def delete_many(self, query):
+        await asyncio.sleep(0)
+        for key, document in list(self.documents.items()):
+            if self._in_range(document["bucket"], query.get("bucket", {})) and (
+                "run" not in query or document["run"] != query["run"]["$ne"]
+            ):
+                del self.documents[key]
+
+    def find(self, query, projection=None):
+        collection = self
+
+        class Cursor:
+            async def to_list(self, length=None):
+                await asyncio.sleep(0)
+                return [
+                    {key: value for key, value in document.items() if key not in ("_id", "run")}
+                    for document in collection.documents.values()
+                    if collection._in_range(document["bucket"], query.get("bucket", {}))
+                ]
+
+        return Cursor()
+
+
+@pytest.fixture
+def engine(write_listeners, monkeypatch):
+    monkeypatch.setattr(mongodb, "_writes_in_flight", Counter())
+    engine = RetryChainEngine()
+    engine.max_span = timedelta(hours=1)
+    engine.gap = timedelta(minutes=10)
+    return engine
+
+
+def use_watermark(monkeypatch, watermark):
+    state = StateCollection({"metric_type": "retry_chain_state", "linked_until": watermark})
+    monkeypatch.setattr(mongodb, "analytics_collection", state)
+    return state
+
+
+def test_late_attempt_during_refresh_is_marked_dirty(engine, monkeypatch):
+    horizon = floor_hour(datetime.utcnow() - engine.max_span)
+    state = use_watermark(monkeypatch, horizon - timedelta(hours=3))
+    late = make_transaction("LATE", timestamp=horizon - timedelta(hours=2), status="failed")
+    relinked = []
+
+    async def rebuild(lo, hi):
+        relinked.append((lo, hi))
+        mongodb._notify_write([late])
+        return 0
+
+    monkeypatch.setattr(engine, "_rebuild_range", rebuild)
+    asyncio.run(engine.refresh())
+    assert relinked == [(horizon - timedelta(hours=3), horizon)]
+    assert engine._dirty_hours == {horizon - timedelta(hours=2)}
+    assert state.documents[0]["linked_until"] == horizon
+
+    # The relink covers max_span either side of the late attempt's hour, up to the watermark
+    relinked.clear()
+    late = make_transaction("ON-TIME", timestamp=horizon + timedelta(hours=2))
+    asyncio.run(engine.refresh())
+    assert relinked == [(horizon - timedelta(hours=3), horizon)]
+    assert engine._dirty_hours == set()
+
+
+def test_attempts_within_max_span_past_the_watermark_are_dirty(engine, monkeypatch):
+    watermark = floor_hour(datetime.utcnow()) - timedelta(hours=6)
+    use_watermark(monkeypatch, watermark)
+    asyncio.run(engine.get_watermark())
+    mongodb._notify_write([
+        make_transaction("NEAR", timestamp=watermark + timedelta(minutes=30)),
+        make_transaction("FAR", timestamp=watermark + engine.max_span + timedelta(minutes=1)),
+    ])
+    # A chain starting just before the watermark can gain this attempt
+    assert engine._dirty_hours == {watermark}
+
+
+def test_failed_refresh_keeps_watermark_and_dirty_hours(engine, monkeypatch):
+    horizon = floor_hour(datetime.utcnow() - engine.max_span)
+    watermark = horizon - timedelta(hours=2)
+    state = use_watermark(monkeypatch, watermark)
+    asyncio.run(engine.get_watermark())
+    dirty_hour = watermark - timedelta(hours=5)
+    mongodb._notify_write([make_transaction(timestamp=dirty_hour)])
+
+    async def rebuild(lo, hi):
+        raise ConnectionError("lost primary")
+
+    monkeypatch.setattr(engine, "_rebuild_range", rebuild)
+    with pytest.raises(ConnectionError):
+        asyncio.run(engine.refresh())
+    assert engine._watermark == watermark
+    assert state.documents[0]["linked_until"] == watermark
+    assert engine._dirty_hours == {dirty_hour}
+
+
+def test_relink_never_leaves_hours_empty_for_readers(engine, monkeypatch):
+    start = datetime(2024, 1, 1, 10)
+    rows = []
+    for i in range(30):
+        sender = f"s{i}@x"
+        rows.append({"timestamp": start + timedelta(minutes=i), "sender_vpa": sender, "receiver_vpa": "m@x",
+                     "amount": 10.0, "status": "failed", "failure_type": "network_issue" if i % 2 else "timeout"})
+        rows.append({"timestamp": start + timedelta(minutes=i, seconds=i % 3 * 30), "sender_vpa": sender,
+                     "receiver_vpa": "m@x", "amount": 10.0, "status": "success" if i % 3 else "failed",
+                     "failure_type": None})
+    frame = pd.DataFrame(rows)
+    collection = StatsCollection()
+
+    async def load(lo, hi):
+        return frame
+
+    monkeypatch.setattr(engine, "_load", load)
+    monkeypatch.setattr(mongodb, "retry_chains_collection", collection)
+    monkeypatch.setattr(mongodb, "analytics_retry_chains", collection)
+    lo, hi = start, start + timedelta(hours=1)
+
+    async def run():
+        assert await engine._rebuild_range(lo, hi) == 30
+        expected = await engine.stats(lo, hi)
+        seen = []
+        relinking = True
+
+        async def read():
+            while relinking:
+                seen.append(sum(row["count"] for row in await engine.stats(lo, hi)))
+
+        reader = asyncio.create_task(read())
+        for _ in range(3):
+            await engine._rebuild_range(lo, hi)
+        relinking = False
+        await reader
+        return expected, seen
+
+    expected, seen = asyncio.run(run())
+    assert sum(row["count"] for row in expected) == 30
+    assert len(seen) > 3 and set(seen) == {30}
+    assert all("run" not in row for row in expected)
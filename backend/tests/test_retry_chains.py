@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from database.retry_chains import chain_stats, link_chains, summarize_chains
+
+T0 = datetime(2024, 1, 1, 10, 0)
+GAP = timedelta(minutes=10)
+MAX_SPAN = timedelta(hours=1)
+
+
+def attempt(minutes, status="failed", amount=100.0, sender="a@x", failure_type="network_issue"):
+    return {
+        "timestamp": T0 + timedelta(minutes=minutes),
+        "sender_vpa": sender,
+        "receiver_vpa": "m@x",
+        "amount": amount,
+        "status": status,
+        "failure_type": failure_type if status == "failed" else None,
+    }
+
+
+def chains(rows):
+    return link_chains(pd.DataFrame(rows), GAP, MAX_SPAN).sort_values(["start", "attempts"]).reset_index(drop=True)
+
+
+def test_retries_are_linked_until_success():
+    linked = chains([attempt(3, "success"), attempt(0), attempt(1)])
+    assert len(linked) == 1
+    chain = linked.iloc[0]
+    assert chain["start"] == T0
+    assert chain["attempts"] == 3
+    assert chain["succeeded"]
+    assert chain["time_to_success"] == 180
+    assert chain["failure_type"] == "network_issue"
+
+
+def test_keys_pauses_and_successes_split_chains():
+    linked = chains([
+        attempt(0), attempt(1, amount=200.0),
+        attempt(30),  # after a pause longer than the gap
+        attempt(32, "success"), attempt(33),  # a success ends the chain
+        attempt(40, "success", sender="b@x"),  # chains whose first attempt succeeded are not reported
+    ])
+    assert linked["attempts"].tolist() == [1, 1, 2, 1]
+    assert linked["succeeded"].tolist() == [False, False, True, False]
+    assert pd.isna(linked["time_to_success"][0])
+
+
+def test_long_chains_split_at_max_span():
+    linked = chains([attempt(minutes) for minutes in range(0, 150, 5)])
+    assert linked["attempts"].sum() == 30
+    assert (linked["attempts"] <= 13).all()
+    assert len(linked) == 3
+
+
+def test_empty_frame():
+    assert link_chains(pd.DataFrame(), GAP, MAX_SPAN).empty
+    assert chain_stats(link_chains(pd.DataFrame(), GAP, MAX_SPAN)) == []
+
+
+def test_chain_stats_and_summary():
+    rows = []
+    # 10 chains succeed on the second attempt after a minute, 10 never succeed
+    for i in range(20):
+        sender = f"s{i}@x"
+        rows.append(attempt(0, sender=sender))
+        rows.append(attempt(1, "success" if i < 10 else "failed", sender=sender))
+    stats = chain_stats(chains(rows))
+    by_outcome = {row["succeeded"]: row for row in stats}
+    assert by_outcome[True]["count"] == 10 and by_outcome[False]["count"] == 10
+    assert by_outcome[True]["bucket"] == T0
+    assert by_outcome[True]["time_to_success_sum"] == 600
+    assert sum(by_outcome[True]["time_to_success_histogram"]) == 10
+
+    summary, = summarize_chains(stats)
+    assert summary["failure_type"] == "network_issue"
+    assert summary["chains"] == 20
+    assert summary["eventual_success_rate"] == 50
+    assert summary["avg_attempts"] == 2
+    assert summary["avg_time_to_success_seconds"] == 60
+    assert 30 <= summary["median_time_to_success_seconds"] <= 120
+    assert summary["attempts"] == [{"attempt": 2, "reached": 20, "succeeded": 10, "success_probability": 50.0}]
+    assert summary["recommended_max_retries"] == 1
+    assert summarize_chains(stats, min_chains=50)[0]["recommended_max_retries"] == 0
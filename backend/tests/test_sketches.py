@@ -0,0 +1,55 @@
+import numpy as np
+
+from database.sketches import HyperLogLog, TDigest
+
+
+def test_hyperloglog_estimate_within_tolerance():
+    sketch = HyperLogLog()
+    sketch.update(f"user{i}@paytm" for i in range(50_000))
+    assert abs(sketch.estimate() - 50_000) / 50_000 < 0.05
+
+
+def test_hyperloglog_small_counts_are_exact_enough():
+    sketch = HyperLogLog()
+    sketch.update(["a@x", "b@x", "a@x", None, "c@x"])
+    assert sketch.estimate() == 3
+
+
+def test_hyperloglog_merge_and_bytes_round_trip():
+    left, right = HyperLogLog(), HyperLogLog()
+    left.update(f"v{i}" for i in range(0, 6000))
+    right.update(f"v{i}" for i in range(4000, 10_000))
+    left.merge(right)
+    restored = HyperLogLog.from_bytes(left.to_bytes())
+    assert restored.estimate() == left.estimate()
+    assert abs(left.estimate() - 10_000) / 10_000 < 0.05
+
+
+def test_tdigest_quantiles():
+    values = np.random.default_rng(3).lognormal(6, 1, 100_000)
+    digest = TDigest()
+    digest.update(values)
+    for q in (0.01, 0.5, 0.9, 0.99):
+        exact = np.quantile(values, q)
+        assert abs(digest.quantile(q) - exact) / exact < 0.02
+    assert digest.quantile(0) == values.min()
+    assert digest.quantile(1) == values.max()
+    assert digest.count == len(values)
+
+
+def test_tdigest_merge_and_dict_round_trip():
+    values = np.random.default_rng(4).uniform(0, 1000, 20_000)
+    left, right = TDigest(), TDigest()
+    left.update(values[:10_000])
+    right.update(values[10_000:])
+    left.merge(right)
+    restored = TDigest.from_dict(left.to_dict())
+    assert restored.quantile(0.5) == left.quantile(0.5)
+    assert abs(restored.quantile(0.5) - np.median(values)) < 10
+
+
+def test_tdigest_empty():
+    digest = TDigest()
+    digest.add(None)
+    assert digest.quantile(0.5) is None
+    assert digest.count == 0
@@ -0,0 +1,96 @@
+import asyncio
+import os
+
+import pytest
+
+from conftest import make_transaction
+from database.mongodb import mongodb
+from database.storage_router import StorageRouter, WriteJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return WriteJournal(str(tmp_path / "journal.ndjson"))
+
+
+@pytest.fixture
+def router(journal):
+    router = StorageRouter()
+    router.journal = journal
+    router.mongodb_available = True
+    return router
+
+
+def ids(transactions):
+    return [transaction.transaction_id for transaction in transactions]
+
+
+def test_append_and_read_back(journal):
+    assert journal.append([]) == 0
+    assert not journal.has_pending()
+    journal.append([make_transaction("T1"), make_transaction("T2")])
+    assert journal.has_pending()
+    assert ids(journal.iter_transactions()) == ["T1", "T2"]
+
+
+def test_torn_line_does_not_swallow_the_next_append(journal):
+    journal.append([make_transaction("T1")])
+    with open(journal.path, "a") as f:
+        f.write(make_transaction("T2").model_dump_json()[:40])
+    journal.append([make_transaction("T3")])
+    assert ids(journal.iter_transactions()) == ["T1", "T3"]
+    assert not os.path.exists(journal.quarantine_path)
+
+
+def test_drain_quarantines_unreadable_lines(router, journal, monkeypatch):
+    journal.append([make_transaction("T1")])
+    with open(journal.path, "a") as f:
+        f.write("not json\n")
+    journal.append([make_transaction("T2")])
+    written = []
+
+    async def bulk_upsert(transactions, **kwargs):
+        written.extend(ids(transactions))
+        return {"inserted": len(written), "duplicates": 0, "failed_batches": 0}
+
+    monkeypatch.setattr(mongodb, "bulk_upsert_transactions", bulk_upsert)
+    assert asyncio.run(router.drain_journal()) == 2
+    assert written == ["T1", "T2"]
+    assert not journal.has_pending()
+    with open(journal.quarantine_path) as f:
+        assert f.read() == "not json\n"
+
+
+def test_drain_requeues_failed_batches_on_a_healthy_database(router, journal, monkeypatch):
+    journal.append([make_transaction(f"T{i}") for i in range(4)])
+
+    async def bulk_upsert(transactions, on_batch_failed=None, **kwargs):
+        batch = list(transactions)
+        await on_batch_failed(batch[2:], RuntimeError("write failed"))
+        return {"inserted": 2, "duplicates": 0, "failed_batches": 1}
+
+    async def ping():
+        return True
+
+    monkeypatch.setattr(mongodb, "bulk_upsert_transactions", bulk_upsert)
+    monkeypatch.setattr(router, "_ping", ping)
+    assert asyncio.run(router.drain_journal()) == 2
+    assert not os.path.exists(journal.draining_path)
+    assert ids(journal.iter_transactions()) == ["T2", "T3"]
+
+
+def test_drain_keeps_the_file_while_the_database_is_down(router, journal, monkeypatch):
+    journal.append([make_transaction("T1")])
+
+    async def bulk_upsert(transactions, on_batch_failed=None, **kwargs):
+        await on_batch_failed(list(transactions), ConnectionError("down"))
+        return {"inserted": 0, "duplicates": 0, "failed_batches": 1}
+
+    async def ping():
+        return False
+
+    monkeypatch.setattr(mongodb, "bulk_upsert_transactions", bulk_upsert)
+    monkeypatch.setattr(router, "_ping", ping)
+    assert asyncio.run(router.drain_journal()) == 0
+    assert not router.mongodb_available
+    assert ids(journal.iter_transactions(journal.draining_path)) == ["T1"]
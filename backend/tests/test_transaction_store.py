@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+
+from conftest import make_transaction
+from models.transaction import FailureType
+from models.transaction_store import TransactionStore
+
+
+def transactions(count):
+    return [
+        make_transaction(
+            f"T{i}",
+            timestamp=datetime(2024, 1, 1) + timedelta(minutes=i),
+            status="failed" if i % 3 == 0 else "success",
+            failure_type=FailureType.NETWORK_ISSUE if i % 3 == 0 else None,
+            metadata={"i": i} if i % 2 else {}
+        )
+        for i in range(count)
+    ]
+
+
+def test_round_trip():
+    source = transactions(10)
+    store = TransactionStore(source)
+    assert list(store) == source
+    assert store[-1] == source[-1]
+    assert store[2:4] == source[2:4]
+
+
+def test_find_keeps_first_occurrence():
+    store = TransactionStore(transactions(5))
+    store.append(make_transaction("T2", amount=999.0))
+    assert store.find("T2") == 2
+    assert store.get(store.find("T2")).amount == 100.0
+    assert store.find("missing") is None
+
+
+def test_extend_columns_indexes_ids():
+    store = TransactionStore(transactions(3))
+    extra = [make_transaction(f"C{i}", metadata={"c": i}) for i in range(3)]
+    store.extend_columns({field: [getattr(t, field) for t in extra] for field in type(extra[0]).model_fields})
+    assert store.find("C1") == 4
+    assert store.get(4) == extra[1]
+    assert store.find("T0") == 0
+
+
+def test_large_retry_counts():
+    store = TransactionStore([make_transaction(retry_count=70_000)])
+    assert store.get(0).retry_count == 70_000
+
+
+def test_select_and_counts():
+    store = TransactionStore(transactions(9))
+    assert store.select(status="failed") == [0, 3, 6]
+    assert store.select(failure_type="network_issue", start=datetime(2024, 1, 1, 0, 1)) == [3, 6]
+    assert store.select(status="unknown") == []
+    assert store.select(search_term="t7") == [7]
+    assert store.status_counts() == {"failed": 3, "success": 6}
+    assert store.failure_type_counts() == {"network_issue": 3}
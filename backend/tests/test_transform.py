@@ -0,0 +1,49 @@
+import numpy as np
+import pyarrow as pa
+
+import data_ingestion.huggingface_loader as huggingface_loader
+from data_ingestion.huggingface_loader import HuggingFaceDataLoader, map_chunk
+from data_ingestion.transform import to_table, transform_batch, transform_columns
+from scripts.benchmark_hf_transform import chunks, compare, synthetic_columns
+
+ID_DATE = "20240101"
+
+
+def test_batched_mapping_matches_per_record_mapping():
+    columns = synthetic_columns(3000, seed=11)
+    loader = HuggingFaceDataLoader()
+    per_record, batched = [], []
+    for offset, chunk in chunks(columns, 1000):
+        per_record.extend(loader._transform_records(chunk, offset, ID_DATE, np.random.default_rng(1)))
+        batched.extend(transform_batch(to_table(chunk), offset, ID_DATE, np.random.default_rng(1)))
+    assert len(per_record) == len(batched) == 3000
+    assert compare(columns, per_record, batched) == 0
+
+
+def test_transform_columns_is_deterministic_per_seed():
+    table = to_table(synthetic_columns(500, seed=5))
+    first = transform_columns(table, 0, ID_DATE, np.random.default_rng(9), processed_at="t")
+    again = transform_columns(table, 0, ID_DATE, np.random.default_rng(9), processed_at="t")
+    assert first == again
+    assert first["transaction_id"][:2] == ["UPI20240101000000", "UPI20240101000001"]
+
+
+def test_empty_batch():
+    assert transform_columns(pa.table({"Date": pa.array([], pa.string())}), 0, ID_DATE, np.random.default_rng()) == {}
+
+
+def test_per_record_fallback_is_deterministic_per_seed(monkeypatch):
+    def unmappable(*args, **kwargs):
+        raise ValueError("forced")
+
+    monkeypatch.setattr(huggingface_loader, "transform_columns", unmappable)
+    table = to_table(synthetic_columns(50, seed=3))
+
+    def run(seed):
+        return [transaction.model_dump(exclude={"metadata"}) for transaction in map_chunk(table, 100, ID_DATE, seed)]
+
+    first = run(7)
+    assert len(first) == 50
+    assert first[0]["transaction_id"] == "UPI20240101000100"
+    assert run(7) == first
+    assert run(8) != first
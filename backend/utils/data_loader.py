@@ -1,24 +1,65 @@
 import pandas as pd
 import json
-from typing import List, Optional, Dict
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, List, Optional, Dict, Tuple
 from models.transaction import Transaction, FailureType
+from models.transaction_store import TransactionStore
 from datetime import datetime, timedelta
 import random
 import os
 from database.mongodb import mongodb
+from database.storage_router import storage_router, WriteJournal
+from database.codec import decode_document, DOCUMENT_PROJECTION
+from database.advanced_queries import advanced_queries
+from database.local_analytics import LocalAnalytics
+from utils.export import transaction_row
 
 class DataLoader:
     def __init__(self):
         self.transactions_df = None
-        self.transactions_cache = []
-        self.mongodb_connected = False
+        self.transactions_cache = TransactionStore()
+        
+        # Background refresh of the fallback snapshot
+        self.refresh_interval = float(os.getenv("FALLBACK_REFRESH_INTERVAL", "300"))
+        self.cold_cache_wait = float(os.getenv("FALLBACK_COLD_WAIT_SECONDS", "2"))
+        self._snapshot_loaded_at: Optional[float] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._background_task: Optional[asyncio.Task] = None
+        self._executor: Optional[Executor] = None
+        # Writes buffered while a rebuild runs; the worker may have read the journal before they landed
+        self._buffered_during_rebuild: Optional[List[Transaction]] = None
+        
+        # Embedded analytics engine over the fallback snapshot, rebuilt when the snapshot changes
+        self._local_analytics: Optional[LocalAnalytics] = None
+        self._local_analytics_key: Optional[Tuple[int, int]] = None
+        self._local_analytics_lock = asyncio.Lock()
+        
+        # Follow live failover/recovery decisions of the storage router
+        storage_router.add_listener(self._on_storage_change)
+        storage_router.add_buffer_sink(self._on_buffered_writes)
+    
+    @property
+    def mongodb_connected(self) -> bool:
+        return storage_router.mongodb_available
+    
+    def _on_storage_change(self, mongodb_available: bool):
+        """Make sure the fallback snapshot is warm as soon as MongoDB goes away"""
+        if not mongodb_available and (not self.transactions_cache or self._snapshot_is_stale()):
+            self.request_refresh()
+    
+    def _on_buffered_writes(self, transactions: List[Transaction]):
+        """Writes buffered while MongoDB is down stay visible through the fallback"""
+        self.transactions_cache.extend(transactions)
+        if self._buffered_during_rebuild is not None:
+            self._buffered_during_rebuild.extend(transactions)
         
     async def load_transaction_data(self):
         """Load UPI transaction data from MongoDB or generate synthetic data"""
         try:
             # Try to connect to MongoDB first
-            if await mongodb.connect():
-                self.mongodb_connected = True
+            if await storage_router.connect():
                 print("✅ Connected to MongoDB successfully")
                 
                 # Check if we have existing data in MongoDB
@@ -32,31 +73,138 @@ class DataLoader:
                     
             else:
                 print("⚠️ MongoDB connection failed, falling back to CSV/memory storage")
-                self.mongodb_connected = False
                 await self._fallback_to_csv()
                 
         except Exception as e:
             print(f"❌ Error during data loading: {e}")
             print("⚠️ Falling back to CSV/memory storage")
-            self.mongodb_connected = False
+            storage_router.report_failure(e)
             await self._fallback_to_csv()
     
     async def _fallback_to_csv(self):
         """Fallback to CSV file storage when MongoDB is not available"""
+        await self.request_refresh()
+    
+    @staticmethod
+    def _build_fallback_snapshot() -> Tuple[pd.DataFrame, TransactionStore, int]:
+        """Load the CSV (or generate synthetic data) into a new snapshot; runs in a worker
+        
+        Also returns the row index where the journal overlay starts.
+        """
         data_path = os.path.join("data", "upi_transactions.csv")
         
         try:
             if os.path.exists(data_path):
                 # Load from CSV if exists
-                self.transactions_df = pd.read_csv(data_path, quotechar='"', escapechar='\\')
-                self.transactions_cache = self._convert_to_transactions(self.transactions_df)
+                transactions_df = pd.read_csv(data_path, quotechar='"', escapechar='\\')
             else:
                 # Generate synthetic data and save to CSV
-                await self._generate_synthetic_data()
+                transactions_df = DataLoader._generate_synthetic_data()
         except Exception as e:
             print(f"Error loading CSV data: {e}")
             print("Generating synthetic data instead...")
-            await self._generate_synthetic_data()
+            transactions_df = DataLoader._generate_synthetic_data()
+        
+        transactions = DataLoader._convert_to_transactions(transactions_df)
+        journal_start = len(transactions)
+        
+        # Overlay writes still waiting in the journal for MongoDB to come back
+        try:
+            transactions.extend(WriteJournal().iter_transactions())
+        except Exception as e:
+            print(f"Error reading write journal: {e}")
+        
+        return transactions_df, transactions, journal_start
+    
+    def _get_executor(self) -> Executor:
+        """Worker used to build snapshots off the event loop"""
+        if self._executor is None:
+            if os.getenv("FALLBACK_REFRESH_EXECUTOR", "thread") == "process":
+                self._executor = ProcessPoolExecutor(max_workers=1)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fallback-refresh")
+        return self._executor
+    
+    async def _rebuild_snapshot(self):
+        """Build a new fallback snapshot in the worker and swap it in atomically"""
+        try:
+            started = time.monotonic()
+            loop = asyncio.get_running_loop()
+            self._buffered_during_rebuild = []
+            try:
+                transactions_df, transactions, journal_start = await loop.run_in_executor(
+                    self._get_executor(), DataLoader._build_fallback_snapshot
+                )
+                buffered = self._buffered_during_rebuild
+            finally:
+                self._buffered_during_rebuild = None
+            
+            # Re-apply writes buffered during the rebuild that the worker's journal read missed
+            overlaid = set(transactions.transaction_ids[journal_start:])
+            transactions.extend(
+                transaction for transaction in buffered if transaction.transaction_id not in overlaid
+            )
+            
+            # Plain reference swaps: readers see either the old or the new snapshot
+            self.transactions_df = transactions_df
+            self.transactions_cache = transactions
+            self._snapshot_loaded_at = time.monotonic()
+            print(f"🔄 Fallback snapshot refreshed with {len(transactions)} transactions in {time.monotonic() - started:.2f}s")
+        except Exception as e:
+            print(f"❌ Error refreshing fallback snapshot: {e}")
+    
+    def request_refresh(self) -> asyncio.Task:
+        """Start a snapshot rebuild unless one is already running"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._rebuild_snapshot())
+        return self._refresh_task
+    
+    def _snapshot_is_stale(self) -> bool:
+        return (
+            self._snapshot_loaded_at is None or
+            time.monotonic() - self._snapshot_loaded_at > self.refresh_interval
+        )
+    
+    async def _ensure_cache(self):
+        """Serve the current snapshot; only a cold cache waits (bounded) for a rebuild"""
+        if self.transactions_cache:
+            # Serve stale data while a rebuild runs in the background
+            if self._snapshot_is_stale():
+                self.request_refresh()
+            return
+        
+        try:
+            await asyncio.wait_for(asyncio.shield(self.request_refresh()), timeout=self.cold_cache_wait)
+        except asyncio.TimeoutError:
+            print("⏳ Fallback snapshot still loading, serving empty results")
+    
+    def start_background_refresh(self):
+        """Start the periodic fallback snapshot refresh loop"""
+        if self._background_task is None or self._background_task.done():
+            self._background_task = asyncio.create_task(self._background_refresh_loop())
+    
+    async def stop_background_refresh(self):
+        """Stop background work and release the snapshot worker"""
+        for task in (self._background_task, self._refresh_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+    
+    async def _background_refresh_loop(self):
+        """Keep the fallback snapshot warm while MongoDB is unavailable"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if not self.mongodb_connected and self._snapshot_is_stale():
+                    await self.request_refresh()
+            except Exception as e:
+                print(f"❌ Error in background refresh loop: {e}")
     
     async def _generate_and_store_synthetic_data(self):
         """Generate synthetic data and store in MongoDB"""
@@ -128,15 +276,16 @@ class DataLoader:
         
         # Store in MongoDB
         if self.mongodb_connected:
-            inserted_count = await mongodb.bulk_insert_transactions(transactions)
+            inserted_count = await storage_router.insert_transactions(transactions)
             print(f"✅ Inserted {inserted_count} transactions into MongoDB")
         
         # Also cache in memory for immediate use
-        self.transactions_cache = transactions
+        self.transactions_cache = TransactionStore.from_transactions(transactions)
         print(f"📊 Generated and cached {len(transactions)} synthetic transactions")
     
-    async def _generate_synthetic_data(self):
-        """Generate synthetic UPI transaction data for MVP"""
+    @staticmethod
+    def _generate_synthetic_data() -> pd.DataFrame:
+        """Generate synthetic UPI transaction data for MVP and save it to CSV"""
         synthetic_data = []
         
         # Sample bank codes and VPAs
@@ -201,20 +350,20 @@ class DataLoader:
             })
         
         # Create DataFrame and save to CSV
-        self.transactions_df = pd.DataFrame(synthetic_data)
+        transactions_df = pd.DataFrame(synthetic_data)
         
         # Ensure data directory exists
         os.makedirs("data", exist_ok=True)
         
         # Save to CSV with proper quoting for JSON fields
-        self.transactions_df.to_csv("data/upi_transactions.csv", index=False, quoting=1)
+        transactions_df.to_csv("data/upi_transactions.csv", index=False, quoting=1)
         
-        # Convert to Transaction objects
-        self.transactions_cache = self._convert_to_transactions(self.transactions_df)
+        return transactions_df
     
-    def _convert_to_transactions(self, df: pd.DataFrame) -> List[Transaction]:
-        """Convert DataFrame to Transaction objects"""
-        transactions = []
+    @staticmethod
+    def _convert_to_transactions(df: pd.DataFrame) -> TransactionStore:
+        """Convert DataFrame rows into a compact transaction store"""
+        transactions = TransactionStore()
         
         for _, row in df.iterrows():
             try:
@@ -244,7 +393,8 @@ class DataLoader:
                     receiver_vpa=str(row['receiver_vpa']),
                     sender_bank=str(row['sender_bank']),
                     receiver_bank=str(row['receiver_bank']),
-                    status=str(row['status']),
+                    # The bundled CSV stores SUCCESS/FAILED; everything else compares lowercase
+                    status=str(row['status']).lower(),
                     failure_reason=str(row.get('failure_reason')) if pd.notna(row.get('failure_reason')) else None,
                     failure_type=failure_type,
                     error_code=str(row.get('error_code')) if pd.notna(row.get('error_code')) else None,
@@ -269,28 +419,15 @@ class DataLoader:
                     limit=limit,
                     skip=skip,
                     failure_type=failure_type,
-                    search_term=search_term
+                    search_term=search_term,
+                    projection=DOCUMENT_PROJECTION
                 )
                 
                 # Convert MongoDB documents to Transaction objects
                 transactions = []
                 for doc in transaction_docs:
                     try:
-                        transaction = Transaction(
-                            transaction_id=doc['transaction_id'],
-                            timestamp=doc['timestamp'],
-                            amount=doc['amount'],
-                            sender_vpa=doc['sender_vpa'],
-                            receiver_vpa=doc['receiver_vpa'],
-                            sender_bank=doc['sender_bank'],
-                            receiver_bank=doc['receiver_bank'],
-                            status=doc['status'],
-                            failure_reason=doc.get('failure_reason'),
-                            failure_type=FailureType(doc['failure_type']) if doc.get('failure_type') else None,
-                            error_code=doc.get('error_code'),
-                            retry_count=doc.get('retry_count', 0),
-                            metadata=doc.get('metadata', {})
-                        )
+                        transaction = decode_document(doc)
                         transactions.append(transaction)
                     except Exception as e:
                         print(f"Error converting MongoDB doc to transaction: {e}")
@@ -300,36 +437,67 @@ class DataLoader:
                 
             except Exception as e:
                 print(f"Error retrieving from MongoDB: {e}")
+                storage_router.report_failure(e)
                 # Fallback to cache
                 pass
         
         # Fallback to cache/CSV data
-        if not self.transactions_cache:
-            await self.load_transaction_data()
-        
-        filtered_transactions = self.transactions_cache
-        
-        if failure_type:
-            filtered_transactions = [
-                t for t in filtered_transactions 
-                if t.failure_type and t.failure_type.value == failure_type
-            ]
-        
-        if search_term:
-            search_lower = search_term.lower()
-            filtered_transactions = [
-                t for t in filtered_transactions
-                if (search_lower in t.transaction_id.lower() or
-                    search_lower in t.sender_vpa.lower() or
-                    search_lower in t.receiver_vpa.lower() or
-                    (t.failure_reason and search_lower in t.failure_reason.lower()))
-            ]
-        
-        # Apply pagination
-        start_idx = skip
-        end_idx = skip + limit
-        return filtered_transactions[start_idx:end_idx]
+        await self._ensure_cache()
+        
+        if not failure_type and not search_term:
+            return self.transactions_cache[skip:skip + limit]
+        
+        matching_indices = self.transactions_cache.select(
+            failure_type=failure_type,
+            search_term=search_term
+        )
+        
+        # Apply pagination, materializing only the returned page
+        return [self.transactions_cache[i] for i in matching_indices[skip:skip + limit]]
     
+    async def iter_transactions(
+        self,
+        status: Optional[str] = None,
+        failure_type: Optional[str] = None,
+        search_term: Optional[str] = None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        chunk_size: int = 5000
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Stream matching transactions as lists of document-shaped rows, for exports"""
+        if self.mongodb_connected:
+            streamed = False
+            try:
+                async for docs in mongodb.iter_transactions(
+                    status=status,
+                    failure_type=failure_type,
+                    start_date=start,
+                    end_date=end,
+                    search_term=search_term,
+                    projection=DOCUMENT_PROJECTION,
+                    batch_size=chunk_size
+                ):
+                    streamed = True
+                    yield docs
+                return
+            except Exception as e:
+                # A response that already started cannot switch sources
+                if streamed:
+                    raise
+                print(f"Error streaming from MongoDB: {e}")
+                storage_router.report_failure(e)
+
+        # Fallback to cache/CSV data
+        await self._ensure_cache()
+        store = self.transactions_cache
+        indices = store.select(failure_type=failure_type, status=status, search_term=search_term, start=start, end=end)
+        # Newest first, like the MongoDB cursor
+        indices.sort(key=store.timestamps.__getitem__, reverse=True)
+        for offset in range(0, len(indices), chunk_size):
+            yield [transaction_row(store[i]) for i in indices[offset:offset + chunk_size]]
+            # Let other requests run between chunks
+            await asyncio.sleep(0)
+
     async def get_failure_types(self) -> Dict[str, int]:
         """Get failure type distribution"""
         if self.mongodb_connected:
@@ -337,20 +505,14 @@ class DataLoader:
                 return await mongodb.get_failure_type_distribution()
             except Exception as e:
                 print(f"Error getting failure types from MongoDB: {e}")
+                storage_router.report_failure(e)
                 # Fallback to cache
                 pass
         
         # Fallback to cache data
-        if not self.transactions_cache:
-            await self.load_transaction_data()
-        
-        failure_counts = {}
-        for transaction in self.transactions_cache:
-            if transaction.failure_type:
-                failure_type = transaction.failure_type.value
-                failure_counts[failure_type] = failure_counts.get(failure_type, 0) + 1
+        await self._ensure_cache()
         
-        return failure_counts
+        return self.transactions_cache.failure_type_counts()
     
     async def get_transaction_stats(self) -> Dict[str, any]:
         """Get transaction statistics"""
@@ -359,19 +521,20 @@ class DataLoader:
                 return await mongodb.get_transaction_stats()
             except Exception as e:
                 print(f"Error getting stats from MongoDB: {e}")
+                storage_router.report_failure(e)
                 # Fallback to cache calculation
                 pass
         
         # Fallback to cache calculation
-        if not self.transactions_cache:
-            await self.load_transaction_data()
+        await self._ensure_cache()
         
+        status_counts = self.transactions_cache.status_counts()
         total = len(self.transactions_cache)
-        failed = len([t for t in self.transactions_cache if t.status == 'failed'])
-        successful = len([t for t in self.transactions_cache if t.status == 'success'])
-        pending = len([t for t in self.transactions_cache if t.status == 'pending'])
+        failed = status_counts.get('failed', 0)
+        successful = status_counts.get('success', 0)
+        pending = status_counts.get('pending', 0)
         
-        total_amount = sum(t.amount for t in self.transactions_cache)
+        total_amount = self.transactions_cache.total_amount()
         avg_amount = total_amount / total if total > 0 else 0
         success_rate = (successful / total * 100) if total > 0 else 0
         
@@ -385,36 +548,55 @@ class DataLoader:
             "success_rate": success_rate
         }
     
+    async def _get_local_analytics(self) -> LocalAnalytics:
+        """Columnar view of the current snapshot, including writes buffered since it was built
+        
+        Buffered writes are appended on the event loop, so the row count is read here and the
+        worker builds from exactly that many rows. One build runs at a time; callers queued
+        behind it reuse its result when nothing was appended meanwhile.
+        """
+        async with self._local_analytics_lock:
+            store = self.transactions_cache
+            rows = len(store)
+            key = (id(store), rows)
+            if self._local_analytics is None or self._local_analytics_key != key:
+                loop = asyncio.get_running_loop()
+                self._local_analytics = await loop.run_in_executor(None, LocalAnalytics.from_store, store, rows)
+                self._local_analytics_key = key
+            return self._local_analytics
+    
+    async def get_analytics(self, name: str, **kwargs) -> Any:
+        """Run an AdvancedQueries analytic on MongoDB, or on the embedded engine while it is down"""
+        if self.mongodb_connected:
+            try:
+                result = await getattr(advanced_queries, name)(**kwargs)
+            except Exception as e:
+                print(f"Error running {name} on MongoDB: {e}")
+                storage_router.report_failure(e)
+            else:
+                # The queries log their own errors and return an empty result; a ping tells an
+                # empty window apart from an outage the health monitor has not noticed yet
+                if result or await storage_router.check_health():
+                    return result
+        
+        await self._ensure_cache()
+        analytics = await self._get_local_analytics()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, lambda: getattr(analytics, name)(**kwargs))
+    
     async def get_transaction_by_id(self, transaction_id: str) -> Optional[Transaction]:
         """Get a specific transaction by ID"""
         if self.mongodb_connected:
             try:
-                doc = await mongodb.get_transaction_by_id(transaction_id)
+                doc = await mongodb.get_transaction_by_id(transaction_id, projection=DOCUMENT_PROJECTION)
                 if doc:
-                    return Transaction(
-                        transaction_id=doc['transaction_id'],
-                        timestamp=doc['timestamp'],
-                        amount=doc['amount'],
-                        sender_vpa=doc['sender_vpa'],
-                        receiver_vpa=doc['receiver_vpa'],
-                        sender_bank=doc['sender_bank'],
-                        receiver_bank=doc['receiver_bank'],
-                        status=doc['status'],
-                        failure_reason=doc.get('failure_reason'),
-                        failure_type=FailureType(doc['failure_type']) if doc.get('failure_type') else None,
-                        error_code=doc.get('error_code'),
-                        retry_count=doc.get('retry_count', 0),
-                        metadata=doc.get('metadata', {})
-                    )
+                    return decode_document(doc)
             except Exception as e:
                 print(f"Error getting transaction from MongoDB: {e}")
+                storage_router.report_failure(e)
         
         # Fallback to cache search
-        if not self.transactions_cache:
-            await self.load_transaction_data()
-        
-        for transaction in self.transactions_cache:
-            if transaction.transaction_id == transaction_id:
-                return transaction
+        await self._ensure_cache()
         
-        return None
\ No newline at end of file
+        index = self.transactions_cache.find(transaction_id)
+        return self.transactions_cache[index] if index is not None else None
\ No newline at end of file
@@ -0,0 +1,238 @@
+"""
+Chunked NDJSON/CSV/Parquet encoders for streaming exports
+Each chunk of rows is encoded (and optionally gzip-compressed) as soon as it arrives, so memory stays bounded
+"""
+
+import os
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence
+from database.codec import TRANSACTION_FIELDS
+from models.transaction import Transaction
+
+# Rows fetched, encoded and sent per chunk
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "5000"))
+
+# Media type and file extension per export format
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+TRANSACTION_EXPORT_COLUMNS = list(TRANSACTION_FIELDS)
+
+# Arrow type aliases fixing the Parquet schema of transaction exports; other columns are strings
+TRANSACTION_EXPORT_TYPES = {"timestamp": "timestamp[us]", "amount": "float64", "retry_count": "int64"}
+
+# Analytics that return row lists, by export name
+EXPORTABLE_ANALYTICS = {
+    "failure_patterns": "get_failure_patterns_by_time",
+    "bank_performance": "get_bank_performance_metrics",
+    "vpa_domains": "get_vpa_domain_analysis",
+    "amount_based_failures": "get_amount_based_failure_analysis",
+    "retry_patterns": "get_retry_pattern_analysis",
+    "hourly": "get_hourly_analytics",
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _cell(value: Any) -> Any:
+    """Flat-file value: datetimes as ISO strings, nested values as JSON"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, default=_json_default)
+    return value
+
+
+def transaction_row(transaction: Transaction) -> Dict[str, Any]:
+    """Export row for an in-memory transaction, shaped like a stored document"""
+    row = dict(transaction.__dict__)
+    row["failure_type"] = transaction.failure_type.value if transaction.failure_type else None
+    return row
+
+
+def flatten_row(row: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Nested dicts (e.g. a grouped _id) become dotted columns"""
+    flat = {}
+    for key, value in row.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict) and value:
+            flat.update(flatten_row(value, f"{name}."))
+        else:
+            flat[name] = value
+    return flat
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose contents are handed out (and released) after every chunk"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class ChunkEncoder:
+    """Encodes row chunks to bytes; subclasses implement one file format"""
+
+    def __init__(self, columns: Optional[Sequence[str]] = None, types: Optional[Dict[str, str]] = None):
+        self.columns = list(columns) if columns else None
+        self.types = types
+
+    def encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        raise NotImplementedError
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class NDJSONEncoder(ChunkEncoder):
+    def encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        if self.columns:
+            rows = [{column: row.get(column) for column in self.columns} for row in rows]
+        return "".join(json.dumps(row, default=_json_default) + "\n" for row in rows).encode()
+
+
+class CSVEncoder(ChunkEncoder):
+    """Header from the configured columns, or the first row's keys"""
+
+    def __init__(self, columns: Optional[Sequence[str]] = None, types: Optional[Dict[str, str]] = None):
+        super().__init__(columns, types)
+        self._header_written = False
+
+    def encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        if not rows and self._header_written:
+            return b""
+        output = io.StringIO()
+        writer = csv.writer(output)
+        if not self._header_written:
+            if self.columns is None:
+                self.columns = list(rows[0]) if rows else []
+            writer.writerow(self.columns)
+            self._header_written = True
+        writer.writerows([[_cell(row.get(column)) for column in self.columns] for row in rows])
+        return output.getvalue().encode()
+
+
+class ParquetEncoder(ChunkEncoder):
+    """One row group per chunk; the schema comes from the column types, or else from the first chunk"""
+
+    def __init__(self, columns: Optional[Sequence[str]] = None, types: Optional[Dict[str, str]] = None):
+        super().__init__(columns, types)
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)") from e
+        self._pa, self._pq = pa, pq
+        self._sink = _Drain()
+        self._writer = None
+
+    def encode(self, rows: List[Dict[str, Any]]) -> bytes:
+        if not rows:
+            return b""
+        if self.columns is None:
+            self.columns = list(rows[0])
+        # Timestamps stay native; only nested values are serialized
+        data = {
+            column: [
+                value if value is None or isinstance(value, datetime) else _cell(value)
+                for value in (row.get(column) for row in rows)
+            ]
+            for column in self.columns
+        }
+        if self._writer is None and self.types is not None:
+            schema = self._pa.schema([
+                (column, self._pa.type_for_alias(self.types.get(column, "string"))) for column in self.columns
+            ])
+            self._writer = self._pq.ParquetWriter(self._sink, schema, compression="zstd")
+        if self._writer is None:
+            table = self._pa.Table.from_pydict(data)
+            # A column that is all null in the first chunk is written as strings, not as the null type
+            schema = self._pa.schema([
+                (field.name, self._pa.string() if self._pa.types.is_null(field.type) else field.type)
+                for field in table.schema
+            ])
+            self._writer = self._pq.ParquetWriter(self._sink, schema, compression="zstd")
+            table = table.cast(schema)
+        else:
+            table = self._pa.Table.from_pydict(data).cast(self._writer.schema)
+        self._writer.write_table(table)
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        if self._writer is not None:
+            self._writer.close()
+        return self._sink.drain()
+
+
+ENCODERS = {"ndjson": NDJSONEncoder, "csv": CSVEncoder, "parquet": ParquetEncoder}
+
+
+def make_encoder(
+    export_format: str,
+    columns: Optional[Sequence[str]] = None,
+    types: Optional[Dict[str, str]] = None
+) -> ChunkEncoder:
+    """Encoder for an export format; raises before any bytes are sent if it cannot be used"""
+    return ENCODERS[export_format](columns, types)
+
+
+async def encode_stream(
+    chunks: AsyncIterator[List[Dict[str, Any]]],
+    encoder: ChunkEncoder,
+    gzip: bool = False
+) -> AsyncIterator[bytes]:
+    """Encode row chunks as they arrive, gzip-compressing the byte stream when asked"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if gzip else None
+
+    async for rows in chunks:
+        data = encoder.encode(rows)
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+
+    data = encoder.finish()
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+
+async def row_chunks(rows: Iterable[Dict[str, Any]], chunk_size: int) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Chunk an in-memory row sequence for encode_stream"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
@@ -34,6 +34,9 @@ import {
   ReferenceLine,
 } from 'recharts';
 
+const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:8000';
+const LIVE_SOCKET_URL = API_BASE_URL.replace(/^http/, 'ws');
+
 const RealTimeMonitor = () => {
   const theme = useTheme();
   const [isMonitoring, setIsMonitoring] = useState(true);
@@ -46,7 +49,7 @@ const RealTimeMonitor = () => {
   });
   const [alerts, setAlerts] = useState([]);
   const [chartData, setChartData] = useState([]);
-  const intervalRef = useRef();
+  const socketRef = useRef();
 
   useEffect(() => {
     if (isMonitoring) {
@@ -59,33 +62,46 @@ const RealTimeMonitor = () => {
   }, [isMonitoring]);
 
   const startMonitoring = () => {
-    intervalRef.current = setInterval(() => {
-      updateMetrics();
-      updateChartData();
-      checkForAlerts();
-    }, 2000); // Update every 2 seconds
+    // The server pushes a snapshot on connect and a delta every interval
+    const socket = new WebSocket(`${LIVE_SOCKET_URL}/ws/live`);
+    socket.onmessage = (event) => {
+      const message = JSON.parse(event.data);
+      // Anomaly alerts arrive on the same socket without metrics
+      if (message.type === 'anomaly') {
+        addAnomalyAlert(message.alert);
+        return;
+      }
+      if (!message.metrics) return;
+      const newMetrics = updateMetrics(message);
+      updateChartData(newMetrics);
+      checkForAlerts(newMetrics);
+    };
+    socketRef.current = socket;
   };
 
   const stopMonitoring = () => {
-    if (intervalRef.current) {
-      clearInterval(intervalRef.current);
+    if (socketRef.current) {
+      socketRef.current.close();
+      socketRef.current = null;
     }
   };
 
-  const updateMetrics = () => {
-    // Simulate real-time metrics
+  const updateMetrics = (message) => {
+    const live = message.metrics;
     const newMetrics = {
-      transactionsPerSecond: Math.floor(Math.random() * 50) + 20,
-      failureRate: Math.random() * 5,
+      transactionsPerSecond: Math.round(live.transactions_per_second * 10) / 10,
+      failureRate: live.window_failure_rate,
+      // Not reported by the live feed yet
       avgResponseTime: Math.floor(Math.random() * 200) + 100,
-      activeConnections: Math.floor(Math.random() * 100) + 200,
+      activeConnections: message.subscribers,
       systemLoad: Math.random() * 100,
     };
 
     setMetrics(newMetrics);
+    return newMetrics;
   };
 
-  const updateChartData = () => {
+  const updateChartData = (metrics) => {
     const now = new Date();
     const timeString = now.toLocaleTimeString();
 
@@ -104,7 +120,7 @@ const RealTimeMonitor = () => {
     });
   };
 
-  const checkForAlerts = () => {
+  const checkForAlerts = (metrics) => {
     const newAlerts = [];
 
     if (metrics.failureRate > 3) {
@@ -142,6 +158,24 @@ const RealTimeMonitor = () => {
     }
   };
 
+  const addAnomalyAlert = (anomaly) => {
+    const label = anomaly.dimension === 'bank' ? 'bank' : 'error code';
+    const resolved = anomaly.status === 'resolved';
+    const alert = {
+      id: `${anomaly.dimension}-${anomaly.key}-${anomaly.status}-${anomaly.updated_at}`,
+      type: resolved ? 'success' : 'error',
+      title: resolved
+        ? `Anomaly resolved: ${label} ${anomaly.key}`
+        : `Failure-rate anomaly: ${label} ${anomaly.key}`,
+      message: resolved
+        ? `Back near baseline ${anomaly.baseline_failure_rate.toFixed(1)}% (peak ${anomaly.peak_failure_rate.toFixed(1)}%)`
+        : `Failure rate is ${anomaly.failure_rate.toFixed(1)}% vs baseline ${anomaly.baseline_failure_rate.toFixed(1)}%`,
+      timestamp: new Date(),
+    };
+
+    setAlerts(prevAlerts => [alert, ...prevAlerts.filter(a => a.id !== alert.id)].slice(0, 10));
+  };
+
   const getStatusColor = (value, thresholds) => {
     if (value > thresholds.critical) return 'error';
     if (value > thresholds.warning) return 'warning';